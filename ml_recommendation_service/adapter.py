@@ -1,9 +1,6 @@
 from __future__ import annotations
 
 from typing import Any, Dict, List, Optional
-import os
-import json
-
 import os
 
 # Apply variant-based overrides before importing engine/config
@@ -20,7 +17,14 @@ elif _VARIANT == "C":
     os.environ.setdefault("SEMANTIC_WEIGHT", "0.0")
     os.environ.setdefault("BANDIT_EPSILON", "0.0")
 
+from .cache import ResultCache
+from .config import RESULT_CACHE_MAX_ENTRIES, RESULT_CACHE_MAX_BYTES, RESULT_CACHE_TTL, PRECOMPUTED_HOT_RECORDS
+from .indexed_connector import IndexedConnector
+from .metrics import METRICS, swallowed
+from .precomputed import PrecomputedJsonl
+from .sharded_output import ShardedRecommendations
 from .recommendation_engine import RecommendationEngine
+from .retrain import Retrainer
 from .offline_connector import OfflineConnector
 from .mongo_connector import MongoDBConnector
 
@@ -31,6 +35,9 @@ class InMemoryConnector:
     Useful for integrating with apps that already hold dummy data in memory.
     """
 
+    # rows never change after construction (lets IndexedConnector index them once)
+    static = True
+
     def __init__(
         self,
         students: List[Dict[str, Any]],
@@ -78,10 +85,21 @@ class RecommenderService:
 
     Modes:
       - auto: prefer precomputed offline_recommendations.jsonl if present; else offline files; else Mongo
-      - precomputed: serve recommendations from offline_recommendations.jsonl
+      - precomputed: serve recommendations from offline_recommendations.jsonl (indexed, read on demand),
+        or from a sharded binary store directory written with `offline_train --format sharded`
       - offline: read Student_rec/Content_rec/Sponsers_rec (XLSX/CSV)
       - mongo: connect to MongoDB using env or provided URI/DB
       - inmemory: use provided lists (students, content, sponsors)
+
+    Engine results are cached in `cache` (default: a ResultCache bounded by the
+    RESULT_CACHE_* settings), tagged with the engine's snapshot version so a
+    retrain invalidates them. Connectors are wrapped in an IndexedConnector, so
+    profile lookups are dict hits (or a TTL cache for Mongo); call
+    `invalidate(student_id)` after changing a student outside the service.
+
+    `retrain()` trains a new engine in the background while the current one
+    keeps serving, and swaps it in only after it passes a smoke test;
+    `rollback()` returns to the engine it replaced.
     """
 
     def __init__(
@@ -102,12 +120,18 @@ class RecommenderService:
         students: Optional[List[Dict[str, Any]]] = None,
         content: Optional[List[Dict[str, Any]]] = None,
         sponsors: Optional[List[Dict[str, Any]]] = None,
+        # Result cache (anything with get/put/clear/stats)
+        cache: Optional[ResultCache] = None,
     ) -> None:
-        self._engine: Optional[RecommendationEngine] = None
+        self._retrainer: Optional[Retrainer] = None
         self._trained: bool = False
-        self._precomputed: Dict[str, Dict[str, Any]] = {}
-        self._connector = None
-        self._cache: Dict[str, Dict[str, Any]] = {}
+        self._precomputed: Optional[PrecomputedJsonl | ShardedRecommendations] = None
+        self._connector: Optional[IndexedConnector] = None
+        self._cache = cache if cache is not None else ResultCache(
+            max_entries=RESULT_CACHE_MAX_ENTRIES,
+            max_bytes=RESULT_CACHE_MAX_BYTES,
+            ttl_seconds=RESULT_CACHE_TTL,
+        )
 
         # Resolve mode
         resolved_mode = mode
@@ -124,63 +148,131 @@ class RecommenderService:
         self._mode = resolved_mode
 
         if resolved_mode == "precomputed":
-            self._precomputed = self._load_precomputed(precomputed_path)
+            if os.path.isdir(precomputed_path):
+                self._precomputed = ShardedRecommendations(precomputed_path, hot_records=PRECOMPUTED_HOT_RECORDS)
+            else:
+                self._precomputed = PrecomputedJsonl(precomputed_path, hot_records=PRECOMPUTED_HOT_RECORDS)
         elif resolved_mode == "inmemory":
-            self._connector = InMemoryConnector(students or [], content or [], sponsors or [])
-            self._engine = RecommendationEngine(self._connector)
+            self._connector = IndexedConnector(InMemoryConnector(students or [], content or [], sponsors or []))
+            self._retrainer = Retrainer(RecommendationEngine(self._connector))
         elif resolved_mode == "offline":
-            self._connector = OfflineConnector(
-                students_path=students_path,
-                content_path=content_path,
-                sponsors_path=sponsors_path,
+            self._connector = IndexedConnector(
+                OfflineConnector(
+                    students_path=students_path,
+                    content_path=content_path,
+                    sponsors_path=sponsors_path,
+                )
             )
-            self._engine = RecommendationEngine(self._connector)
+            self._retrainer = Retrainer(RecommendationEngine(self._connector))
         elif resolved_mode == "mongo":
             uri = mongo_uri or os.getenv("MONGO_URI")
             db = db_name or os.getenv("DB_NAME")
-            self._connector = MongoDBConnector(uri=uri, db_name=db)
-            self._engine = RecommendationEngine(self._connector)
+            self._connector = IndexedConnector(MongoDBConnector(uri, db))
+            self._retrainer = Retrainer(RecommendationEngine(self._connector))
         else:
             raise ValueError(f"Unknown mode: {resolved_mode}")
 
     # ---- public API ----
-    def get_recommendations(self, student_id: str) -> Dict[str, Any]:
-        # Serve from in-process cache if present
+    def get_recommendations(self, student_id: str, debug: bool = False) -> Dict[str, Any]:
+        """Recommendations for one student.
+
+        With `debug=True` the engine scores the student afresh (bypassing the
+        result cache) and the response carries per-stage timings under
+        "debug"; precomputed results are returned as stored.
+        """
         sid = str(student_id)
-        if sid in self._cache:
-            return self._cache[sid]
         if self._mode == "precomputed":
-            res = self._precomputed.get(str(student_id), {
-                "student_id": str(student_id),
-                "courses": [],
-                "sponsors": [],
-                "similar_students": [],
-                "matching_teachers": [],
-            })
-            self._cache[sid] = res
-            return res
-        # Engine path
-        assert self._engine is not None
+            # Has its own hot-record cache
+            return self._precomputed.get(sid) or self._empty_result(sid)
+        # Engine path, served from the result cache when fresh
+        assert self._retrainer is not None
         self._ensure_trained()
-        res = self._engine.recommend_for_student(str(student_id))
-        self._cache[sid] = res
+        engine = self._engine
+        if debug:
+            return engine.recommend_for_student(sid, debug=True)
+        version = engine.snapshot.version
+        res = self._cache.get(sid, version)
+        if res is None:
+            res = engine.recommend_for_student(sid)
+            self._cache.put(sid, res, version)
         return res
 
-    def batch_recommendations(self) -> None:
+    def get_recommendations_many(self, student_ids: List[str], check_cache: bool = True) -> List[Dict[str, Any]]:
+        """Results for several students, aligned with `student_ids`.
+
+        Cached results are reused; the rest are scored together with the
+        engine's `recommend_many` (one matmul per model) and cached. Pass
+        `check_cache=False` when the caller already missed with `get_cached`,
+        so each miss is counted once.
+        """
+        sids = [str(s) for s in student_ids]
+        if self._mode == "precomputed":
+            return [self._precomputed.get(sid) or self._empty_result(sid) for sid in sids]
+        assert self._retrainer is not None
+        self._ensure_trained()
+        engine = self._engine
+        version = engine.snapshot.version
+        found: Dict[str, Dict[str, Any]] = {}
+        for sid in sids if check_cache else ():
+            res = self._cache.get(sid, version)
+            if res is not None:
+                found[sid] = res
+        missing = list(dict.fromkeys(sid for sid in sids if sid not in found))
+        if missing:
+            for sid, res in zip(missing, engine.recommend_many(missing)):
+                self._cache.put(sid, res, version)
+                found[sid] = res
+        return [found[sid] for sid in sids]
+
+    def get_cached(self, student_id: str) -> Optional[Dict[str, Any]]:
+        """The cached engine result for a student, or None; never scores or trains."""
+        engine = self._engine
+        if engine is None or not self._trained:
+            return None
+        return self._cache.get(str(student_id), engine.snapshot.version)
+
+    def warm_up(self) -> None:
+        """Train the engine now rather than on the first request."""
+        if self._engine is not None:
+            self._ensure_trained()
+
+    def batch_recommendations(self, incremental: bool = False) -> Optional[Dict[str, Any]]:
+        """Score and save everyone (or, incrementally, only changed students); see RecommendationEngine."""
         if self._mode == "precomputed":
             return None
         assert self._engine is not None
         self._ensure_trained()
-        self._engine.batch_recommendations()
+        return self._engine.batch_recommendations(incremental=incremental)
+
+    def retrain(self, incremental: bool = True, wait: bool = False) -> Optional[Dict[str, Any]]:
+        """Retrain on a background thread and promote the new engine once it passes a smoke test.
+
+        Requests are served by the current engine meanwhile. Returns the
+        report (see Retrainer) when `wait` is set, else None.
+        """
+        if self._retrainer is None:
+            return None
+        self._ensure_trained()
+        self._retrainer.start(incremental=incremental)
+        return self._retrainer.wait() if wait else None
+
+    def rollback(self) -> bool:
+        """Serve with the engine the last retrain replaced; False if there is none."""
+        return self._retrainer is not None and self._retrainer.rollback()
+
+    def retrain_reports(self) -> List[Dict[str, Any]]:
+        """Status and per-phase seconds of recent retrains, oldest first."""
+        return list(self._retrainer.reports) if self._retrainer is not None else []
 
     def available_student_ids(self) -> List[str]:
         if self._mode == "precomputed":
-            return list(self._precomputed.keys())
+            return self._precomputed.student_ids()
         if self._connector is None:
             return []
         try:
             return [str(s.get("student_id")) for s in self._connector.get_all_students()]  # type: ignore[attr-defined]
         except Exception:
+            swallowed("connector", "available_student_ids")
             return []
 
     def is_ready(self) -> bool:
@@ -193,12 +285,60 @@ class RecommenderService:
             has_content = len(self._connector.get_all_content()) > 0  # type: ignore[attr-defined]
             return has_students and has_content
         except Exception:
+            swallowed("connector", "is_ready")
             return False
 
     def clear_cache(self) -> None:
         self._cache.clear()
 
+    def invalidate(self, student_id: Optional[str] = None) -> None:
+        """Drop the cached profile and result of one student (or of everyone)."""
+        if self._connector is not None:
+            self._connector.invalidate(student_id)
+        if student_id is None:
+            self._cache.clear()
+        else:
+            self._cache.invalidate(str(student_id))
+
+    def cache_stats(self) -> Dict[str, Any]:
+        """Hit/miss/eviction counters and current size of the result cache."""
+        return self._cache.stats()
+
+    def memory_report(self) -> Optional[Dict[str, Any]]:
+        """Bytes held by each model of the serving engine (None in precomputed mode or before training)."""
+        engine = self._engine
+        return engine.memory_report() if engine is not None and engine.snapshot.version else None
+
+    def metrics(self, fmt: str = "json") -> Any:
+        """Stage timings and counters (see metrics.py) plus cache gauges, as a dict or Prometheus text ("prometheus")."""
+        for name, value in self._cache.stats().items():
+            if name != "version":
+                METRICS.set_gauge("result_cache", value, stat=name)
+        if self._connector is not None:
+            for name, value in self._connector.profile_cache_stats().items():
+                if name != "version":
+                    METRICS.set_gauge("profile_cache", value, stat=name)
+        engine = self._engine
+        if engine is not None:
+            METRICS.set_gauge("snapshot_version", engine.snapshot.version)
+        return METRICS.prometheus() if fmt == "prometheus" else METRICS.snapshot()
+
     # ---- internals ----
+    @staticmethod
+    def _empty_result(student_id: str) -> Dict[str, Any]:
+        return {
+            "student_id": student_id,
+            "courses": [],
+            "sponsors": [],
+            "similar_students": [],
+            "matching_teachers": [],
+        }
+
+    @property
+    def _engine(self) -> Optional[RecommendationEngine]:
+        # The serving engine; replaced as a whole by retrain()/rollback()
+        return self._retrainer.engine if self._retrainer is not None else None
+
     def _ensure_trained(self) -> None:
         if self._trained:
             return
@@ -206,21 +346,3 @@ class RecommenderService:
         if self._engine:
             self._engine.train_models()
             self._trained = True
-
-    @staticmethod
-    def _load_precomputed(path: str) -> Dict[str, Dict[str, Any]]:
-        data: Dict[str, Dict[str, Any]] = {}
-        try:
-            with open(path, "r", encoding="utf-8") as f:
-                for line in f:
-                    line = line.strip()
-                    if not line:
-                        continue
-                    obj = json.loads(line)
-                    sid = str(obj.get("student_id"))
-                    if sid:
-                        data[sid] = obj
-        except Exception:
-            # If anything goes wrong, return empty map
-            return {}
-        return data
@@ -0,0 +1,106 @@
+from __future__ import annotations
+
+import io
+import json
+import os
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterable, List, Mapping, Optional, Set, Tuple
+
+import numpy as np
+
+_STATE_VERSION = 1
+
+
+@dataclass
+class BatchState:
+    """Inputs behind the recommendations the last batch run wrote.
+
+    Per-student and per-course document hashes, plus the course ids each
+    student was recommended, as of that run. An incremental batch compares
+    them with the live snapshot and recomputes only students whose own
+    document changed or who were recommended a course that has since changed
+    or disappeared. `fit_epoch` and `sponsors_hash` tie the state to one set of
+    fitted models and sponsors; when either moves, everyone is recomputed.
+    """
+
+    fit_epoch: int
+    sponsors_hash: str
+    student_hashes: Dict[str, str] = field(default_factory=dict)
+    course_hashes: Dict[str, str] = field(default_factory=dict)
+    recommended: Dict[str, List[str]] = field(default_factory=dict)
+
+    def dirty_students(self, student_hashes: Mapping[str, str], course_hashes: Mapping[str, str]) -> Set[str]:
+        """Current students whose recommendations may differ from the stored ones."""
+        dirty = {sid for sid, h in student_hashes.items() if self.student_hashes.get(sid) != h}
+        changed = {cid for cid, h in self.course_hashes.items() if course_hashes.get(cid) != h}
+        if changed:
+            dirty.update(
+                sid
+                for sid, courses in self.recommended.items()
+                if sid in student_hashes and not changed.isdisjoint(courses)
+            )
+        return dirty
+
+    def advance(
+        self,
+        results: Iterable[Tuple[str, List[str]]],
+        student_hashes: Mapping[str, str],
+        course_hashes: Mapping[str, str],
+    ) -> None:
+        """Record a run that recomputed `results` (student id, course ids) and brought everyone else up to date."""
+        self.student_hashes = dict(student_hashes)
+        self.course_hashes = dict(course_hashes)
+        recommended = {sid: courses for sid, courses in self.recommended.items() if sid in self.student_hashes}
+        recommended.update(results)
+        self.recommended = recommended
+
+    # ---- persistence ----
+    def save(self, path: Path) -> None:
+        path = Path(path)
+        students = list(self.student_hashes)
+        courses = list(self.course_hashes)
+        rec_ids = list(self.recommended)
+        vocab = sorted({cid for cids in self.recommended.values() for cid in cids})
+        col = {cid: i for i, cid in enumerate(vocab)}
+        lengths = [len(self.recommended[sid]) for sid in rec_ids]
+        meta = {"version": _STATE_VERSION, "fit_epoch": self.fit_epoch, "sponsors_hash": self.sponsors_hash}
+        buf = io.BytesIO()
+        np.savez(
+            buf,
+            meta=np.frombuffer(json.dumps(meta).encode("utf-8"), dtype=np.uint8),
+            student_ids=np.asarray(students, dtype=str),
+            student_hashes=np.asarray([self.student_hashes[s] for s in students], dtype=str),
+            course_ids=np.asarray(courses, dtype=str),
+            course_hashes=np.asarray([self.course_hashes[c] for c in courses], dtype=str),
+            rec_ids=np.asarray(rec_ids, dtype=str),
+            rec_indptr=np.concatenate([[0], np.cumsum(lengths, dtype=np.int64)]).astype(np.int64),
+            rec_courses=np.asarray([col[c] for sid in rec_ids for c in self.recommended[sid]], dtype=np.int32),
+            rec_vocab=np.asarray(vocab, dtype=str),
+        )
+        tmp = path.with_name(path.name + ".tmp")
+        with open(tmp, "wb") as f:
+            f.write(buf.getbuffer())
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: Path) -> Optional["BatchState"]:
+        try:
+            with np.load(Path(path), allow_pickle=False) as data:
+                meta = json.loads(data["meta"].tobytes().decode("utf-8"))
+                if meta.get("version") != _STATE_VERSION:
+                    return None
+                vocab = data["rec_vocab"].tolist()
+                indptr = data["rec_indptr"].tolist()
+                flat = [vocab[i] for i in data["rec_courses"].tolist()]
+                return cls(
+                    fit_epoch=int(meta["fit_epoch"]),
+                    sponsors_hash=str(meta["sponsors_hash"]),
+                    student_hashes=dict(zip(data["student_ids"].tolist(), data["student_hashes"].tolist())),
+                    course_hashes=dict(zip(data["course_ids"].tolist(), data["course_hashes"].tolist())),
+                    recommended={
+                        sid: flat[indptr[i] : indptr[i + 1]] for i, sid in enumerate(data["rec_ids"].tolist())
+                    },
+                )
+        except (OSError, ValueError, KeyError, IndexError):
+            return None
@@ -0,0 +1,3 @@
+# Synthetic data and a benchmark harness (python -m ml_recommendation_service.benchmarks.harness)
+from .synthetic import generate
+from .harness import compare, run
@@ -0,0 +1,219 @@
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+from .synthetic import generate
+
+# Settings that change what is measured; copied into every report
+_REPORTED_CONFIG = (
+    "USE_ANN",
+    "ANN_GATED",
+    "COLLAB_LSH",
+    "COLLAB_MAX_NEIGHBORS",
+    "SEMANTIC_WEIGHT",
+    "TOP_K_COURSES",
+    "BATCH_CHUNK_SIZE",
+)
+
+
+def peak_rss_mb() -> Optional[float]:
+    """Peak resident set size of this process so far, in MB (None where unsupported, e.g. Windows)."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def _timed(fn: Callable[[], Any]) -> float:
+    start = time.perf_counter()
+    fn()
+    return round(time.perf_counter() - start, 6)
+
+
+def _percentiles(samples: List[float]) -> Dict[str, float]:
+    ms = np.asarray(samples, dtype=np.float64) * 1000.0
+    return {
+        "count": int(ms.size),
+        "mean_ms": round(float(ms.mean()), 4),
+        "p50_ms": round(float(np.percentile(ms, 50)), 4),
+        "p95_ms": round(float(np.percentile(ms, 95)), 4),
+        "p99_ms": round(float(np.percentile(ms, 99)), 4),
+        "max_ms": round(float(ms.max()), 4),
+    }
+
+
+def _fit_models(data: Dict[str, List[Dict[str, Any]]]) -> Dict[str, float]:
+    """Seconds to fit each model on its own, the way train_models fits it from scratch."""
+    from ..recommendation_engine import RecommendationEngine
+
+    models = RecommendationEngine._new_models()
+    content, students, sponsors = data["content"], data["students"], data["sponsors"]
+    content_model = models["content_model"]
+    out = {
+        "content": _timed(lambda: content_model.fit(content)),
+        "collab": _timed(lambda: models["collab_model"].fit(students)),
+        "semantic": _timed(lambda: models["semantic_model"].fit(content)),
+        "people": _timed(lambda: models["people_model"].fit(students, [])),
+        "sponsor": _timed(lambda: models["sponsor_model"].fit(sponsors)),
+    }
+    matrix = getattr(content_model, "_content_matrix", None)
+    course_ids = [str(c) for c in getattr(content_model, "_course_ids", [])]
+    if models["ann"] is not None and matrix is not None and course_ids:
+        out["ann"] = _timed(lambda: models["ann"].fit(matrix, course_ids))
+    return out
+
+
+def run(
+    students: int = 1000,
+    courses: Optional[int] = None,
+    sponsors: Optional[int] = None,
+    seed: int = 0,
+    requests: int = 1000,
+    batch_students: int = 10000,
+    chunk_size: Optional[int] = None,
+) -> Dict[str, Any]:
+    """Generate a dataset, train on it and time serving; returns the report as a dict.
+
+    Phases: data generation, a full `train_models` (into an empty temporary
+    model store, so nothing is reused), each model fitted on its own,
+    `requests` single `recommend_for_student` calls on random students, and
+    `recommend_many` over up to `batch_students` students. Peak RSS is
+    recorded after every phase.
+    """
+    from .. import config
+    from ..adapter import InMemoryConnector
+    from ..indexed_connector import IndexedConnector
+    from ..recommendation_engine import RecommendationEngine
+
+    report: Dict[str, Any] = {
+        "created_at": datetime.utcnow().isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "seed": seed,
+        "config": {name: getattr(config, name) for name in _REPORTED_CONFIG},
+        "peak_rss_mb": {},
+    }
+    rss = report["peak_rss_mb"]
+
+    start = time.perf_counter()
+    data = generate(students, courses, sponsors, seed)
+    report["scale"] = {kind: len(rows) for kind, rows in data.items()}
+    report["generate_seconds"] = round(time.perf_counter() - start, 6)
+    rss["generate"] = peak_rss_mb()
+
+    with tempfile.TemporaryDirectory(prefix="rec-bench-") as store_dir:
+        previous = os.environ.get("MODEL_STORE_DIR")
+        os.environ["MODEL_STORE_DIR"] = store_dir
+        try:
+            engine = RecommendationEngine(IndexedConnector(InMemoryConnector(**data)))
+        finally:
+            if previous is None:
+                os.environ.pop("MODEL_STORE_DIR", None)
+            else:
+                os.environ["MODEL_STORE_DIR"] = previous
+        start = time.perf_counter()
+        status = engine.train_models()
+        report["train"] = {"seconds": round(time.perf_counter() - start, 6), "components": status}
+        rss["train"] = peak_rss_mb()
+
+        report["train"]["per_model_seconds"] = _fit_models(data)
+        rss["per_model"] = peak_rss_mb()
+
+        ids = [s["student_id"] for s in data["students"]]
+        rng = random.Random(seed)
+        engine.recommend_for_student(ids[0])  # warm-up outside the timings
+        latencies: List[float] = []
+        for sid in (rng.choice(ids) for _ in range(max(1, requests))):
+            t = time.perf_counter()
+            engine.recommend_for_student(sid)
+            latencies.append(time.perf_counter() - t)
+        report["single_request"] = _percentiles(latencies)
+        rss["single_request"] = peak_rss_mb()
+
+        batch_ids = ids if len(ids) <= batch_students else rng.sample(ids, batch_students)
+        chunk = chunk_size or config.BATCH_CHUNK_SIZE
+        seconds = _timed(lambda: engine.recommend_many(batch_ids, chunk_size=chunk))
+        report["batch"] = {
+            "students": len(batch_ids),
+            "chunk_size": chunk,
+            "seconds": seconds,
+            "students_per_second": round(len(batch_ids) / seconds, 1) if seconds else None,
+        }
+        rss["batch"] = peak_rss_mb()
+    return report
+
+
+# Metrics compared between reports: (path, higher is better)
+_COMPARED = (
+    (("train", "seconds"), False),
+    (("single_request", "p50_ms"), False),
+    (("single_request", "p95_ms"), False),
+    (("single_request", "p99_ms"), False),
+    (("batch", "students_per_second"), True),
+    (("peak_rss_mb", "batch"), False),
+)
+
+
+def compare(baseline: Dict[str, Any], report: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    """Headline metrics of two reports side by side, with `report / baseline` ratios."""
+    out: Dict[str, Dict[str, Any]] = {}
+    for path, higher_is_better in _COMPARED:
+        before, after = baseline, report
+        for key in path:
+            before = (before or {}).get(key)
+            after = (after or {}).get(key)
+        ratio = round(after / before, 3) if before and after is not None else None
+        out[".".join(path)] = {"baseline": before, "current": after, "ratio": ratio, "higher_is_better": higher_is_better}
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark training and serving on synthetic data")
+    parser.add_argument("--students", type=int, default=1000, help="Students to generate (e.g. 1000 to 1000000)")
+    parser.add_argument("--courses", type=int, default=None, help="Courses (default students/10, at least 50)")
+    parser.add_argument("--sponsors", type=int, default=None, help="Sponsors (default students/100, at least 10)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--requests", type=int, default=1000, help="Single requests timed for latency percentiles")
+    parser.add_argument("--batch-students", type=int, default=10000, help="Students scored for batch throughput")
+    parser.add_argument("--chunk-size", type=int, default=None, help="recommend_many chunk size")
+    parser.add_argument("--out", default=None, help="Write the JSON report here (default: stdout)")
+    parser.add_argument("--baseline", default=None, help="Earlier report to compare against")
+    args = parser.parse_args()
+
+    report = run(
+        students=args.students,
+        courses=args.courses,
+        sponsors=args.sponsors,
+        seed=args.seed,
+        requests=args.requests,
+        batch_students=args.batch_students,
+        chunk_size=args.chunk_size,
+    )
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            report["comparison"] = compare(json.load(f), report)
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+        print(f"Wrote benchmark report -> {args.out}")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+from __future__ import annotations
+
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+# Topic vocabulary shared by course tags and student interests
+TOPICS = (
+    "ai", "machine learning", "data science", "python", "java", "web", "mobile", "cloud", "security",
+    "networks", "databases", "algorithms", "math", "statistics", "physics", "chemistry", "biology",
+    "design", "art", "music", "film", "writing", "history", "economics", "finance", "marketing",
+    "management", "law", "psychology", "philosophy", "robotics", "electronics", "embedded", "iot",
+    "blockchain", "game dev", "ux", "graphics", "nlp", "vision", "devops", "linux", "entrepreneurship",
+    "sustainability", "energy", "architecture", "civil", "mechanical", "aerospace", "healthcare",
+)
+DEPARTMENTS = ("CSE", "ECE", "ME", "CE", "DES", "BBA", "ECO", "PHY", "BIO", "MTH")
+_FILLER = (
+    "introduction", "advanced", "applied", "foundations", "projects", "theory", "practice", "systems",
+    "methods", "workshop", "studio", "seminar", "principles", "modern", "hands-on", "case", "studies",
+    "analysis", "tools", "lab",
+)
+
+
+def generate(
+    students: int = 1000,
+    courses: Optional[int] = None,
+    sponsors: Optional[int] = None,
+    seed: int = 0,
+) -> Dict[str, List[Dict[str, Any]]]:
+    """Seeded synthetic data in the shape of the Mongo collections.
+
+    Returns {"students": [...], "content": [...], "sponsors": [...]}. Courses
+    default to students / 10 (at least 50) and sponsors to students / 100 (at
+    least 10). Topic popularity is Zipf-like, course descriptions mention
+    their tags, and each student's completed/clicked courses are mostly drawn
+    from courses tagged with one of their interests, so the models have real
+    signal to fit. The same arguments always give the same data.
+    """
+    n_students = max(1, int(students))
+    n_courses = max(50, n_students // 10) if courses is None else max(1, int(courses))
+    n_sponsors = max(10, n_students // 100) if sponsors is None else max(0, int(sponsors))
+    rng = np.random.default_rng(seed)
+
+    weights = 1.0 / np.arange(1, len(TOPICS) + 1)
+    topic_p = weights / weights.sum()
+
+    content = _courses(rng, n_courses, topic_p)
+    # topic -> rows of the courses tagged with it
+    by_topic: Dict[int, List[int]] = {}
+    for row, course in enumerate(content):
+        for topic in course.pop("_topics"):
+            by_topic.setdefault(topic, []).append(row)
+
+    return {
+        "students": _students(rng, n_students, content, by_topic, topic_p),
+        "content": content,
+        "sponsors": _sponsors(rng, n_sponsors),
+    }
+
+
+def _courses(rng: np.random.Generator, n: int, topic_p: np.ndarray) -> List[Dict[str, Any]]:
+    n_tags = rng.integers(1, 5, size=n)
+    out: List[Dict[str, Any]] = []
+    for i in range(n):
+        topics = rng.choice(len(TOPICS), size=n_tags[i], replace=False, p=topic_p).tolist()
+        tags = [TOPICS[t] for t in topics]
+        filler = rng.choice(_FILLER, size=12).tolist()
+        words = filler + [tags[j] for j in rng.integers(0, len(tags), size=6)]
+        rng.shuffle(words)
+        out.append(
+            {
+                "course_id": f"c{i}",
+                "title": f"{filler[0].title()} {tags[0].title()} {i}",
+                "description": " ".join(words),
+                "tags": tags,
+                "_topics": topics,
+            }
+        )
+    return out
+
+
+def _students(
+    rng: np.random.Generator,
+    n: int,
+    content: List[Dict[str, Any]],
+    by_topic: Dict[int, List[int]],
+    topic_p: np.ndarray,
+    block: int = 50000,
+) -> List[Dict[str, Any]]:
+    course_ids = np.asarray([c["course_id"] for c in content], dtype=object)
+    # topic -> course rows as one flat array with offsets (empty for untagged topics)
+    sizes = np.asarray([len(by_topic.get(t, ())) for t in range(len(TOPICS))], dtype=np.int64)
+    offsets = np.concatenate([[0], np.cumsum(sizes)])
+    flat = np.asarray([row for t in range(len(TOPICS)) for row in by_topic.get(t, ())], dtype=np.int64)
+    log_p = np.log(topic_p)
+
+    out: List[Dict[str, Any]] = []
+    for lo in range(0, n, block):
+        b = min(block, n - lo)
+        n_interests = rng.integers(1, 6, size=b)
+        # weighted sampling without replacement for every row at once (Gumbel top-k)
+        ranked = np.argsort(-(log_p + rng.gumbel(size=(b, len(TOPICS)))), axis=1)[:, :5]
+        n_completed = rng.poisson(4, size=b)
+        n_history = n_completed + rng.poisson(3, size=b)
+        gpa = np.round(rng.uniform(2.0, 4.0, size=b), 2)
+        dept = rng.integers(0, len(DEPARTMENTS), size=b)
+        year = rng.integers(1, 5, size=b)
+
+        # every history event: mostly a course tagged with one of the owner's interests, sometimes anything
+        owner = np.repeat(np.arange(b), n_history)
+        topic = ranked[owner, (rng.random(owner.size) * n_interests[owner]).astype(np.int64)]
+        pick = rng.random(owner.size)
+        on_topic = (rng.random(owner.size) < 0.8) & (sizes[topic] > 0)
+        rows = rng.integers(0, len(content), size=owner.size)
+        rows[on_topic] = flat[offsets[topic[on_topic]] + (pick[on_topic] * sizes[topic[on_topic]]).astype(np.int64)]
+        events = course_ids[rows].tolist()
+        ends = np.cumsum(n_history).tolist()
+
+        for i in range(b):
+            history = list(dict.fromkeys(events[ends[i] - n_history[i] : ends[i]]))
+            split = min(int(n_completed[i]), len(history))
+            out.append(
+                {
+                    "student_id": str(lo + i + 1),
+                    "interests": [TOPICS[t] for t in ranked[i, : n_interests[i]].tolist()],
+                    "profile": {"gpa": float(gpa[i]), "department": DEPARTMENTS[dept[i]], "year": int(year[i])},
+                    "completed_courses": history[:split],
+                    "clicked_courses": history[split:],
+                }
+            )
+    return out
+
+
+def _sponsors(rng: np.random.Generator, n: int) -> List[Dict[str, Any]]:
+    out: List[Dict[str, Any]] = []
+    for i in range(n):
+        criteria: Dict[str, Any] = {}
+        if rng.random() < 0.7:
+            criteria["min_gpa"] = float(np.round(rng.uniform(2.5, 3.8), 1))
+        if rng.random() < 0.4:
+            criteria["required_department"] = DEPARTMENTS[int(rng.integers(0, len(DEPARTMENTS)))]
+        if rng.random() < 0.3:
+            criteria["min_year"] = int(rng.integers(1, 5))
+        topic = TOPICS[int(rng.integers(0, len(TOPICS)))]
+        out.append(
+            {
+                "sponsor_id": f"s{i}",
+                "name": f"Sponsor {i}",
+                "description": f"Scholarship for {topic} students",
+                "criteria": criteria,
+            }
+        )
+    return out
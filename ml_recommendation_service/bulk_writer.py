@@ -0,0 +1,119 @@
+from __future__ import annotations
+
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from .config import BULK_WRITE_BATCH_SIZE, BULK_WRITE_QUEUE_BATCHES
+
+# Per-batch records kept for stats() (the totals cover every batch)
+_HISTORY = 100
+
+
+class BulkWriter:
+    """Batches items and writes them on a background thread.
+
+    `write_batch(items)` is called with up to `batch_size` items at a time and
+    returns how many of them failed or were skipped as unchanged, as
+    {"failed": n, "skipped": m} (None means all were written; raising counts
+    the whole batch as failed). At most `queue_batches` full batches wait for
+    the writer; beyond that `add` blocks, so a fast producer cannot run ahead
+    of the database without bound. Use as a context manager, or call
+    `close()`, to write the tail and wait for the thread.
+    """
+
+    def __init__(
+        self,
+        write_batch: Callable[[List[Any]], Optional[Dict[str, int]]],
+        batch_size: int = BULK_WRITE_BATCH_SIZE,
+        queue_batches: int = BULK_WRITE_QUEUE_BATCHES,
+    ) -> None:
+        self._write_batch = write_batch
+        self.batch_size = max(1, int(batch_size))
+        self._pending: List[Any] = []
+        self._queue: "queue.Queue[Optional[List[Any]]]" = queue.Queue(maxsize=max(1, int(queue_batches)))
+        self._lock = threading.Lock()
+        self._closed = False
+        self.batches = 0
+        self.written = 0
+        self.failed = 0
+        self.skipped = 0
+        self.failed_batches = 0
+        self.write_seconds = 0.0
+        self.max_batch_seconds = 0.0
+        self.history: List[Dict[str, Any]] = []
+        self._thread = threading.Thread(target=self._run, name="bulk-writer", daemon=True)
+        self._thread.start()
+
+    def add(self, item: Any) -> None:
+        if self._closed:
+            raise RuntimeError("BulkWriter is closed")
+        self._pending.append(item)
+        if len(self._pending) >= self.batch_size:
+            self._submit()
+
+    def add_many(self, items: Iterable[Any]) -> None:
+        for item in items:
+            self.add(item)
+
+    def close(self) -> Dict[str, Any]:
+        """Write what is left, stop the thread and return the final stats."""
+        if not self._closed:
+            self._submit()
+            self._closed = True
+            self._queue.put(None)
+            self._thread.join()
+        return self.stats()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "batches": self.batches,
+                "written": self.written,
+                "failed": self.failed,
+                "skipped": self.skipped,
+                "failed_batches": self.failed_batches,
+                "write_seconds": round(self.write_seconds, 6),
+                "mean_batch_seconds": round(self.write_seconds / self.batches, 6) if self.batches else 0.0,
+                "max_batch_seconds": round(self.max_batch_seconds, 6),
+                "recent": list(self.history),
+            }
+
+    def __enter__(self) -> "BulkWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+    # ---- internals ----
+    def _submit(self) -> None:
+        if self._pending:
+            batch, self._pending = self._pending, []
+            self._queue.put(batch)
+
+    def _run(self) -> None:
+        while True:
+            batch = self._queue.get()
+            if batch is None:
+                return
+            start = time.perf_counter()
+            error = None
+            try:
+                counts = self._write_batch(batch) or {}
+                failed, skipped = int(counts.get("failed", 0)), int(counts.get("skipped", 0))
+            except Exception as e:
+                failed, skipped, error = len(batch), 0, f"{type(e).__name__}: {e}"
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self.batches += 1
+                self.written += len(batch) - failed - skipped
+                self.failed += failed
+                self.skipped += skipped
+                self.failed_batches += 1 if failed else 0
+                self.write_seconds += elapsed
+                self.max_batch_seconds = max(self.max_batch_seconds, elapsed)
+                self.history.append(
+                    {"size": len(batch), "seconds": round(elapsed, 6), "failed": failed, "skipped": skipped, "error": error}
+                )
+                del self.history[:-_HISTORY]
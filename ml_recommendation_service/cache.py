@@ -0,0 +1,138 @@
+from __future__ import annotations
+
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+from .utils.forksafe import fork_safe
+
+
+class ResultCache:
+    """Bounded LRU cache with per-entry TTL and version-based invalidation.
+
+    Entries are evicted least-recently-used first once `max_entries` or
+    `max_bytes` (approximate JSON size, 0 = unbounded) is exceeded, and are
+    dropped on read after `ttl_seconds` (0 = no expiry). Every read and write
+    carries a `version` (e.g. the engine's snapshot version, which only
+    increases). The cache holds entries of the newest version seen: a newer
+    version clears it, so a retrain never serves stale results, while reads
+    with an older version miss and writes with one are dropped, so requests
+    still running on a replaced engine cannot evict or overwrite the new
+    engine's entries. Versions must be ordered (or None). `max_entries=0`
+    disables caching. Thread-safe.
+
+    Any object with the same `get`/`put`/`clear`/`stats` methods can be passed
+    to RecommenderService instead.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 10000,
+        max_bytes: int = 0,
+        ttl_seconds: float = 0.0,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._clock = clock
+        self._lock = threading.Lock()
+        fork_safe(self)
+        # key -> (value, expires_at, size)
+        self._entries: "OrderedDict[Hashable, Tuple[Any, float, int]]" = OrderedDict()
+        self._bytes = 0
+        self._version: Any = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def get(self, key: Hashable, version: Any = None) -> Optional[Any]:
+        with self._lock:
+            if not self._check_version(version):
+                self.misses += 1
+                return None
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, expires_at, _ = entry
+            if expires_at and self._clock() >= expires_at:
+                self._drop(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: Hashable, value: Any, version: Any = None) -> None:
+        if self.max_entries <= 0:
+            return
+        size = self._sizeof(value) if self.max_bytes > 0 else 0
+        if self.max_bytes > 0 and size > self.max_bytes:
+            return
+        with self._lock:
+            if not self._check_version(version):
+                return
+            if key in self._entries:
+                self._drop(key)
+            expires_at = self._clock() + self.ttl_seconds if self.ttl_seconds > 0 else 0.0
+            self._entries[key] = (value, expires_at, size)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or (self.max_bytes > 0 and self._bytes > self.max_bytes):
+                oldest = next(iter(self._entries))
+                self._drop(oldest)
+                self.evictions += 1
+
+    def invalidate(self, key: Hashable) -> None:
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+                self.invalidations += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "version": self._version,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+            }
+
+    # ---- internals (caller holds the lock) ----
+    def _check_version(self, version: Any) -> bool:
+        """Clear the cache for a newer `version`; False if `version` is older than the cached one."""
+        if version == self._version:
+            return True
+        if version is not None and self._version is not None and version < self._version:
+            return False
+        self.invalidations += len(self._entries)
+        self._entries.clear()
+        self._bytes = 0
+        self._version = version
+        return True
+
+    def _drop(self, key: Hashable) -> None:
+        _, _, size = self._entries.pop(key)
+        self._bytes -= size
+
+    @staticmethod
+    def _sizeof(value: Any) -> int:
+        try:
+            return len(json.dumps(value, default=str))
+        except (TypeError, ValueError):
+            return 0
@@ -9,6 +9,13 @@ STUDENTS_COLLECTION = os.getenv("STUDENTS_COLLECTION", "students")
 CONTENT_COLLECTION = os.getenv("CONTENT_COLLECTION", "content")
 SPONSORS_COLLECTION = os.getenv("SPONSORS_COLLECTION", "sponsors")
 RECOMMENDATIONS_COLLECTION = os.getenv("RECOMMENDATIONS_COLLECTION", "recommendations")
+# Documents fetched per cursor round trip when streaming collections
+MONGO_BATCH_SIZE = int(os.getenv("MONGO_BATCH_SIZE", 1000))
+# Batch saves: upserts per unordered bulk_write, and full batches allowed to wait for the writer thread
+BULK_WRITE_BATCH_SIZE = int(os.getenv("BULK_WRITE_BATCH_SIZE", 500))
+BULK_WRITE_QUEUE_BATCHES = int(os.getenv("BULK_WRITE_QUEUE_BATCHES", 4))
+# data_ingest: sheet rows read, normalized and upserted per chunk
+INGEST_CHUNK_SIZE = int(os.getenv("INGEST_CHUNK_SIZE", 5000))
 
 # Algorithm weights and settings
 CONTENT_WEIGHT = float(os.getenv("CONTENT_WEIGHT", 0.6))
@@ -20,14 +27,77 @@ TOP_K_SPONSORS = int(os.getenv("TOP_K_SPONSORS", 10))
 TOP_K_STUDENTS = int(os.getenv("TOP_K_STUDENTS", 5))
 TOP_K_TEACHERS = int(os.getenv("TOP_K_TEACHERS", 5))
 
+# Collaborative filtering: keep only the N most similar neighbours per request (0 = all)
+COLLAB_MAX_NEIGHBORS = int(os.getenv("COLLAB_MAX_NEIGHBORS", 0))
+# Optional MinHash-LSH neighbour retrieval (approximate Jaccard); recall grows with bands, precision with rows
+COLLAB_LSH = os.getenv("COLLAB_LSH", "false").lower() in {"1", "true", "yes"}
+COLLAB_LSH_BANDS = int(os.getenv("COLLAB_LSH_BANDS", 32))
+COLLAB_LSH_ROWS = int(os.getenv("COLLAB_LSH_ROWS", 2))
+
 # ANN retrieval settings (first-stage candidate generation)
 USE_ANN = os.getenv("USE_ANN", "true").lower() in {"1", "true", "yes"}
 ANN_N_NEIGHBORS = int(os.getenv("ANN_N_NEIGHBORS", 200))
 ANN_CANDIDATES = int(os.getenv("ANN_CANDIDATES", 150))
+ANN_DIM = int(os.getenv("ANN_DIM", 128))  # reduced dimensions of the IVF index
+ANN_NLIST = int(os.getenv("ANN_NLIST", 0))  # IVF cells (0 = sqrt(n_courses))
+ANN_NPROBE = int(os.getenv("ANN_NPROBE", 16))  # cells scanned per query (recall vs speed)
+# Gated mode: models score only the ANN candidate pool instead of the whole catalog
+ANN_GATED = os.getenv("ANN_GATED", "false").lower() in {"1", "true", "yes"}
 
 # Bandit exploration (optional, default off)
 BANDIT_EPSILON = float(os.getenv("BANDIT_EPSILON", 0.0))  # 0..1, probability of explore
 BANDIT_EXPLORE_K = int(os.getenv("BANDIT_EXPLORE_K", 3))  # number of items to randomize into top-K
 
+# Model store: verify per-artifact sha256 on load (sizes are always checked)
+MODEL_STORE_VERIFY = os.getenv("MODEL_STORE_VERIFY", "false").lower() in {"1", "true", "yes"}
+
+# Incremental retraining: refit from scratch once courses or students changed by more than this
+# fraction (cumulative) since the last full fit; below it, only the delta is transformed and patched in
+INCREMENTAL_MAX_DRIFT = float(os.getenv("INCREMENTAL_MAX_DRIFT", 0.2))
+
+# Batch scoring: students per vectorized chunk in recommend_many/batch_recommendations
+BATCH_CHUNK_SIZE = int(os.getenv("BATCH_CHUNK_SIZE", 256))
+# Worker processes for batch runs (1 = in-process; >1 forks a pool sharing the fitted models)
+BATCH_WORKERS = int(os.getenv("BATCH_WORKERS", 1))
+
+# RecommenderService result cache: LRU bound (entries and approx. bytes, 0 = unbounded) and TTL in seconds (0 = none)
+RESULT_CACHE_MAX_ENTRIES = int(os.getenv("RESULT_CACHE_MAX_ENTRIES", 10000))
+RESULT_CACHE_MAX_BYTES = int(os.getenv("RESULT_CACHE_MAX_BYTES", 0))
+RESULT_CACHE_TTL = float(os.getenv("RESULT_CACHE_TTL", 900))
+
+# IndexedConnector (Mongo): recently read student profiles kept for PROFILE_CACHE_TTL seconds
+PROFILE_CACHE_MAX_ENTRIES = int(os.getenv("PROFILE_CACHE_MAX_ENTRIES", 10000))
+PROFILE_CACHE_TTL = float(os.getenv("PROFILE_CACHE_TTL", 60))
+
+# Precomputed mode: recently served records kept parsed in memory
+PRECOMPUTED_HOT_RECORDS = int(os.getenv("PRECOMPUTED_HOT_RECORDS", 1024))
+
+# Sharded binary output (offline_train --format sharded)
+OUTPUT_SHARDS = int(os.getenv("OUTPUT_SHARDS", 16))
+OUTPUT_COMPRESSION = os.getenv("OUTPUT_COMPRESSION", "gzip")  # gzip | zstd | none
+
+# OfflineConnector: keep normalized students/content/sponsors in a `<file>.cache.npz` sidecar,
+# reused while the spreadsheet's size and mtime are unchanged
+OFFLINE_CACHE = os.getenv("OFFLINE_CACHE", "true").lower() in {"1", "true", "yes"}
+
 # Scheduler
 SCHEDULE_HOURS = float(os.getenv("SCHEDULE_HOURS", 6))
+# Background retrains: students smoke-scored before a new engine is promoted, and reports kept
+RETRAIN_SMOKE_SAMPLE = int(os.getenv("RETRAIN_SMOKE_SAMPLE", 32))
+RETRAIN_HISTORY = int(os.getenv("RETRAIN_HISTORY", 20))
+
+# HTTP server (python -m ml_recommendation_service.server): requests arriving within
+# SERVER_BATCH_WINDOW_MS are scored together (up to SERVER_MAX_BATCH) on SERVER_WORKERS threads
+SERVER_HOST = os.getenv("SERVER_HOST", "0.0.0.0")
+SERVER_PORT = int(os.getenv("SERVER_PORT", 8000))
+SERVER_BATCH_WINDOW_MS = float(os.getenv("SERVER_BATCH_WINDOW_MS", 5))
+SERVER_MAX_BATCH = int(os.getenv("SERVER_MAX_BATCH", 64))
+SERVER_WORKERS = int(os.getenv("SERVER_WORKERS", 2))
+
+# Model memory (RecommendationEngine.memory_report): MEMORY_BUDGET_MB > 0 checks each training run
+# against a budget for the serving snapshot and warns, or with MEMORY_BUDGET_ACTION=refuse raises
+# MemoryBudgetExceeded instead of fitting/promoting; MEMORY_TRACE_FIT records tracemalloc
+# allocations per component while fitting (slows training down)
+MEMORY_BUDGET_MB = float(os.getenv("MEMORY_BUDGET_MB", 0))
+MEMORY_BUDGET_ACTION = os.getenv("MEMORY_BUDGET_ACTION", "warn").lower()  # warn | refuse
+MEMORY_TRACE_FIT = os.getenv("MEMORY_TRACE_FIT", "false").lower() in {"1", "true", "yes"}
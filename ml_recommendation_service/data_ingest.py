@@ -1,16 +1,23 @@
 from __future__ import annotations
 
 import os
-from typing import Any, Dict
+import uuid
+from datetime import datetime
+from typing import Any, Dict, List
 import pandas as pd
 
+from .bulk_writer import BulkWriter
+from .model_store import combine_hash
 from .mongo_connector import MongoDBConnector
+from .offline_connector import iter_frames, normalized_records
 from .config import (
     MONGO_URI,
     DB_NAME,
     STUDENTS_COLLECTION,
     CONTENT_COLLECTION,
     SPONSORS_COLLECTION,
+    INGEST_CHUNK_SIZE,
+    BULK_WRITE_QUEUE_BATCHES,
 )
 
 
@@ -18,6 +25,13 @@ EXCEL_STUDENTS = os.getenv("EXCEL_STUDENTS", "Student_rec.xlsx")
 EXCEL_CONTENT = os.getenv("EXCEL_CONTENT", "Content_rec.xlsx")
 EXCEL_SPONSORS = os.getenv("EXCEL_SPONSORS", "Sponsers_rec.xlsx")
 
+# (kind, preferred path, CSV fallback, collection, key field)
+_SOURCES = (
+    ("students", EXCEL_STUDENTS, "Student_rec.csv", STUDENTS_COLLECTION, "student_id"),
+    ("content", EXCEL_CONTENT, "Content_rec.csv", CONTENT_COLLECTION, "course_id"),
+    ("sponsors", EXCEL_SPONSORS, "Sponsers_rec.csv", SPONSORS_COLLECTION, "sponsor_id"),
+)
+
 
 def _resolve_path(pref: str, csv_alt: str) -> str | None:
     """Return an existing path: prefer pref, else csv_alt if exists, else None."""
@@ -28,84 +42,109 @@ def _resolve_path(pref: str, csv_alt: str) -> str | None:
     return None
 
 
-def _to_records(df: pd.DataFrame) -> list[Dict[str, Any]]:
-    return df.replace({pd.NA: None}).to_dict(orient="records")
+def _has_key(frame: pd.DataFrame, key: str) -> List[bool]:
+    """Per row: whether `key` is filled in (rows without it cannot be upserted)."""
+    if key not in frame.columns:
+        return [False] * len(frame)
+    col = frame[key]
+    return (col.notna() & col.astype(str).str.strip().ne("")).tolist()
 
 
-def load_excels_into_mongo():
-    conn = MongoDBConnector(MONGO_URI, DB_NAME)
-    # Students
-    students_path = _resolve_path(EXCEL_STUDENTS, "Student_rec.csv")
-    if students_path:
-        if students_path.lower().endswith(".xlsx"):
-            s_df = pd.read_excel(students_path)
-        else:
-            s_df = pd.read_csv(students_path)
-        # Normalize columns if needed
-        # Expect columns: student_id, interests (comma-separated), profile.gpa, profile.department, profile.year
-        records = []
-        for r in _to_records(s_df):
-            interests = r.get("interests")
-            if isinstance(interests, str):
-                r["interests"] = [x.strip() for x in interests.split(",") if x.strip()]
-            profile = {
-                "gpa": r.pop("gpa", None) or r.pop("profile.gpa", None),
-                "department": r.pop("department", None) or r.pop("profile.department", None),
-                "year": r.pop("year", None) or r.pop("profile.year", None),
-            }
-            r["profile"] = {k: v for k, v in profile.items() if v is not None}
-            r["student_id"] = str(r.get("student_id"))
-            records.append(r)
-        if records:
-            coll = conn._db[STUDENTS_COLLECTION]
-            coll.delete_many({})
-            coll.insert_many(records)
-            print(f"Inserted {len(records)} students")
-
-    # Content
-    content_path = _resolve_path(EXCEL_CONTENT, "Content_rec.csv")
-    if content_path:
-        if content_path.lower().endswith(".xlsx"):
-            c_df = pd.read_excel(content_path)
-        else:
-            c_df = pd.read_csv(content_path)
-        records = []
-        for r in _to_records(c_df):
-            tags = r.get("tags")
-            if isinstance(tags, str):
-                r["tags"] = [x.strip() for x in tags.split(",") if x.strip()]
-            r["course_id"] = str(r.get("course_id"))
-            records.append(r)
-        if records:
-            coll = conn._db[CONTENT_COLLECTION]
-            coll.delete_many({})
-            coll.insert_many(records)
-            print(f"Inserted {len(records)} courses")
-
-    # Sponsors
-    sponsors_path = _resolve_path(EXCEL_SPONSORS, "Sponsers_rec.csv")
-    if sponsors_path:
-        if sponsors_path.lower().endswith(".xlsx"):
-            sp_df = pd.read_excel(sponsors_path)
+def _upsert_chunk(coll, key: str, docs: List[Dict[str, Any]], run: str) -> Dict[str, int]:
+    """Replace changed documents by `key` and stamp unchanged ones with `run`.
+
+    Each document carries `ingest_hash` (its normalized content) and
+    `ingest_run`; only new or changed documents are rewritten and get a fresh
+    `updated_at`. Returns {"failed": n, "skipped": m} for BulkWriter.
+    """
+    from pymongo import ReplaceOne, UpdateMany
+    from pymongo.errors import BulkWriteError
+
+    # a key repeated in the sheet keeps its last row
+    latest = {doc[key]: doc for doc in docs}
+    stored = {
+        d.get(key): d.get("ingest_hash")
+        for d in coll.find({key: {"$in": list(latest)}}, {key: 1, "ingest_hash": 1, "_id": 0})
+    }
+    now = datetime.utcnow()
+    ops: List[Any] = []
+    unchanged: List[str] = []
+    for doc_id, doc in latest.items():
+        h = combine_hash(doc)
+        if stored.get(doc_id) == h:
+            unchanged.append(doc_id)
         else:
-            sp_df = pd.read_csv(sponsors_path)
-        records = []
-        for r in _to_records(sp_df):
-            crit = {}
-            if "min_gpa" in r and pd.notna(r["min_gpa"]):
-                crit["min_gpa"] = float(r["min_gpa"])  # type: ignore[arg-type]
-            if "required_department" in r and pd.notna(r["required_department"]):
-                crit["required_department"] = str(r["required_department"])  # type: ignore[arg-type]
-            if "min_year" in r and pd.notna(r["min_year"]):
-                crit["min_year"] = int(r["min_year"])  # type: ignore[arg-type]
-            r["criteria"] = crit
-            r["sponsor_id"] = str(r.get("sponsor_id"))
-            records.append(r)
-        if records:
-            coll = conn._db[SPONSORS_COLLECTION]
-            coll.delete_many({})
-            coll.insert_many(records)
-            print(f"Inserted {len(records)} sponsors")
+            ops.append(ReplaceOne({key: doc_id}, {**doc, "ingest_hash": h, "ingest_run": run, "updated_at": now}, upsert=True))
+    if unchanged:
+        ops.append(UpdateMany({key: {"$in": unchanged}}, {"$set": {"ingest_run": run}}))
+    counts = {"failed": 0, "skipped": len(docs) - len(latest) + len(unchanged)}
+    try:
+        coll.bulk_write(ops, ordered=False)
+    except BulkWriteError as e:
+        counts["failed"] = len(e.details.get("writeErrors", []))
+    return counts
+
+
+def ingest_file(
+    conn: MongoDBConnector,
+    kind: str,
+    path: str,
+    collection: str,
+    key: str,
+    chunk_size: int = INGEST_CHUNK_SIZE,
+) -> Dict[str, Any]:
+    """Stream one sheet into `collection` with upserts keyed on `key`.
+
+    Chunks are read and normalized like OfflineConnector rows (ids as text,
+    so they do not depend on chunk boundaries) and written by a BulkWriter
+    while the next chunk is read. Rows without `key` are counted in
+    "missing_key" and not written (content rows get a generated course_id). Documents whose key is no longer
+    in the sheet are deleted only after every chunk was written without
+    errors, so readers never see an empty or half-loaded collection and a
+    failed run can simply be repeated.
+    """
+    coll = conn._db[collection]
+    run = uuid.uuid4().hex
+    rows = missing_key = 0
+    with BulkWriter(lambda docs: _upsert_chunk(coll, key, docs, run), chunk_size, BULK_WRITE_QUEUE_BATCHES) as writer:
+        for frame in iter_frames(path, chunk_size):
+            docs = normalized_records(kind, frame, start=rows)
+            rows += len(frame)
+            # content rows without a course_id get a generated one; other kinds are skipped
+            if kind != "content":
+                keep = _has_key(frame, key)
+                missing_key += keep.count(False)
+                docs = [doc for doc, ok in zip(docs, keep) if ok]
+            writer.add_many(docs)
+    stats = writer.stats()
+    removed = 0
+    if rows > missing_key and not stats["failed"]:
+        removed = coll.delete_many({"ingest_run": {"$ne": run}}).deleted_count
+    return {
+        "rows": rows,
+        "written": stats["written"],
+        "unchanged": stats["skipped"],
+        "failed": stats["failed"],
+        "missing_key": missing_key,
+        "removed": removed,
+    }
+
+
+def load_excels_into_mongo(chunk_size: int = INGEST_CHUNK_SIZE):
+    conn = MongoDBConnector(MONGO_URI, DB_NAME)
+    for kind, pref, csv_alt, collection, key in _SOURCES:
+        path = _resolve_path(pref, csv_alt)
+        if not path:
+            continue
+        stats = ingest_file(conn, kind, path, collection, key, chunk_size)
+        print(
+            f"Ingested {stats['rows']} {kind} rows from {path}: {stats['written']} written, "
+            f"{stats['unchanged']} unchanged, {stats['failed']} failed, {stats['removed']} removed"
+        )
+        if stats["missing_key"]:
+            print(f"Skipped {stats['missing_key']} {kind} rows in {path} without a {key}")
+        if stats["failed"]:
+            print(f"Kept {kind} missing from {path} because some writes failed; rerun to finish")
 
 
 if __name__ == "__main__":
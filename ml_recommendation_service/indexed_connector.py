@@ -0,0 +1,96 @@
+from __future__ import annotations
+
+import threading
+from types import MappingProxyType
+from typing import Any, Dict, Mapping, Optional, Tuple
+
+from .cache import ResultCache
+from .config import PROFILE_CACHE_MAX_ENTRIES, PROFILE_CACHE_TTL
+from .utils.forksafe import fork_safe
+
+Rows = Tuple[Dict[str, Any], ...]
+
+
+class IndexedConnector:
+    """Wraps any connector with O(1) id lookups and read-only row views.
+
+    `get_all_*` return tuples, so callers share one copy of the rows. For
+    connectors whose data cannot change after construction (`static = True`,
+    e.g. InMemoryConnector and OfflineConnector) rows are read once and
+    profiles are looked up in a dict built from them. For the others (Mongo),
+    `get_all_*` always read through, and `get_student_profile` goes through a
+    bounded LRU with a `profile_ttl` expiry. Call `invalidate(student_id)` after
+    a student is written so the next lookup fetches it again.
+
+    Anything else (`save_recommendations`, connector-specific helpers) is passed
+    to the wrapped connector.
+    """
+
+    def __init__(
+        self,
+        connector: Any,
+        *,
+        static: Optional[bool] = None,
+        profile_ttl: float = PROFILE_CACHE_TTL,
+        profile_cache_size: int = PROFILE_CACHE_MAX_ENTRIES,
+    ) -> None:
+        self.connector = connector
+        self.static = bool(getattr(connector, "static", False)) if static is None else static
+        self._profiles = ResultCache(max_entries=profile_cache_size, ttl_seconds=profile_ttl)
+        self._lock = threading.Lock()
+        fork_safe(self)
+        self._rows: Dict[str, Rows] = {}
+        self._student_index: Mapping[str, Dict[str, Any]] = MappingProxyType({})
+
+    # ---- API compatible getters ----
+    def get_all_students(self) -> Rows:
+        return self._load("students", self.connector.get_all_students)
+
+    def get_all_content(self) -> Rows:
+        return self._load("content", self.connector.get_all_content)
+
+    def get_all_sponsors(self) -> Rows:
+        return self._load("sponsors", self.connector.get_all_sponsors)
+
+    def get_student_profile(self, student_id: str) -> Optional[Dict[str, Any]]:
+        sid = str(student_id)
+        if self.static:
+            self.get_all_students()
+            return self._student_index.get(sid)
+        profile = self._profiles.get(sid)
+        if profile is None:
+            profile = self.connector.get_student_profile(sid)
+            if profile is not None:
+                self._profiles.put(sid, profile)
+        return profile
+
+    def invalidate(self, student_id: Optional[str] = None) -> None:
+        """Forget one cached profile, or all of them when no id is given."""
+        if student_id is None:
+            self._profiles.clear()
+        else:
+            self._profiles.invalidate(str(student_id))
+
+    def profile_cache_stats(self) -> Dict[str, Any]:
+        return self._profiles.stats()
+
+    def __getattr__(self, name: str) -> Any:
+        # only called for attributes not found on the wrapper
+        if name == "connector":
+            raise AttributeError(name)
+        return getattr(self.connector, name)
+
+    # ---- internals ----
+    def _load(self, kind: str, fetch) -> Rows:
+        if not self.static:
+            return tuple(fetch() or ())
+        rows = self._rows.get(kind)
+        if rows is None:
+            with self._lock:
+                rows = self._rows.get(kind)
+                if rows is None:
+                    rows = tuple(fetch() or ())
+                    if kind == "students":
+                        self._student_index = MappingProxyType({str(s.get("student_id")): s for s in rows})
+                    self._rows[kind] = rows
+        return rows
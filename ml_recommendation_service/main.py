@@ -3,12 +3,28 @@ from __future__ import annotations
 import argparse
 import time
 
-from .config import MONGO_URI, DB_NAME, SCHEDULE_HOURS
+from .config import MONGO_URI, DB_NAME, SCHEDULE_HOURS, BATCH_WORKERS
 from .mongo_connector import MongoDBConnector
 from .recommendation_engine import RecommendationEngine
+from .retrain import Retrainer
 
 
-def run_once(student_id: str | None, batch: bool):
+def _print_batch_stats(result) -> None:
+    print(f"  recomputed {result['recomputed']} of {result['students']} students" + (" (full)" if result["full"] else ""))
+    stats = result["writes"]
+    if not stats:
+        return
+    print(
+        f"  wrote {stats['written']} in {stats['batches']} batches, {stats['skipped']} unchanged skipped "
+        f"(mean {stats['mean_batch_seconds'] * 1000:.1f} ms, max {stats['max_batch_seconds'] * 1000:.1f} ms); "
+        f"{stats['failed']} failed in {stats['failed_batches']} batches"
+    )
+    for batch in stats["recent"]:
+        if batch["error"]:
+            print(f"  batch of {batch['size']} failed: {batch['error']}")
+
+
+def run_once(student_id: str | None, batch: bool, workers: int = BATCH_WORKERS):
     connector = MongoDBConnector(MONGO_URI, DB_NAME)
     engine = RecommendationEngine(connector)
     engine.train_models()
@@ -17,21 +33,47 @@ def run_once(student_id: str | None, batch: bool):
         connector.save_recommendations(student_id, rec)
         print(f"Saved recommendations for student {student_id}")
     if batch:
-        engine.batch_recommendations()
+        result = engine.batch_recommendations(workers=workers)
         print("Batch recommendations complete")
+        _print_batch_stats(result)
+
 
+def _print_retrain_report(report) -> None:
+    phases = ", ".join(f"{name} {seconds:.2f}s" for name, seconds in report["phases"].items())
+    version = f" v{report['version']}" if report["version"] is not None else ""
+    print(f"[schedule] retrain {report['status']}{version} ({phases})")
+    if report["error"]:
+        print(f"[schedule] {report['error']}")
 
-def run_scheduler():
+
+def run_scheduler(workers: int = BATCH_WORKERS):
     import schedule
 
     connector = MongoDBConnector(MONGO_URI, DB_NAME)
-    engine = RecommendationEngine(connector)
-    engine.train_models()
+    retrainer = Retrainer(RecommendationEngine(connector))
 
-    def job():
-        engine.train_models()
-        engine.batch_recommendations()
+    def batch(engine):
+        # Only students whose inputs (or recommended courses) changed since the last batch
+        result = engine.batch_recommendations(workers=workers, incremental=True)
         print("[schedule] Batch recommendations done")
+        _print_batch_stats(result)
+        return result
+
+    def report(result):
+        if result["status"] == "unchanged":
+            print("[schedule] No data changes; models kept")
+            if result["error"]:
+                print(f"[schedule] {result['error']}")
+        else:
+            _print_retrain_report(result)
+
+    def job():
+        # Incremental: a copy of the serving engine patches its models with changed documents
+        # only, is smoke-tested and then promoted. The batch runs even when nothing changed, so
+        # students whose writes failed last time are retried (the rest are skipped as clean).
+        # It trains on a background thread so the scheduling loop never blocks; runs never overlap.
+        if not retrainer.start(incremental=True, after_promote=batch, on_report=report):
+            print("[schedule] Previous retrain still running; skipped")
 
     # Run once immediately
     job()
@@ -49,12 +91,13 @@ def main():
     parser.add_argument("--student", type=str, default=None, help="Run for a single student id")
     parser.add_argument("--batch-once", action="store_true", help="Run batch for all students once")
     parser.add_argument("--schedule", action="store_true", help="Start scheduler (every N hours)")
+    parser.add_argument("--workers", type=int, default=BATCH_WORKERS, help="Worker processes for batch scoring")
     args = parser.parse_args()
 
     if args.schedule:
-        run_scheduler()
+        run_scheduler(args.workers)
     else:
-        run_once(args.student, args.batch_once)
+        run_once(args.student, args.batch_once, args.workers)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,157 @@
+from __future__ import annotations
+
+import gc
+import mmap
+import sys
+import threading
+import tracemalloc
+import types
+import warnings
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional, Set
+
+import numpy as np
+
+from .metrics import METRICS
+
+# Attributes listed per component in a report, largest first
+_TOP_ATTRIBUTES = 8
+# Shared by every instance (or the whole process); never attributed to a model
+_OPAQUE = (bool, type, types.ModuleType, types.FunctionType, types.BuiltinFunctionType, types.MethodType, threading.Lock().__class__)
+
+
+class MemoryBudgetExceeded(RuntimeError):
+    """Raised instead of fitting (or promoting) models that would not fit in MEMORY_BUDGET_MB."""
+
+
+def _is_mapped(arr: np.ndarray) -> bool:
+    base: Any = arr
+    while base is not None:
+        if isinstance(base, (np.memmap, mmap.mmap)):
+            return True
+        base = getattr(base, "base", None)
+    return False
+
+
+def _owner(arr: np.ndarray) -> np.ndarray:
+    """The array that owns `arr`'s buffer, so views are not counted twice."""
+    while isinstance(arr.base, np.ndarray):
+        arr = arr.base
+    return arr
+
+
+def measure(obj: Any, seen: Optional[Set[int]] = None) -> Dict[str, int]:
+    """Bytes reachable from `obj`, as {"arrays", "mapped", "python"}.
+
+    numpy buffers count their `nbytes` once per owning array ("mapped" when
+    they are backed by a memory-mapped file, i.e. page cache rather than
+    heap), as do tensor storages (e.g. a loaded sentence-transformers model);
+    scipy sparse matrices are reached through their data/index arrays.
+    Everything else counts `sys.getsizeof` of each container, string and
+    object reached. Objects already in `seen` (by id) are skipped, so passing
+    the same set across calls attributes shared objects to the first caller.
+    """
+    seen = set() if seen is None else seen
+    out = {"arrays": 0, "mapped": 0, "python": 0}
+    stack = [obj]
+    while stack:
+        o = stack.pop()
+        if o is None or isinstance(o, _OPAQUE) or id(o) in seen:
+            continue
+        seen.add(id(o))
+        if isinstance(o, np.ndarray):
+            owner = _owner(o)
+            if owner is not o:
+                out["python"] += sys.getsizeof(o)
+                stack.append(owner)
+            elif _is_mapped(o):
+                out["python"] += sys.getsizeof(o)
+                out["mapped"] += o.nbytes
+            else:
+                # getsizeof of an owning array includes its buffer
+                out["python"] += max(0, sys.getsizeof(o) - o.nbytes)
+                out["arrays"] += o.nbytes
+            continue
+        out["python"] += sys.getsizeof(o)
+        if hasattr(o, "element_size") and hasattr(o, "nelement"):
+            out["arrays"] += int(o.element_size() * o.nelement())
+            continue
+        if isinstance(o, dict):
+            stack.extend(o.keys())
+            stack.extend(o.values())
+        elif isinstance(o, types.MappingProxyType):
+            # read-only view: the dict behind it holds the entries
+            stack.extend(gc.get_referents(o))
+        elif isinstance(o, (list, tuple, set, frozenset)):
+            stack.extend(o)
+        elif isinstance(o, (str, bytes, int, float, complex, np.generic)):
+            continue
+        else:
+            if hasattr(o, "__dict__"):
+                stack.append(vars(o))
+            for slot in getattr(type(o), "__slots__", ()):
+                stack.append(getattr(o, slot, None))
+    return out
+
+
+def component_report(model: Any, seen: Optional[Set[int]] = None) -> Dict[str, Any]:
+    """`measure` of one model, with a per-attribute breakdown of its largest members."""
+    seen = set() if seen is None else seen
+    totals = {"arrays": 0, "mapped": 0, "python": sys.getsizeof(model)}
+    seen.add(id(model))
+    attributes: Dict[str, int] = {}
+    for name, value in vars(model).items() if hasattr(model, "__dict__") else ():
+        sizes = measure(value, seen)
+        for key, n in sizes.items():
+            totals[key] += n
+        attributes[name] = sizes["arrays"] + sizes["python"]
+    largest = sorted(attributes.items(), key=lambda kv: kv[1], reverse=True)[:_TOP_ATTRIBUTES]
+    return {
+        "type": type(model).__name__,
+        **totals,
+        # resident heap: mapped pages are shared with the page cache and other processes
+        "total": totals["arrays"] + totals["python"],
+        "attributes": {name: n for name, n in largest if n},
+    }
+
+
+def rows_report(rows: Any, index: Any, seen: Optional[Set[int]] = None) -> Dict[str, Any]:
+    """Like `component_report`, for the raw documents of a snapshot and their id index."""
+    seen = set() if seen is None else seen
+    sizes = {"rows": measure(rows, seen), "index": measure(index, seen)}
+    totals = {key: sum(s[key] for s in sizes.values()) for key in ("arrays", "mapped", "python")}
+    return {
+        "type": "rows",
+        "count": len(rows),
+        **totals,
+        "total": totals["arrays"] + totals["python"],
+        "attributes": {name: s["arrays"] + s["python"] for name, s in sizes.items()},
+    }
+
+
+@contextmanager
+def trace_allocations(into: Dict[str, Dict[str, int]], name: str) -> Iterator[None]:
+    """Record the bytes allocated while the block runs (retained and peak) under `into[name]`."""
+    started = not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start()
+    tracemalloc.reset_peak()
+    before, _ = tracemalloc.get_traced_memory()
+    try:
+        yield
+    finally:
+        current, peak = tracemalloc.get_traced_memory()
+        into[name] = {"retained": max(0, current - before), "peak": max(0, peak - before)}
+        if started:
+            tracemalloc.stop()
+
+
+def enforce_budget(needed: int, budget_mb: float, action: str, what: str) -> None:
+    """Warn, or raise MemoryBudgetExceeded when `action` is "refuse", if `needed` bytes exceed the budget."""
+    if budget_mb <= 0 or needed <= budget_mb * 1024 * 1024:
+        return
+    message = f"{what}: {needed / 1024 / 1024:.1f} MB exceeds MEMORY_BUDGET_MB={budget_mb:g}"
+    METRICS.incr("memory_budget_exceeded", action=action)
+    if action == "refuse":
+        raise MemoryBudgetExceeded(message)
+    warnings.warn(message, RuntimeWarning, stacklevel=3)
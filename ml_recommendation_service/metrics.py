@@ -0,0 +1,163 @@
+from __future__ import annotations
+
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from .utils.forksafe import fork_safe
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _labels(labels: Dict[str, Any]) -> Labels:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+class Metrics:
+    """In-process counters, gauges and summaries with labels. Thread-safe.
+
+    Summaries keep count, sum and max (enough for rates and means without
+    histogram buckets), e.g. `stage_seconds{op="recommend",stage="content"}`
+    or `ann_candidates`. `snapshot()` returns everything as JSON-ready
+    dicts; `prometheus()` renders the text exposition format with every
+    name prefixed by `prefix`.
+    """
+
+    def __init__(self, prefix: str = "rec_") -> None:
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        fork_safe(self)
+        self._counters: Dict[str, Dict[Labels, float]] = {}
+        self._gauges: Dict[str, Dict[Labels, float]] = {}
+        # name -> labels -> [count, sum, max]
+        self._summaries: Dict[str, Dict[Labels, List[float]]] = {}
+
+    def incr(self, name: str, value: float = 1, **labels: Any) -> None:
+        key = _labels(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def set_gauge(self, name: str, value: float, **labels: Any) -> None:
+        with self._lock:
+            self._gauges.setdefault(name, {})[_labels(labels)] = float(value)
+
+    def observe(self, name: str, value: float, **labels: Any) -> None:
+        key = _labels(labels)
+        with self._lock:
+            series = self._summaries.setdefault(name, {})
+            entry = series.get(key)
+            if entry is None:
+                series[key] = [1, value, value]
+            else:
+                entry[0] += 1
+                entry[1] += value
+                if value > entry[2]:
+                    entry[2] = value
+
+    def stages(self, op: str) -> "StageTimer":
+        return StageTimer(self, op)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counters.clear()
+            self._gauges.clear()
+            self._summaries.clear()
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "counters": {name: [{"labels": dict(k), "value": v} for k, v in s.items()] for name, s in self._counters.items()},
+                "gauges": {name: [{"labels": dict(k), "value": v} for k, v in s.items()] for name, s in self._gauges.items()},
+                "summaries": {
+                    name: [
+                        {"labels": dict(k), "count": int(c), "sum": round(total, 6), "mean": round(total / c, 6), "max": round(mx, 6)}
+                        for k, (c, total, mx) in s.items()
+                    ]
+                    for name, s in self._summaries.items()
+                },
+            }
+
+    def prometheus(self) -> str:
+        lines: List[str] = []
+        with self._lock:
+            for name, series in sorted(self._counters.items()):
+                full = self.prefix + name + "_total"
+                lines.append(f"# TYPE {full} counter")
+                lines.extend(f"{full}{_render(k)} {_number(v)}" for k, v in series.items())
+            for name, series in sorted(self._gauges.items()):
+                full = self.prefix + name
+                lines.append(f"# TYPE {full} gauge")
+                lines.extend(f"{full}{_render(k)} {_number(v)}" for k, v in series.items())
+            for name, series in sorted(self._summaries.items()):
+                full = self.prefix + name
+                lines.append(f"# TYPE {full} summary")
+                for k, (count, total, mx) in series.items():
+                    lines.append(f"{full}_count{_render(k)} {int(count)}")
+                    lines.append(f"{full}_sum{_render(k)} {_number(total)}")
+                lines.append(f"# TYPE {full}_max gauge")
+                lines.extend(f"{full}_max{_render(k)} {_number(mx)}" for k, (_, _, mx) in series.items())
+        return "\n".join(lines) + "\n"
+
+
+class StageTimer:
+    """Times the stages of one operation into `stage_seconds{op,stage}`.
+
+    The timings of this run are also kept in `timings` (seconds per stage,
+    summed if a stage repeats), and values passed to `note` in `values`, for
+    debug output.
+    """
+
+    def __init__(self, metrics: Metrics, op: str) -> None:
+        self._metrics = metrics
+        self.op = op
+        self.timings: Dict[str, float] = {}
+        self.values: Dict[str, float] = {}
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def record(self, name: str, seconds: float) -> None:
+        self.timings[name] = self.timings.get(name, 0.0) + seconds
+        self._metrics.observe("stage_seconds", seconds, op=self.op, stage=name)
+
+    def note(self, name: str, value: float) -> None:
+        """Record a per-run value (e.g. a candidate pool size) as summary `name{op}`."""
+        self.values[name] = value
+        self._metrics.observe(name, value, op=self.op)
+
+    def total(self) -> float:
+        return sum(self.timings.values())
+
+    def as_ms(self) -> Dict[str, float]:
+        return {name: round(seconds * 1000.0, 4) for name, seconds in self.timings.items()}
+
+
+def swallowed(component: str, where: str, metrics: Optional[Metrics] = None) -> None:
+    """Count an exception that was caught and ignored (the code path fell back)."""
+    (metrics or METRICS).incr("swallowed_exceptions", component=component, where=where)
+
+
+def _render(labels: Labels) -> str:
+    if not labels:
+        return ""
+    body = ",".join(f'{k}="{_escape(v)}"' for k, v in labels)
+    return "{" + body + "}"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+# Process-wide registry used by the engine, adapter and server
+METRICS = Metrics()
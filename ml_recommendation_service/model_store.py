@@ -0,0 +1,237 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import shutil
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+# Bump when the on-disk layout or any model's state keys change incompatibly.
+SCHEMA_VERSION = 1
+
+_MANIFEST = "manifest.json"
+_CURRENT = "CURRENT"
+_SPARSE_PARTS = ("data", "indices", "indptr")
+
+
+def _sha256(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def hash_documents(docs: Iterable[Dict[str, Any]], fields: Optional[Iterable[str]] = None) -> str:
+    """Order-sensitive hash of the given fields (default: all) of each document (the rows models are fitted on)."""
+    fields = tuple(fields) if fields is not None else None
+    h = hashlib.sha1()
+    for d in docs:
+        values = [d.get(f) for f in fields] if fields is not None else d
+        h.update(json.dumps(values, sort_keys=True, default=str).encode("utf-8"))
+        h.update(b"\n")
+    return h.hexdigest()
+
+
+def combine_hash(*parts: Any) -> str:
+    return hashlib.sha1(json.dumps(parts, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+def document_hashes(docs: Iterable[Dict[str, Any]], key: str, fields: Iterable[str]) -> Dict[str, str]:
+    """Per-document hash of `fields`, keyed by `str(doc[key])`. Raises ValueError on missing or duplicate ids."""
+    fields = tuple(fields)
+    out: Dict[str, str] = {}
+    for d in docs:
+        doc_id = d.get(key)
+        if doc_id in (None, "") or str(doc_id) in out:
+            raise ValueError(f"missing or duplicate {key}: {doc_id!r}")
+        out[str(doc_id)] = hashlib.sha1(
+            json.dumps([d.get(f) for f in fields], sort_keys=True, default=str).encode("utf-8")
+        ).hexdigest()[:16]
+    return out
+
+
+@dataclass
+class DocumentDelta:
+    """Documents added or changed since the previous version, and ids that disappeared."""
+
+    changed: List[Dict[str, Any]] = field(default_factory=list)
+    removed: List[str] = field(default_factory=list)
+    drift: float = 0.0  # (changed + removed) / previous document count
+
+
+def diff_documents(
+    docs: Sequence[Dict[str, Any]],
+    key: str,
+    hashes: Dict[str, str],
+    previous_ids: Sequence[str],
+    previous_hashes: Sequence[str],
+) -> DocumentDelta:
+    """Compare current `docs` (with their `document_hashes`) against a previous version's ids/hashes."""
+    previous = dict(zip((str(i) for i in previous_ids), (str(h) for h in previous_hashes)))
+    changed = [d for d in docs if previous.get(str(d.get(key))) != hashes[str(d.get(key))]]
+    removed = [doc_id for doc_id in previous if doc_id not in hashes]
+    drift = (len(changed) + len(removed)) / max(1, len(previous))
+    return DocumentDelta(changed=changed, removed=removed, drift=drift)
+
+
+class ModelStore:
+    """Versioned on-disk model store.
+
+    Layout::
+
+        <root>/CURRENT                  name of the live version
+        <root>/<version>/manifest.json  schema version, input hashes, per-artifact checksums
+        <root>/<version>/<component>.<key>.npy
+
+    A component's state is a flat dict. numpy arrays are written as .npy,
+    scipy sparse matrices as their CSR data/indices/indptr arrays, and anything
+    else must be JSON-serialisable and goes into the manifest. Arrays are
+    loaded with mmap_mode='r', so startup is near-instant and several serving
+    processes share the same page cache.
+
+    Saving writes a new version directory and then swaps CURRENT with
+    os.replace, so readers never see a half-written version. A component
+    passed as `ModelStore.KEEP` is carried over from the current version by
+    hard link instead of being rewritten.
+    """
+
+    KEEP = object()
+
+    def __init__(self, root: Path, keep_versions: int = 2) -> None:
+        self.root = Path(root)
+        self.keep_versions = keep_versions
+
+    # ---- read ----
+    def current_version(self) -> Optional[str]:
+        try:
+            return (self.root / _CURRENT).read_text(encoding="utf-8").strip() or None
+        except OSError:
+            return None
+
+    def manifest(self) -> Optional[Dict[str, Any]]:
+        version = self.current_version()
+        if not version:
+            return None
+        try:
+            with open(self.root / version / _MANIFEST, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if manifest.get("schema_version") != SCHEMA_VERSION:
+            return None
+        return manifest
+
+    def load(self, component: str, input_hash: Optional[str] = None, verify: bool = False) -> Optional[Dict[str, Any]]:
+        """State of one component, or None if absent, stale (input hash differs) or corrupt."""
+        manifest = self.manifest()
+        if manifest is None:
+            return None
+        entry = manifest.get("components", {}).get(component)
+        if entry is None or (input_hash is not None and entry.get("input_hash") != input_hash):
+            return None
+        vdir = self.root / manifest["version"]
+        arrays: Dict[str, Any] = {}
+        try:
+            for key, art in entry.get("artifacts", {}).items():
+                path = vdir / art["file"]
+                if path.stat().st_size != art["bytes"]:
+                    return None
+                if verify and _sha256(path) != art["sha256"]:
+                    return None
+                arrays[key] = np.load(path, mmap_mode="r")
+        except (OSError, ValueError, KeyError):
+            return None
+
+        state: Dict[str, Any] = dict(entry.get("meta", {}))
+        for key, shape in entry.get("sparse", {}).items():
+            from scipy.sparse import csr_matrix
+
+            parts = [arrays.pop(f"{key}.{p}") for p in _SPARSE_PARTS]
+            state[key] = csr_matrix(tuple(parts), shape=tuple(shape), copy=False)
+        state.update(arrays)
+        return state
+
+    # ---- write ----
+    def save(self, components: Dict[str, Any], input_hashes: Dict[str, str]) -> str:
+        """Write a new version containing `components` and make it current; returns its name."""
+        previous = self.manifest()
+        version = time.strftime("%Y%m%dT%H%M%S") + "-" + hashlib.sha1(
+            json.dumps(input_hashes, sort_keys=True).encode("utf-8") + str(time.time_ns()).encode()
+        ).hexdigest()[:8]
+        vdir = self.root / version
+        vdir.mkdir(parents=True, exist_ok=True)
+
+        entries: Dict[str, Any] = {}
+        for name, state in components.items():
+            if state is self.KEEP:
+                entry = self._carry_over(previous, name, vdir)
+                if entry is not None:
+                    entries[name] = entry
+                continue
+            if state is None:
+                continue
+            entries[name] = self._write_component(vdir, name, state, input_hashes.get(name))
+
+        manifest = {
+            "schema_version": SCHEMA_VERSION,
+            "version": version,
+            "created_at": time.time(),
+            "content_hash": hashlib.sha1(json.dumps(input_hashes, sort_keys=True).encode("utf-8")).hexdigest(),
+            "components": entries,
+        }
+        with open(vdir / _MANIFEST, "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+        tmp = self.root / (_CURRENT + ".tmp")
+        tmp.write_text(version, encoding="utf-8")
+        os.replace(tmp, self.root / _CURRENT)
+        self._prune(version)
+        return version
+
+    def _write_component(self, vdir: Path, name: str, state: Dict[str, Any], input_hash: Optional[str]) -> Dict[str, Any]:
+        meta: Dict[str, Any] = {}
+        artifacts: Dict[str, Any] = {}
+        sparse: Dict[str, Any] = {}
+
+        def _write_array(key: str, arr: np.ndarray) -> None:
+            fname = f"{name}.{key}.npy"
+            np.save(vdir / fname, np.ascontiguousarray(arr))
+            path = vdir / fname
+            artifacts[key] = {"file": fname, "bytes": path.stat().st_size, "sha256": _sha256(path)}
+
+        for key, value in state.items():
+            if isinstance(value, np.ndarray):
+                _write_array(key, value)
+            elif hasattr(value, "tocsr") and hasattr(value, "nnz"):
+                csr = value.tocsr()
+                for part in _SPARSE_PARTS:
+                    _write_array(f"{key}.{part}", getattr(csr, part))
+                sparse[key] = list(csr.shape)
+            else:
+                meta[key] = value
+        return {"input_hash": input_hash, "meta": meta, "artifacts": artifacts, "sparse": sparse}
+
+    def _carry_over(self, previous: Optional[Dict[str, Any]], name: str, vdir: Path) -> Optional[Dict[str, Any]]:
+        if previous is None or name not in previous.get("components", {}):
+            return None
+        entry = previous["components"][name]
+        src_dir = self.root / previous["version"]
+        for art in entry.get("artifacts", {}).values():
+            src, dst = src_dir / art["file"], vdir / art["file"]
+            try:
+                os.link(src, dst)
+            except OSError:
+                shutil.copy2(src, dst)
+        return entry
+
+    def _prune(self, current: str) -> None:
+        # Old versions stay readable by processes that already mmapped them (POSIX unlink semantics).
+        versions = sorted(p for p in self.root.iterdir() if p.is_dir() and (p / _MANIFEST).exists())
+        stale = [p for p in versions if p.name != current][: max(0, len(versions) - self.keep_versions)]
+        for p in stale:
+            shutil.rmtree(p, ignore_errors=True)
@@ -1,48 +1,181 @@
 from __future__ import annotations
 
-from typing import List, Dict, Any
+from typing import Any, Dict, List, Optional
+
 import numpy as np
 
-try:
-    from sklearn.neighbors import NearestNeighbors
-except Exception:  # pragma: no cover
-    NearestNeighbors = None  # type: ignore
+from ..utils.similarity import top_k_indices
 
 
 class ANNRetriever:
-    """Approximate nearest neighbor style retriever using scikit-learn KNN.
+    """Inverted-file (IVF) approximate nearest neighbour index over course vectors.
+
+    TF-IDF course rows (from ContentBasedRecommender) are projected to `dim`
+    dense dimensions with a randomized SVD and L2-normalised, then clustered
+    into `nlist` cells with spherical k-means. A query is projected the same
+    way, compared against the cell centroids, and only the rows of the
+    `nprobe` closest cells are scored. When the query is a sparse TF-IDF row
+    and the course matrix is attached, those rows are reranked with the exact
+    TF-IDF cosine; otherwise the reduced vectors are used. Cost per query is
+    O(nlist + n / nlist * nprobe) instead of O(n).
 
-    Uses cosine distance over TF-IDF course vectors (from ContentBasedRecommender) to
-    quickly retrieve top-N candidate courses for a student's TF-IDF interest vector.
-    This is a CPU-friendly baseline; in large-scale production, switch to FAISS/HNSW.
+    The index is plain numpy arrays, persisted through ModelStore and
+    memory-mapped on load, so startup does not refit.
     """
 
-    def __init__(self, n_neighbors: int = 200, metric: str = "cosine") -> None:
-        self.n_neighbors = n_neighbors
+    _FILES = ("components", "centroids", "vectors", "list_offsets", "list_rows")
+
+    def __init__(
+        self,
+        n_neighbors: int = 200,
+        metric: str = "cosine",
+        dim: int = 128,
+        nlist: int = 0,
+        nprobe: int = 16,
+        seed: int = 0,
+    ) -> None:
+        if metric != "cosine":
+            raise ValueError(f"ANNRetriever only supports cosine, got {metric!r}")
+        self.n_neighbors = n_neighbors  # max results per query
         self.metric = metric
-        self._nn = None
+        self.dim = dim
+        self.nlist = nlist  # 0 = sqrt(n_courses)
+        self.nprobe = nprobe
+        self.seed = seed
         self._course_ids: List[str] = []
-        self._matrix = None
+        self._components: Optional[np.ndarray] = None  # (dim, vocab) projection
+        self._centroids: Optional[np.ndarray] = None  # (nlist, dim)
+        self._vectors: Optional[np.ndarray] = None  # (n, dim), L2-normalised
+        self._list_offsets: Optional[np.ndarray] = None  # (nlist + 1,) into _list_rows
+        self._list_rows: Optional[np.ndarray] = None  # (n,) row ids grouped by cell
+        self._matrix = None  # TF-IDF course matrix for exact reranking (shared, not persisted)
 
+    # ---- build ----
     def fit(self, course_matrix, course_ids: List[str]) -> None:
-        if NearestNeighbors is None or course_matrix is None or len(course_ids) == 0:
+        if course_matrix is None or len(course_ids) == 0:
+            return
+        from sklearn.utils.extmath import randomized_svd
+
+        n = course_matrix.shape[0]
+        dim = max(1, min(self.dim, min(course_matrix.shape)))
+        _, _, vt = randomized_svd(course_matrix, n_components=dim, random_state=self.seed)
+        components = vt.astype(np.float32)
+        vectors = self._normalize(np.asarray(course_matrix @ components.T, dtype=np.float32))
+
+        nlist = self.nlist or int(np.sqrt(n))
+        nlist = max(1, min(nlist, n))
+        self._components = components
+        self._centroids = self._spherical_kmeans(vectors, nlist)
+        self._assign(vectors, course_matrix, course_ids)
+
+    def reindex(self, course_matrix, course_ids: List[str]) -> None:
+        """Re-assign all rows to the existing cells after courses were added or removed.
+
+        Skips the SVD and k-means; the projection and centroids stay those of the
+        last `fit`, so call `fit` again once the catalog has drifted.
+        """
+        if self._components is None or course_matrix is None:
             return
-        self._course_ids = list(course_ids)
+        vectors = self._normalize(np.asarray(course_matrix @ self._components.T, dtype=np.float32))
+        self._assign(vectors, course_matrix, course_ids)
+
+    def _assign(self, vectors: np.ndarray, course_matrix, course_ids: List[str]) -> None:
+        nlist = self._centroids.shape[0]
+        assign = np.argmax(vectors @ self._centroids.T, axis=1)
+        self._course_ids = [str(c) for c in course_ids]
         self._matrix = course_matrix
-        k = min(self.n_neighbors, len(self._course_ids))
-        self._nn = NearestNeighbors(n_neighbors=k, metric=self.metric, algorithm="auto")
-        self._nn.fit(self._matrix)
+        self._vectors = vectors
+        self._list_rows = np.argsort(assign, kind="stable").astype(np.int32)
+        self._list_offsets = np.concatenate(([0], np.cumsum(np.bincount(assign, minlength=nlist)))).astype(np.int64)
 
-    def retrieve(self, student_vector, top_k: int = 200) -> List[str]:
-        if self._nn is None or student_vector is None:
-            return []
-        if hasattr(student_vector, "toarray"):
-            q = student_vector.toarray()
+    def _spherical_kmeans(self, vectors: np.ndarray, nlist: int, iters: int = 10) -> np.ndarray:
+        rng = np.random.default_rng(self.seed)
+        # Train on a sample; assignment of the full set happens afterwards.
+        sample = vectors
+        max_train = 256 * nlist
+        if vectors.shape[0] > max_train:
+            sample = vectors[rng.choice(vectors.shape[0], max_train, replace=False)]
+        centroids = sample[rng.choice(sample.shape[0], nlist, replace=False)].copy()
+        for _ in range(iters):
+            assign = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assign, sample)
+            empty = np.bincount(assign, minlength=nlist) == 0
+            # Re-seed empty cells from random points so every list stays usable
+            if empty.any():
+                sums[empty] = sample[rng.choice(sample.shape[0], int(empty.sum()))]
+            centroids = self._normalize(sums)
+        return centroids
+
+    @staticmethod
+    def _normalize(x: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(x, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return (x / norms).astype(np.float32)
+
+    # ---- search ----
+    def _project(self, student_matrix) -> np.ndarray:
+        if hasattr(student_matrix, "toarray"):
+            q = student_matrix @ self._components.T
         else:
-            q = np.asarray(student_vector)
+            q = np.asarray(student_matrix, dtype=np.float32)
             if q.ndim == 1:
                 q = q[None, :]
-        k = min(top_k, len(self._course_ids))
-        distances, indices = self._nn.kneighbors(q, n_neighbors=k)
-        order = indices[0].tolist()
-        return [self._course_ids[i] for i in order]
+            q = q @ self._components.T
+        return self._normalize(np.asarray(q, dtype=np.float32))
+
+    def _search(self, qd: np.ndarray, centroid_scores: np.ndarray, k: int, q_sparse=None) -> List[str]:
+        # Probe the closest cells, widening past nprobe only if they hold fewer than k rows
+        rows_parts = []
+        count = 0
+        for probed, cell in enumerate(np.argsort(-centroid_scores, kind="stable")):
+            if probed >= self.nprobe and count >= k:
+                break
+            start, end = self._list_offsets[cell], self._list_offsets[cell + 1]
+            if end > start:
+                rows_parts.append(self._list_rows[start:end])
+                count += int(end - start)
+        if not rows_parts:
+            return []
+        rows = np.concatenate(rows_parts)
+        if q_sparse is not None and self._matrix is not None:
+            sims = np.asarray((self._matrix[rows] @ q_sparse.T).todense()).ravel()
+        else:
+            sims = self._vectors[rows] @ qd
+        return [self._course_ids[rows[i]] for i in top_k_indices(sims, k)]
+
+    def retrieve(self, student_vector, top_k: int = 200) -> List[str]:
+        if self._centroids is None or student_vector is None:
+            return []
+        rows = self.retrieve_many(student_vector, top_k=top_k)
+        return rows[0] if rows else []
+
+    def retrieve_many(self, student_matrix, top_k: int = 200) -> List[List[str]]:
+        """Batch variant of `retrieve`: one projection and centroid matmul for a chunk of query rows."""
+        if self._centroids is None or student_matrix is None:
+            return []
+        k = min(top_k, self.n_neighbors, len(self._course_ids))
+        qd = self._project(student_matrix)
+        centroid_scores = qd @ self._centroids.T
+        sparse = student_matrix.tocsr() if hasattr(student_matrix, "tocsr") else None
+        return [
+            self._search(qd[i], centroid_scores[i], k, sparse[i] if sparse is not None else None)
+            for i in range(qd.shape[0])
+        ]
+
+    # ---- persistence (see ModelStore) ----
+    def get_state(self) -> Optional[Dict[str, Any]]:
+        if self._centroids is None:
+            return None
+        state: Dict[str, Any] = {name: getattr(self, f"_{name}") for name in self._FILES}
+        state.update(
+            {"course_ids": np.asarray(self._course_ids, dtype=str), "dim": self.dim, "nlist": self.nlist, "seed": self.seed}
+        )
+        return state
+
+    def set_state(self, state: Dict[str, Any], course_matrix=None) -> None:
+        """Restore a saved index; pass the TF-IDF `course_matrix` to enable exact reranking."""
+        for name in self._FILES:
+            setattr(self, f"_{name}", state[name])
+        self._course_ids = [str(c) for c in state["course_ids"]]
+        self._matrix = course_matrix
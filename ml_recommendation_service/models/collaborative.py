@@ -1,18 +1,40 @@
 from __future__ import annotations
 
+import heapq
 from collections import defaultdict
-from typing import Any, Dict, List, Tuple
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from ..utils.minhash import MinHashLSH
 
 
 class CollaborativeRecommender:
     """Lightweight collaborative filtering using co-occurrence and Jaccard similarity.
 
     Assumes students may have `completed_courses` or `clicked_courses` lists.
+    An item -> users inverted index built at fit time means a request only
+    touches students who share at least one item with the querying student.
+    `max_neighbors` (0 = unlimited) keeps only the most similar neighbours.
+
+    With `lsh_bands > 0`, neighbours come from MinHash-LSH buckets over each
+    student's item set instead (approximate, sublinear in the number of
+    students); exact Jaccard is then computed for the retrieved candidates only.
     """
 
-    def __init__(self):
+    def __init__(self, max_neighbors: int = 0, lsh_bands: int = 0, lsh_rows: int = 2):
+        self.max_neighbors = max_neighbors
+        self.lsh_bands = lsh_bands
+        self.lsh_rows = lsh_rows
+        self._lsh: Optional[MinHashLSH] = None
+        self._lsh_users: List[str] = []  # LSH row -> student id
+        self._lsh_row_of: Dict[str, int] = {}
         self._user_items: Dict[str, set] = {}
         self._item_popularity: Dict[str, int] = defaultdict(int)
+        # (item, count) sorted by count desc; built once at fit time
+        self._popular: List[Tuple[str, int]] = []
+        self._popular_rank: Dict[str, int] = {}
+        self._popular_rank_src: Optional[List[Tuple[str, int]]] = None
+        # item -> students who interacted with it
+        self._item_users: Dict[str, List[str]] = {}
 
     @staticmethod
     def _extract_items(student: Dict[str, Any]) -> List[str]:
@@ -25,6 +47,7 @@ class CollaborativeRecommender:
 
     def fit(self, students: List[Dict[str, Any]]):
         self._user_items = {}
+        self._lsh = None
         self._item_popularity.clear()
         for s in students:
             sid = str(s.get("student_id"))
@@ -34,6 +57,156 @@ class CollaborativeRecommender:
             self._user_items[sid] = items
             for it in items:
                 self._item_popularity[it] += 1
+        self.rebuild_index()
+
+    def rebuild_index(self) -> None:
+        """Rebuild derived lookups; call after restoring `_user_items`/`_item_popularity`."""
+        self._popular = sorted(self._item_popularity.items(), key=lambda x: x[1], reverse=True)
+        item_users: Dict[str, List[str]] = defaultdict(list)
+        for sid, items in self._user_items.items():
+            for it in items:
+                item_users[it].append(sid)
+        self._item_users = dict(item_users)
+        if self.lsh_bands > 0 and self._lsh is None:
+            self._lsh_users = [sid for sid, items in self._user_items.items() if items]
+            self._lsh = MinHashLSH(bands=self.lsh_bands, rows=self.lsh_rows)
+            self._lsh.fit([self._user_items[sid] for sid in self._lsh_users])
+        self._lsh_row_of = {sid: i for i, sid in enumerate(self._lsh_users)}
+
+    def update(self, students: List[Dict[str, Any]], removed: Iterable[str] = ()) -> None:
+        """Apply a delta instead of refitting: replace the item sets of `students`, drop `removed`.
+
+        Popularity, the inverted index and LSH signatures are patched for the
+        touched students only; scores match a full `fit` on the new data (ties may
+        be ordered differently).
+        """
+        new_sets = {str(s.get("student_id")): set(self._extract_items(s)) for s in students}
+        touched = set(new_sets) | {str(sid) for sid in removed}
+        item_users = {it: list(users) for it, users in self._item_users.items()}
+        for sid in touched:
+            old = self._user_items.pop(sid, set())
+            new = new_sets.get(sid, set())
+            for it in old - new:
+                self._item_popularity[it] -= 1
+                if self._item_popularity[it] <= 0:
+                    del self._item_popularity[it]
+                item_users[it].remove(sid)
+                if not item_users[it]:
+                    del item_users[it]
+            for it in new - old:
+                self._item_popularity[it] += 1
+                item_users.setdefault(it, []).append(sid)
+            if sid in new_sets:
+                self._user_items[sid] = new
+        self._popular = sorted(self._item_popularity.items(), key=lambda x: x[1], reverse=True)
+        self._item_users = item_users
+        if self._lsh is not None:
+            import numpy as np
+
+            keep = np.array([sid not in touched for sid in self._lsh_users], dtype=bool)
+            added = [sid for sid in new_sets if new_sets[sid]]
+            self._lsh.update(keep, [new_sets[sid] for sid in added])
+            self._lsh_users = [sid for sid, k in zip(self._lsh_users, keep) if k] + added
+            self._lsh_row_of = {sid: i for i, sid in enumerate(self._lsh_users)}
+
+    # ---- persistence (see ModelStore) ----
+    def get_state(self) -> Dict[str, Any]:
+        """User x item incidence as CSR arrays (plus LSH signatures when enabled)."""
+        import numpy as np
+
+        users = list(self._user_items)
+        items = list(self._item_popularity)
+        col = {it: j for j, it in enumerate(items)}
+        indptr = np.zeros(len(users) + 1, dtype=np.int64)
+        indices = []
+        for i, sid in enumerate(users):
+            row = self._user_items[sid]
+            indices.extend(col[it] for it in row)
+            indptr[i + 1] = indptr[i] + len(row)
+        state: Dict[str, Any] = {
+            "user_ids": np.asarray(users, dtype=str),
+            "item_ids": np.asarray(items, dtype=str),
+            "indptr": indptr,
+            "indices": np.asarray(indices, dtype=np.int32),
+        }
+        lsh = self.get_lsh_state()
+        if lsh is not None:
+            state.update({
+                "lsh_bands": lsh["bands"],
+                "lsh_rows": lsh["rows"],
+                "lsh_seed": lsh["seed"],
+                "lsh_signatures": lsh["signatures"],
+                "lsh_users": np.asarray(lsh["users"], dtype=str),
+            })
+        return state
+
+    def set_state(self, state: Dict[str, Any]) -> None:
+        import numpy as np
+
+        users = [str(u) for u in state["user_ids"]]
+        items = [str(it) for it in state["item_ids"]]
+        indptr = np.asarray(state["indptr"])
+        indices = np.asarray(state["indices"])
+        self._user_items = {
+            sid: {items[j] for j in indices[indptr[i] : indptr[i + 1]].tolist()} for i, sid in enumerate(users)
+        }
+        counts = np.bincount(indices, minlength=len(items)) if len(items) else []
+        self._item_popularity = defaultdict(int, {it: int(c) for it, c in zip(items, counts) if c})
+        self._lsh = None
+        if "lsh_signatures" in state:
+            self.set_lsh_state({
+                "bands": state["lsh_bands"],
+                "rows": state["lsh_rows"],
+                "seed": state["lsh_seed"],
+                "signatures": state["lsh_signatures"],
+                "users": state["lsh_users"],
+            })
+        self.rebuild_index()
+
+    def get_lsh_state(self) -> Optional[Dict[str, Any]]:
+        if self._lsh is None:
+            return None
+        return {**self._lsh.state(), "users": list(self._lsh_users)}
+
+    def set_lsh_state(self, state: Optional[Dict[str, Any]]) -> None:
+        """Restore persisted signatures (before `rebuild_index`); ignored if the banding differs."""
+        if not state or self.lsh_bands <= 0:
+            return
+        if (int(state.get("bands", 0)), int(state.get("rows", 0))) != (self.lsh_bands, self.lsh_rows):
+            return
+        self._lsh = MinHashLSH.from_state(state)
+        self._lsh_users = [str(u) for u in state.get("users", [])]
+
+    def _neighbors(self, sid: str, my_items: set) -> List[Tuple[str, float]]:
+        """(student_id, jaccard) for students sharing an item with `my_items` (LSH candidates in LSH mode)."""
+        n_mine = len(my_items)
+        if self._lsh is not None:
+            row = self._lsh_row_of.get(sid)
+            if row is not None:
+                rows = self._lsh.query(signature=self._lsh.signatures[row])
+            else:
+                rows = self._lsh.query(items=my_items)
+            neighbors = []
+            for r in rows.tolist():
+                other_sid = self._lsh_users[r]
+                if other_sid == sid:
+                    continue
+                inter = len(my_items & self._user_items.get(other_sid, set()))
+                if inter:
+                    neighbors.append((other_sid, inter / (n_mine + len(self._user_items[other_sid]) - inter)))
+        else:
+            overlap: Dict[str, int] = defaultdict(int)
+            for it in my_items:
+                for other_sid in self._item_users.get(it, ()):
+                    overlap[other_sid] += 1
+            overlap.pop(sid, None)
+            neighbors = [
+                (other_sid, inter / (n_mine + len(self._user_items[other_sid]) - inter))
+                for other_sid, inter in overlap.items()
+            ]
+        if self.max_neighbors and len(neighbors) > self.max_neighbors:
+            neighbors = heapq.nlargest(self.max_neighbors, neighbors, key=lambda x: x[1])
+        return neighbors
 
     def recommend(self, student: Dict[str, Any], top_k: int = 10) -> List[Tuple[str, float]]:
         sid = str(student.get("student_id"))
@@ -41,7 +214,7 @@ class CollaborativeRecommender:
 
         # If no history, fallback to popularity
         if not my_items:
-            ranked = sorted(self._item_popularity.items(), key=lambda x: x[1], reverse=True)
+            ranked = self._popular
             if not ranked:
                 return []
             max_pop = float(ranked[0][1]) or 1.0
@@ -49,24 +222,15 @@ class CollaborativeRecommender:
 
         # Score items by Jaccard similarity via similar users
         scores: Dict[str, float] = defaultdict(float)
-        for other_sid, items in self._user_items.items():
-            if other_sid == sid or not items:
-                continue
-            inter = len(my_items & items)
-            union = len(my_items | items)
-            if union == 0:
-                continue
-            sim = inter / union
-            if sim <= 0:
-                continue
-            for it in items:
+        for other_sid, sim in self._neighbors(sid, my_items):
+            for it in self._user_items[other_sid]:
                 if it in my_items:
                     continue
                 scores[it] += sim
 
         # Backfill with popularity if needed
         if len(scores) < top_k:
-            for it, pop in sorted(self._item_popularity.items(), key=lambda x: x[1], reverse=True):
+            for it, pop in self._popular:
                 if it not in scores and it not in my_items:
                     scores[it] = 0.1 * float(pop)
                 if len(scores) >= top_k:
@@ -79,3 +243,54 @@ class CollaborativeRecommender:
 
         ranked = sorted(scores.items(), key=lambda x: x[1], reverse=True)[:top_k]
         return [(cid, float(score)) for cid, score in ranked]
+
+    def score_candidates(
+        self, student: Dict[str, Any], candidate_ids: List[str], top_k: int = 10
+    ) -> List[Tuple[str, float]]:
+        """Score only `candidate_ids`; same scoring as `recommend` restricted to the pool.
+
+        Popularity only backfills (in `_popular` order) while fewer than
+        `top_k` candidates have a neighbour score, as in `recommend`, so it
+        never outweighs the neighbour signal of a full pool.
+        """
+        sid = str(student.get("student_id"))
+        my_items = self._user_items.get(sid, set())
+        candidates = {cid for cid in candidate_ids if cid not in my_items}
+        if not candidates or top_k <= 0:
+            return []
+        popular = self._popular_in(candidates)
+
+        # No history: popularity only, normalised like `recommend`
+        if not my_items:
+            if not popular:
+                return []
+            max_pop = float(self._popular[0][1]) or 1.0
+            return [(cid, float(pop) / max_pop) for cid, pop in popular[:top_k]]
+
+        scores: Dict[str, float] = defaultdict(float)
+        for other_sid, sim in self._neighbors(sid, my_items):
+            for it in self._user_items[other_sid] & candidates:
+                scores[it] += sim
+        for it, pop in popular:
+            if len(scores) >= top_k:
+                break
+            if it not in scores:
+                scores[it] = 0.1 * float(pop)
+        if not scores:
+            return []
+        max_score = max(scores.values()) or 1.0
+        ranked = sorted(scores.items(), key=lambda x: x[1], reverse=True)[:top_k]
+        return [(cid, float(score) / max_score) for cid, score in ranked]
+
+    def _popular_in(self, candidates: Iterable[str]) -> List[Tuple[str, int]]:
+        """The (item, count) entries of `_popular` for `candidates`, in `_popular` order."""
+        # item -> position in _popular, rebuilt lazily whenever _popular is replaced (fit, update or restore)
+        if self._popular_rank_src is not self._popular:
+            self._popular_rank = {it: i for i, (it, _) in enumerate(self._popular)}
+            self._popular_rank_src = self._popular
+        rows = sorted(self._popular_rank[cid] for cid in candidates if cid in self._popular_rank)
+        return [self._popular[r] for r in rows]
+
+    def recommend_many(self, students: List[Dict[str, Any]], top_k: int = 10) -> List[List[Tuple[str, float]]]:
+        # Set-based scoring has no matrix form here; keep the batch API uniform.
+        return [self.recommend(s, top_k=top_k) for s in students]
@@ -1,6 +1,8 @@
 from __future__ import annotations
 
-from typing import Any, Dict, List, Tuple
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from ..utils.tfidf import fit_transform_batched, make_vectorizer, vectorizer_from_state, vectorizer_state
 
 
 class ContentBasedRecommender:
@@ -13,6 +15,8 @@ class ContentBasedRecommender:
         self._vectorizer = None
         self._content_matrix = None
         self._course_ids: List[str] = []
+        self._row_of: Dict[str, int] = {}
+        self._row_of_src: Any = None
 
     @staticmethod
     def _normalize_tags(tags: Any) -> str:
@@ -45,9 +49,6 @@ class ContentBasedRecommender:
         return f"{title} {desc} {tags}".strip()
 
     def fit(self, content: List[Dict[str, Any]]):
-        from sklearn.feature_extraction.text import TfidfVectorizer
-
-        texts = [self._course_text(c) for c in content]
         ids: List[str] = []
         for i, c in enumerate(content):
             cid = c.get("course_id")
@@ -55,8 +56,42 @@ class ContentBasedRecommender:
                 cid = i
             ids.append(str(cid))
         self._course_ids = ids
-        self._vectorizer = TfidfVectorizer(max_features=5000, ngram_range=(1, 2))
-        self._content_matrix = self._vectorizer.fit_transform(texts)
+        self._vectorizer = make_vectorizer()
+        # Two passes over the rows (vocabulary, then batched transform) instead of a full list of texts
+        self._content_matrix = fit_transform_batched(self._vectorizer, lambda: map(self._course_text, content))
+
+    def update(self, courses: List[Dict[str, Any]], removed: Iterable[str] = ()) -> None:
+        """Apply a delta instead of refitting: drop `removed` ids and (re)transform `courses`.
+
+        New rows use the existing vocabulary and IDF weights, so terms unseen at
+        the last `fit` are ignored until the next full refit.
+        """
+        from scipy.sparse import vstack
+
+        ids = [str(c.get("course_id")) for c in courses]
+        drop = set(removed) | set(ids)
+        keep = [i for i, cid in enumerate(self._course_ids) if cid not in drop]
+        parts = [self._content_matrix[keep]]
+        if courses:
+            parts.append(self._vectorizer.transform([self._course_text(c) for c in courses]))
+        self._content_matrix = vstack(parts, format="csr")
+        self._course_ids = [self._course_ids[i] for i in keep] + ids
+
+    # ---- persistence (see ModelStore) ----
+    def get_state(self) -> Optional[Dict[str, Any]]:
+        if self._vectorizer is None or self._content_matrix is None:
+            return None
+        import numpy as np
+        return {
+            **vectorizer_state(self._vectorizer),
+            "matrix": self._content_matrix,
+            "course_ids": np.asarray(self._course_ids, dtype=str),
+        }
+
+    def set_state(self, state: Dict[str, Any]) -> None:
+        self._vectorizer = vectorizer_from_state(state["terms"], state["idf"])
+        self._content_matrix = state["matrix"]
+        self._course_ids = [str(c) for c in state["course_ids"]]
 
     def recommend(self, student: Dict[str, Any], top_k: int = 10) -> List[Tuple[str, float]]:
         if self._vectorizer is None or self._content_matrix is None:
@@ -73,3 +108,63 @@ class ContentBasedRecommender:
         sims = sims / (max_sim or 1.0)
         ranked = sorted(zip(self._course_ids, sims), key=lambda x: x[1], reverse=True)
         return ranked[:top_k]
+
+    def _rows_for(self, candidate_ids: List[str]) -> Tuple[List[str], List[int]]:
+        # id -> row map, rebuilt lazily whenever _course_ids is replaced (fit or restore)
+        if self._row_of_src is not self._course_ids:
+            self._row_of = {cid: i for i, cid in enumerate(self._course_ids)}
+            self._row_of_src = self._course_ids
+        pairs = [(cid, self._row_of[cid]) for cid in dict.fromkeys(candidate_ids) if cid in self._row_of]
+        return [p[0] for p in pairs], [p[1] for p in pairs]
+
+    def score_candidates(
+        self, student: Dict[str, Any], candidate_ids: List[str], query_vector=None
+    ) -> List[Tuple[str, float]]:
+        """Score only `candidate_ids` (e.g. an ANN pool); cost scales with the pool, not the catalog."""
+        if self._vectorizer is None or self._content_matrix is None:
+            return []
+        if not self._student_interest_text(student):
+            return []
+        import numpy as np
+
+        ids, rows = self._rows_for(candidate_ids)
+        if not rows:
+            return []
+        q = query_vector if query_vector is not None else self._vectorizer.transform([self._student_interest_text(student)])
+        sims = np.asarray((self._content_matrix[rows] @ q.T).todense()).ravel()
+        max_sim = float(sims.max()) if sims.size > 0 else 1.0
+        sims = sims / (max_sim or 1.0)
+        return sorted(zip(ids, sims.tolist()), key=lambda x: x[1], reverse=True)
+
+    def transform_students(self, students: List[Dict[str, Any]]):
+        """Sparse TF-IDF query matrix, one row per student (empty rows for no interests)."""
+        if self._vectorizer is None:
+            return None
+        return self._vectorizer.transform([self._student_interest_text(s) for s in students])
+
+    def recommend_many(
+        self, students: List[Dict[str, Any]], top_k: int = 10, query_matrix=None
+    ) -> List[List[Tuple[str, float]]]:
+        """Batch variant of `recommend`: one sparse matmul for the whole chunk.
+
+        `query_matrix` may be passed in when the caller already transformed the
+        chunk (e.g. to share it with the ANN retriever).
+        """
+        if self._vectorizer is None or self._content_matrix is None:
+            return [[] for _ in students]
+
+        import numpy as np
+        from ..utils.similarity import top_k_indices
+
+        q = query_matrix if query_matrix is not None else self.transform_students(students)
+        # Rows are L2-normalised by TfidfVectorizer, so the dot product is the cosine.
+        sims = np.asarray((q @ self._content_matrix.T).todense(), dtype=np.float64)
+        out: List[List[Tuple[str, float]]] = []
+        for row, student in zip(sims, students):
+            if not self._student_interest_text(student):
+                out.append([])
+                continue
+            max_sim = float(row.max()) if row.size > 0 else 1.0
+            row = row / (max_sim or 1.0)
+            out.append([(self._course_ids[i], float(row[i])) for i in top_k_indices(row, top_k)])
+        return out
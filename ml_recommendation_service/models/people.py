@@ -1,6 +1,8 @@
 from __future__ import annotations
 
-from typing import Any, Dict, List, Tuple
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from ..utils.tfidf import fit_transform_batched, make_vectorizer, vectorizer_from_state, vectorizer_state
 
 
 class PeopleRecommender:
@@ -44,13 +46,10 @@ class PeopleRecommender:
         return " ".join(parts)
 
     def fit(self, students: List[Dict[str, Any]], teachers: List[Dict[str, Any]] | None = None):
-        from sklearn.feature_extraction.text import TfidfVectorizer
-
-        stu_texts = [self._student_text(s) for s in students]
         self._student_ids = [str(s.get("student_id", i)) for i, s in enumerate(students)]
         # Single vectorizer to keep space aligned
-        self._vectorizer = TfidfVectorizer(max_features=5000, ngram_range=(1, 2))
-        self._student_matrix = self._vectorizer.fit_transform(stu_texts)
+        self._vectorizer = make_vectorizer()
+        self._student_matrix = fit_transform_batched(self._vectorizer, lambda: map(self._student_text, students))
 
         self._teacher_matrix = None
         self._teacher_ids = []
@@ -59,6 +58,41 @@ class PeopleRecommender:
             self._teacher_ids = [str(t.get("teacher_id", i)) for i, t in enumerate(teachers)]
             self._teacher_matrix = self._vectorizer.transform(t_texts)
 
+    def update(self, students: List[Dict[str, Any]], removed: Iterable[str] = ()) -> None:
+        """Drop `removed` student ids and (re)transform `students` against the existing vocabulary."""
+        from scipy.sparse import vstack
+
+        ids = [str(s.get("student_id")) for s in students]
+        drop = set(removed) | set(ids)
+        keep = [i for i, sid in enumerate(self._student_ids) if sid not in drop]
+        parts = [self._student_matrix[keep]]
+        if students:
+            parts.append(self._vectorizer.transform([self._student_text(s) for s in students]))
+        self._student_matrix = vstack(parts, format="csr")
+        self._student_ids = [self._student_ids[i] for i in keep] + ids
+
+    # ---- persistence (see ModelStore) ----
+    def get_state(self) -> Optional[Dict[str, Any]]:
+        if self._vectorizer is None or self._student_matrix is None:
+            return None
+        import numpy as np
+        state: Dict[str, Any] = {
+            **vectorizer_state(self._vectorizer),
+            "student_matrix": self._student_matrix,
+            "student_ids": np.asarray(self._student_ids, dtype=str),
+            "teacher_ids": np.asarray(self._teacher_ids, dtype=str),
+        }
+        if self._teacher_matrix is not None:
+            state["teacher_matrix"] = self._teacher_matrix
+        return state
+
+    def set_state(self, state: Dict[str, Any]) -> None:
+        self._vectorizer = vectorizer_from_state(state["terms"], state["idf"])
+        self._student_matrix = state["student_matrix"]
+        self._student_ids = [str(s) for s in state["student_ids"]]
+        self._teacher_matrix = state.get("teacher_matrix")
+        self._teacher_ids = [str(t) for t in state.get("teacher_ids", [])]
+
     def similar_students(self, student: Dict[str, Any], top_k: int = 5) -> List[Tuple[str, float]]:
         if self._vectorizer is None or self._student_matrix is None:
             return []
@@ -88,3 +122,31 @@ class PeopleRecommender:
         sims = sims / (max_sim or 1.0)
         ranked = sorted(zip(self._teacher_ids, sims), key=lambda x: x[1], reverse=True)
         return ranked[:top_k]
+
+    def similar_students_many(self, students: List[Dict[str, Any]], top_k: int = 5) -> List[List[Tuple[str, float]]]:
+        if self._vectorizer is None or self._student_matrix is None:
+            return [[] for _ in students]
+        return self._rank_many(students, self._student_matrix, self._student_ids, top_k, exclude_self=True)
+
+    def matching_teachers_many(self, students: List[Dict[str, Any]], top_k: int = 5) -> List[List[Tuple[str, float]]]:
+        if self._vectorizer is None or self._teacher_matrix is None:
+            return [[] for _ in students]
+        return self._rank_many(students, self._teacher_matrix, self._teacher_ids, top_k, exclude_self=False)
+
+    def _rank_many(self, students, matrix, ids: List[str], top_k: int, exclude_self: bool) -> List[List[Tuple[str, float]]]:
+        import numpy as np
+        from ..utils.similarity import top_k_indices
+
+        q = self._vectorizer.transform([self._student_text(s) for s in students])
+        sims = np.asarray((q @ matrix.T).todense(), dtype=np.float64)
+        row_of = {sid: i for i, sid in enumerate(ids)} if exclude_self else {}
+        out: List[List[Tuple[str, float]]] = []
+        for row, student in zip(sims, students):
+            if exclude_self:
+                idx = row_of.get(str(student.get("student_id")))
+                if idx is not None:
+                    row[idx] = 0.0
+            max_sim = float(row.max()) if row.size > 0 else 1.0
+            row = row / (max_sim or 1.0)
+            out.append([(ids[i], float(row[i])) for i in top_k_indices(row, top_k)])
+        return out
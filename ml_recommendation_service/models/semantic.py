@@ -1,6 +1,6 @@
 from __future__ import annotations
 
-from typing import Any, Dict, List, Tuple
+from typing import Any, Dict, Iterable, List, Optional, Tuple
 
 
 class SemanticRecommender:
@@ -14,6 +14,7 @@ class SemanticRecommender:
         self._model = None
         self._content_emb = None
         self._course_ids: List[str] = []
+        self._row_of: Dict[str, int] = {}
 
     def _ensure_model(self) -> bool:
         if self._model is not None:
@@ -47,9 +48,45 @@ class SemanticRecommender:
         texts = [self._course_text(c) for c in content]
         self._course_ids = [str(c.get("course_id", i)) for i, c in enumerate(content)]
         self._content_emb = self._model.encode(texts, normalize_embeddings=True)
+        self._row_of = {cid: i for i, cid in enumerate(self._course_ids)}
+
+    def update(self, content: List[Dict[str, Any]], removed: Iterable[str] = ()) -> None:
+        """Drop `removed` course ids and encode only the added/changed `content`."""
+        import numpy as np
+
+        ids = [str(c.get("course_id")) for c in content]
+        drop = set(removed) | set(ids)
+        keep = [i for i, cid in enumerate(self._course_ids) if cid not in drop]
+        emb = np.asarray(self._content_emb)[keep]
+        if content:
+            if not self._ensure_model():
+                raise RuntimeError("sentence-transformers is not available")
+            new = self._model.encode([self._course_text(c) for c in content], normalize_embeddings=True)
+            emb = np.vstack([emb, np.asarray(new, dtype=emb.dtype)])
+        self._content_emb = emb
+        self._course_ids = [self._course_ids[i] for i in keep] + ids
+        self._row_of = {cid: i for i, cid in enumerate(self._course_ids)}
+
+    # ---- persistence (see ModelStore) ----
+    def get_state(self) -> Optional[Dict[str, Any]]:
+        if self._content_emb is None or not self._course_ids:
+            return None
+        import numpy as np
+        return {
+            "model_name": self._model_name,
+            "course_ids": np.asarray(self._course_ids, dtype=str),
+            "embeddings": np.asarray(self._content_emb, dtype=np.float32),
+        }
+
+    def set_state(self, state: Dict[str, Any]) -> None:
+        # The encoder itself is loaded lazily on the first query
+        self._model_name = state.get("model_name", self._model_name)
+        self._course_ids = [str(c) for c in state["course_ids"]]
+        self._content_emb = state["embeddings"]
+        self._row_of = {cid: i for i, cid in enumerate(self._course_ids)}
 
     def recommend(self, student: Dict[str, Any], top_k: int = 10) -> List[Tuple[str, float]]:
-        if self._model is None or self._content_emb is None or not self._course_ids:
+        if self._content_emb is None or not self._course_ids or not self._ensure_model():
             return []
         import numpy as np
         s_text = self._student_text(student)
@@ -59,3 +96,34 @@ class SemanticRecommender:
         sims = (self._content_emb @ q).tolist()  # cosine with normalized vectors
         ranked = sorted(zip(self._course_ids, sims), key=lambda x: x[1], reverse=True)
         return ranked[:top_k]
+
+    def score_candidates(self, student: Dict[str, Any], candidate_ids: List[str]) -> List[Tuple[str, float]]:
+        if self._content_emb is None or not self._course_ids or not self._ensure_model():
+            return []
+        import numpy as np
+        s_text = self._student_text(student)
+        if not s_text:
+            return []
+        ids = [cid for cid in dict.fromkeys(candidate_ids) if cid in self._row_of]
+        if not ids:
+            return []
+        q = self._model.encode([s_text], normalize_embeddings=True)[0]
+        sims = (np.asarray(self._content_emb)[[self._row_of[cid] for cid in ids]] @ q).tolist()
+        return sorted(zip(ids, sims), key=lambda x: x[1], reverse=True)
+
+    def recommend_many(self, students: List[Dict[str, Any]], top_k: int = 10) -> List[List[Tuple[str, float]]]:
+        if self._content_emb is None or not self._course_ids or not self._ensure_model():
+            return [[] for _ in students]
+        import numpy as np
+        from ..utils.similarity import top_k_indices
+        texts = [self._student_text(s) for s in students]
+        present = [i for i, t in enumerate(texts) if t]
+        out: List[List[Tuple[str, float]]] = [[] for _ in students]
+        if not present:
+            return out
+        q = self._model.encode([texts[i] for i in present], normalize_embeddings=True)
+        sims = np.asarray(q) @ np.asarray(self._content_emb).T
+        for row_idx, i in enumerate(present):
+            row = sims[row_idx]
+            out[i] = [(self._course_ids[j], float(row[j])) for j in top_k_indices(row, top_k)]
+        return out
@@ -77,3 +77,6 @@ class SponsorMatcher:
 
         scored.sort(key=lambda x: x[1], reverse=True)
         return scored[:top_k]
+
+    def match_many(self, students: List[Dict[str, Any]], top_k: int = 10) -> List[List[Tuple[str, float]]]:
+        return [self.match(s, top_k=top_k) for s in students]
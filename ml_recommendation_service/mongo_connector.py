@@ -1,8 +1,10 @@
 from __future__ import annotations
 
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
 from datetime import datetime
 
+from .bulk_writer import BulkWriter
+from .model_store import combine_hash
 from .config import (
     MONGO_URI,
     DB_NAME,
@@ -10,8 +12,18 @@ from .config import (
     CONTENT_COLLECTION,
     SPONSORS_COLLECTION,
     RECOMMENDATIONS_COLLECTION,
+    MONGO_BATCH_SIZE,
+    BULK_WRITE_BATCH_SIZE,
+    BULK_WRITE_QUEUE_BATCHES,
 )
 
+# Fields the models and result payloads read; training fetches only these
+STUDENT_FIELDS = ("student_id", "interests", "profile", "completed_courses", "clicked_courses")
+CONTENT_FIELDS = ("course_id", "title", "description", "tags")
+SPONSOR_FIELDS = ("sponsor_id", "name", "description", "criteria")
+# Score precision that counts as a change when deciding whether to rewrite a recommendation
+_FINGERPRINT_DECIMALS = 4
+
 
 class MongoDBConnector:
     """Thin wrapper around PyMongo with safe defaults and convenience helpers."""
@@ -37,36 +49,150 @@ class MongoDBConnector:
         self._db[SPONSORS_COLLECTION].create_index("sponsor_id", unique=True, background=True)
         self._db[RECOMMENDATIONS_COLLECTION].create_index("student_id", unique=True, background=True)
 
+    # ---- streaming reads ----
+    def iter_students(
+        self,
+        fields: Optional[Sequence[str]] = STUDENT_FIELDS,
+        batch_size: int = MONGO_BATCH_SIZE,
+        updated_since: Optional[datetime] = None,
+    ) -> Iterator[Dict[str, Any]]:
+        return self._iter(STUDENTS_COLLECTION, fields, batch_size, updated_since)
+
+    def iter_content(
+        self,
+        fields: Optional[Sequence[str]] = CONTENT_FIELDS,
+        batch_size: int = MONGO_BATCH_SIZE,
+        updated_since: Optional[datetime] = None,
+    ) -> Iterator[Dict[str, Any]]:
+        return self._iter(CONTENT_COLLECTION, fields, batch_size, updated_since)
+
+    def iter_sponsors(
+        self,
+        fields: Optional[Sequence[str]] = SPONSOR_FIELDS,
+        batch_size: int = MONGO_BATCH_SIZE,
+        updated_since: Optional[datetime] = None,
+    ) -> Iterator[Dict[str, Any]]:
+        return self._iter(SPONSORS_COLLECTION, fields, batch_size, updated_since)
+
+    def _iter(
+        self,
+        collection: str,
+        fields: Optional[Sequence[str]],
+        batch_size: int,
+        updated_since: Optional[datetime],
+    ) -> Iterator[Dict[str, Any]]:
+        """Cursor over `collection`, `batch_size` documents per round trip.
+
+        `fields` projects documents down to those keys (without `_id`); None
+        returns whole documents. `updated_since` keeps only documents whose
+        `updated_at` is later.
+        """
+        query: Dict[str, Any] = {"updated_at": {"$gt": updated_since}} if updated_since is not None else {}
+        projection = {**{f: 1 for f in fields}, "_id": 0} if fields is not None else None
+        return self._db[collection].find(query, projection, batch_size=max(1, int(batch_size)))
+
     # ---- getters ----
     def get_all_students(self) -> List[Dict[str, Any]]:
-        return list(self._db[STUDENTS_COLLECTION].find({}))
+        return list(self.iter_students())
 
     def get_all_content(self) -> List[Dict[str, Any]]:
-        return list(self._db[CONTENT_COLLECTION].find({}))
+        return list(self.iter_content())
 
     def get_all_sponsors(self) -> List[Dict[str, Any]]:
-        return list(self._db[SPONSORS_COLLECTION].find({}))
+        return list(self.iter_sponsors())
 
     def get_student_profile(self, student_id: str) -> Optional[Dict[str, Any]]:
-        return self._db[STUDENTS_COLLECTION].find_one({"student_id": str(student_id)})
+        projection = {**{f: 1 for f in STUDENT_FIELDS}, "_id": 0}
+        return self._db[STUDENTS_COLLECTION].find_one({"student_id": str(student_id)}, projection)
 
     # ---- upserts ----
-    def save_recommendations(
-        self,
+    @staticmethod
+    def _recommendation_doc(
         student_id: str,
         recommendations: Dict[str, Any],
         extra: Optional[Dict[str, Any]] = None,
-    ) -> None:
+    ) -> Dict[str, Any]:
         doc = {
             "student_id": str(student_id),
             "courses": recommendations.get("courses", []),
             "sponsors": recommendations.get("sponsors", []),
+            "fingerprint": recommendation_fingerprint(recommendations, extra),
             "created_at": datetime.utcnow(),
         }
         if extra:
             doc.update(extra)
+        return doc
+
+    def save_recommendations(
+        self,
+        student_id: str,
+        recommendations: Dict[str, Any],
+        extra: Optional[Dict[str, Any]] = None,
+    ) -> None:
         self._db[RECOMMENDATIONS_COLLECTION].update_one(
             {"student_id": str(student_id)},
-            {"$set": doc},
+            {"$set": self._recommendation_doc(student_id, recommendations, extra)},
             upsert=True,
         )
+
+    def save_recommendations_many(
+        self,
+        items: Iterable[Tuple[str, Dict[str, Any]]],
+        extra: Optional[Dict[str, Any]] = None,
+        skip_unchanged: bool = True,
+    ) -> Dict[str, int]:
+        """Upsert (student_id, recommendations) pairs in one unordered bulk_write.
+
+        With `skip_unchanged`, students whose stored fingerprint equals the new
+        one are left alone (one indexed read per batch instead of a write).
+        Returns {"failed": n, "skipped": m}.
+        """
+        from pymongo import UpdateOne
+        from pymongo.errors import BulkWriteError
+
+        coll = self._db[RECOMMENDATIONS_COLLECTION]
+        docs = [self._recommendation_doc(sid, rec, extra) for sid, rec in items]
+        stored: Dict[str, Any] = {}
+        if skip_unchanged and docs:
+            cursor = coll.find(
+                {"student_id": {"$in": [d["student_id"] for d in docs]}},
+                {"student_id": 1, "fingerprint": 1, "_id": 0},
+            )
+            stored = {d.get("student_id"): d.get("fingerprint") for d in cursor}
+        ops = [
+            UpdateOne({"student_id": d["student_id"]}, {"$set": d}, upsert=True)
+            for d in docs
+            if stored.get(d["student_id"]) != d["fingerprint"]
+        ]
+        counts = {"failed": 0, "skipped": len(docs) - len(ops)}
+        if ops:
+            try:
+                coll.bulk_write(ops, ordered=False)
+            except BulkWriteError as e:
+                # unordered: everything but the reported documents was written
+                counts["failed"] = len(e.details.get("writeErrors", []))
+        return counts
+
+    def bulk_saver(
+        self,
+        batch_size: int = BULK_WRITE_BATCH_SIZE,
+        queue_batches: int = BULK_WRITE_QUEUE_BATCHES,
+        extra: Optional[Dict[str, Any]] = None,
+        skip_unchanged: bool = True,
+    ) -> BulkWriter:
+        """Background writer taking (student_id, recommendations) pairs; see BulkWriter."""
+        return BulkWriter(
+            lambda batch: self.save_recommendations_many(batch, extra, skip_unchanged), batch_size, queue_batches
+        )
+
+
+def recommendation_fingerprint(recommendations: Dict[str, Any], extra: Optional[Dict[str, Any]] = None) -> str:
+    """Stable hash of what a recommendation document stores (ids in order, scores rounded)."""
+
+    def rounded(items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        return [
+            {**it, "score": round(float(it["score"]), _FINGERPRINT_DECIMALS)} if isinstance(it.get("score"), (int, float)) else it
+            for it in items or []
+        ]
+
+    return combine_hash(rounded(recommendations.get("courses", [])), rounded(recommendations.get("sponsors", [])), extra or {})
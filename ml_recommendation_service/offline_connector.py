@@ -1,24 +1,97 @@
 from __future__ import annotations
 
-from typing import Any, Dict, List, Optional
+from itertools import islice
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+import io
+import json
 import os
+
+import numpy as np
 import pandas as pd
 
+from .config import OFFLINE_CACHE
+
+# Bump when normalization output changes so old sidecars are ignored
+_CACHE_VERSION = 2
+# Nested fields (profile, criteria) are kept as flat "<group>\x1f<field>" columns
+_NESTED_SEP = "\x1f"
+# Packed string columns are NUL-joined
+_STR_SEP = "\x00"
+
+Columns = List[Tuple[str, List[Any]]]
+
+
+# Id columns are read as text, so "7" stays "7" (not "7.0" because the column
+# has a blank cell) and ids never depend on how the file is chunked
+ID_COLUMNS = ("student_id", "course_id", "sponsor_id", "teacher_id")
+_ID_DTYPES = {c: str for c in ID_COLUMNS}
+
 
 def _read_tabular(path: str) -> pd.DataFrame:
     if path.lower().endswith(".xlsx"):
-        return pd.read_excel(path)
-    return pd.read_csv(path)
+        return pd.read_excel(path, dtype=_ID_DTYPES)
+    return pd.read_csv(path, dtype=_ID_DTYPES)
+
+
+def iter_frames(path: str, chunk_size: int) -> Iterator[pd.DataFrame]:
+    """The sheet as DataFrames of at most `chunk_size` rows, without loading it whole.
+
+    Id columns are text as in `_read_tabular`, so a chunked read yields the
+    same ids as a whole-file one.
+    """
+    if not path.lower().endswith(".xlsx"):
+        yield from pd.read_csv(path, chunksize=chunk_size, dtype=_ID_DTYPES)
+        return
+    from openpyxl import load_workbook
+
+    wb = load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = wb.active.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        columns = [f"Unnamed: {i}" if h is None else str(h) for i, h in enumerate(header)]
+        ids = [c for c in columns if c in _ID_DTYPES]
+        # read-only sheets can report trailing blank rows; read_excel drops them too
+        rows = (r for r in rows if any(v is not None for v in r))
+        while True:
+            block = list(islice(rows, chunk_size))
+            if not block:
+                return
+            frame = pd.DataFrame.from_records(block, columns=columns)
+            for c in ids:
+                frame[c] = frame[c].map(_cell_text, na_action="ignore").astype(object)
+            yield frame
+    finally:
+        wb.close()
+
+
+def _cell_text(value: Any) -> str:
+    # how read_excel(dtype=str) renders a cell: whole floats and bools as integers
+    if isinstance(value, bool) or (isinstance(value, float) and value.is_integer()):
+        return str(int(value))
+    return str(value)
 
 
 class OfflineConnector:
-    """Drops-in for MongoDBConnector but reads from local CSV/XLSX files."""
+    """Drops-in for MongoDBConnector but reads from local CSV/XLSX files.
+
+    Parsed and normalized rows are cached next to each source file
+    (`<file>.cache.npz`, one array per column) and reused while the file's
+    size and mtime are unchanged, so only the first start after an edit pays
+    for spreadsheet parsing. Pass `use_cache=False` (or set OFFLINE_CACHE=false)
+    to always read the sources.
+    """
+
+    # rows never change after construction (lets IndexedConnector index them once)
+    static = True
 
     def __init__(
         self,
         students_path: str = "Student_rec.xlsx",
         content_path: str = "Content_rec.xlsx",
         sponsors_path: str = "Sponsers_rec.xlsx",
+        use_cache: bool = OFFLINE_CACHE,
     ):
         # Fallback to CSV if XLSX missing
         if not os.path.exists(students_path) and os.path.exists("Student_rec.csv"):
@@ -28,69 +101,65 @@ class OfflineConnector:
         if not os.path.exists(sponsors_path) and os.path.exists("Sponsers_rec.csv"):
             sponsors_path = "Sponsers_rec.csv"
 
-        self._students_df = _read_tabular(students_path)
-        self._content_df = _read_tabular(content_path)
-        self._sponsors_df = _read_tabular(sponsors_path)
+        self._use_cache = use_cache
+        self._students = self._load("students", students_path, self._normalize_students)
+        self._content = self._load("content", content_path, self._normalize_content)
+        self._sponsors = self._load("sponsors", sponsors_path, self._normalize_sponsors)
 
-        # Normalize
-        self._students = self._normalize_students(self._students_df)
-        self._content = self._normalize_content(self._content_df)
-        self._sponsors = self._normalize_sponsors(self._sponsors_df)
+    def _load(self, kind: str, path: str, normalize) -> List[Dict[str, Any]]:
+        key = _source_key(kind, path) if self._use_cache else None
+        cache_path = path + ".cache.npz"
+        if key is not None:
+            columns = _read_cache(cache_path, key)
+            if columns is not None:
+                return _to_records(columns)
+        columns = _frame_columns(normalize(_read_tabular(path)))
+        if key is not None:
+            try:
+                _write_cache(cache_path, key, columns)
+            except (OSError, ValueError, TypeError, OverflowError):
+                # read-only location or a column we cannot pack: just skip the cache
+                pass
+        return _to_records(columns)
 
     @staticmethod
-    def _normalize_students(df: pd.DataFrame) -> List[Dict[str, Any]]:
-        out: List[Dict[str, Any]] = []
-        for r in df.replace({pd.NA: None}).to_dict(orient="records"):
-            interests = r.get("interests")
-            if isinstance(interests, str):
-                # split on comma or semicolon
-                parts = [p.strip() for p in re_split(interests) if p.strip()]
-                r["interests"] = parts
-            profile = {
-                "gpa": r.pop("gpa", None) or r.pop("profile.gpa", None),
-                "department": r.pop("department", None) or r.pop("profile.department", None),
-                "year": r.pop("year", None) or r.pop("profile.year", None),
-            }
-            r["profile"] = {k: v for k, v in profile.items() if v is not None}
-            r["student_id"] = str(r.get("student_id"))
-            out.append(r)
-        return out
+    def _normalize_students(df: pd.DataFrame) -> pd.DataFrame:
+        df = _prepare(df)
+        if "interests" in df.columns:
+            # split on comma or semicolon
+            df["interests"] = _split_list_column(df["interests"])
+        for field in ("gpa", "department", "year"):
+            flat = df.pop(field) if field in df.columns else None
+            dotted = df.pop(f"profile.{field}") if f"profile.{field}" in df.columns else None
+            df[_nested("profile", field)] = _first_truthy(flat, dotted, len(df))
+        df["student_id"] = _as_str(df["student_id"]) if "student_id" in df.columns else "None"
+        return df
 
     @staticmethod
-    def _normalize_content(df: pd.DataFrame) -> List[Dict[str, Any]]:
-        out: List[Dict[str, Any]] = []
-        for r in df.replace({pd.NA: None}).to_dict(orient="records"):
-            tags = r.get("tags")
-            if isinstance(tags, str):
-                r["tags"] = [p.strip() for p in re_split(tags) if p.strip()]
-            cid = r.get("course_id")
-            r["course_id"] = str(cid if cid not in (None, "") else f"course_{len(out)}")
-            out.append(r)
-        return out
+    def _normalize_content(df: pd.DataFrame, start: int = 0) -> pd.DataFrame:
+        df = _prepare(df)
+        if "tags" in df.columns:
+            df["tags"] = _split_list_column(df["tags"])
+        ids = df["course_id"].to_numpy(dtype=object, copy=True) if "course_id" in df.columns else np.full(len(df), None)
+        missing = np.flatnonzero((ids == None) | (ids == ""))  # noqa: E711 (elementwise)
+        ids[missing] = [f"course_{start + i}" for i in missing]
+        df["course_id"] = _as_str(pd.Series(ids, index=df.index, dtype=object))
+        return df
 
     @staticmethod
-    def _normalize_sponsors(df: pd.DataFrame) -> List[Dict[str, Any]]:
-        out: List[Dict[str, Any]] = []
-        for r in df.replace({pd.NA: None}).to_dict(orient="records"):
-            crit = {}
-            if "min_gpa" in r and pd.notna(r["min_gpa"]):
-                crit["min_gpa"] = float(r["min_gpa"])  # type: ignore[arg-type]
-            if "required_department" in r and pd.notna(r["required_department"]):
-                crit["required_department"] = str(r["required_department"])  # type: ignore[arg-type]
-            if "min_year" in r and pd.notna(r["min_year"]):
-                crit["min_year"] = int(r["min_year"])  # type: ignore[arg-type]
-            r["criteria"] = crit
-            r["sponsor_id"] = str(r.get("sponsor_id"))
-            out.append(r)
-        return out
-
-# helper splitter supports comma or semicolon
-def re_split(text: str) -> List[str]:
-    import re
-    return re.split(r"[;,]", text)
+    def _normalize_sponsors(df: pd.DataFrame) -> pd.DataFrame:
+        df = _prepare(df)
+        for field, cast in (("min_gpa", float), ("required_department", str), ("min_year", int)):
+            crit: List[Any] = [None] * len(df)
+            if field in df.columns:
+                col = df[field].astype(object)
+                for pos in np.flatnonzero(col.notna().to_numpy()):
+                    crit[pos] = cast(col.iat[pos])
+            df[_nested("criteria", field)] = pd.Series(crit, index=df.index, dtype=object)
+        df["sponsor_id"] = _as_str(df["sponsor_id"]) if "sponsor_id" in df.columns else "None"
+        return df
 
     # API compatible getters
-    
     def get_all_students(self) -> List[Dict[str, Any]]:
         return list(self._students)
 
@@ -109,3 +178,186 @@ def re_split(text: str) -> List[str]:
     # Stub save (offline). No-op here.
     def save_recommendations(self, student_id: str, recommendations: Dict[str, Any], extra: Optional[Dict[str, Any]] = None) -> None:  # noqa: D401
         return None
+
+
+def normalized_records(kind: str, df: pd.DataFrame, start: int = 0) -> List[Dict[str, Any]]:
+    """Rows of a "students", "content" or "sponsors" sheet, normalized as OfflineConnector loads them.
+
+    `start` is the position of `df`'s first row in its file, so chunks of one
+    file get the same generated course ids as the whole file would.
+    """
+    if kind == "students":
+        frame = OfflineConnector._normalize_students(df)
+    elif kind == "content":
+        frame = OfflineConnector._normalize_content(df, start)
+    elif kind == "sponsors":
+        frame = OfflineConnector._normalize_sponsors(df)
+    else:
+        raise ValueError(f"unknown kind: {kind!r}")
+    return _to_records(_frame_columns(frame))
+
+
+# helper splitter supports comma or semicolon
+def re_split(text: str) -> List[str]:
+    import re
+    return re.split(r"[;,]", text)
+
+
+# ---- vectorized normalization helpers ----
+def _prepare(df: pd.DataFrame) -> pd.DataFrame:
+    """Missing values as None and text columns as plain objects, like `to_dict` rows."""
+    df = df.replace({pd.NA: None}).reset_index(drop=True)
+    text = [c for c in df.columns if pd.api.types.is_string_dtype(df[c].dtype) and df[c].dtype != object]
+    return df.astype({c: object for c in text}) if text else df
+
+
+def _nested(group: str, field: str) -> str:
+    return f"{group}{_NESTED_SEP}{field}"
+
+
+def _split_list_column(col: pd.Series) -> pd.Series:
+    """Strings become lists of stripped, non-empty items; other values are kept as is."""
+    if col.dtype != object:
+        return col
+    parts = col.str.split(r"[;,]", regex=True)
+    is_str = parts.notna()
+    items = parts[is_str].explode().str.strip()
+    items = items[items.ne("")]
+    # explode keeps row order, so each row's items are one contiguous run
+    flat, owner = items.tolist(), items.index.to_numpy()
+    rows = np.flatnonzero(is_str.to_numpy())
+    starts = np.searchsorted(owner, rows, side="left").tolist()
+    ends = np.searchsorted(owner, rows, side="right").tolist()
+    values = col.tolist()
+    for pos, start, end in zip(rows.tolist(), starts, ends):
+        values[pos] = flat[start:end]
+    return pd.Series(values, index=col.index, dtype=object)
+
+
+def _first_truthy(first: Optional[pd.Series], second: Optional[pd.Series], n: int) -> pd.Series:
+    """Elementwise `first or second` (None where a column is absent)."""
+    out = second.astype(object) if second is not None else pd.Series([None] * n, dtype=object)
+    if first is not None:
+        first = first.astype(object)
+        out = first.where(first.astype(bool), out)
+    return out
+
+
+def _as_str(col: pd.Series) -> pd.Series:
+    return col.astype(object).map(str)
+
+
+def _frame_columns(frame: pd.DataFrame) -> Columns:
+    return [(str(name), frame[name].tolist()) for name in frame.columns]
+
+
+def _to_records(columns: Columns) -> List[Dict[str, Any]]:
+    plain = [(i, name) for i, (name, _) in enumerate(columns) if _NESTED_SEP not in name]
+    groups: Dict[str, List[Tuple[int, str]]] = {}
+    for i, (name, _) in enumerate(columns):
+        if _NESTED_SEP in name:
+            group, field = name.split(_NESTED_SEP, 1)
+            groups.setdefault(group, []).append((i, field))
+    out: List[Dict[str, Any]] = []
+    for row in zip(*(values for _, values in columns)):
+        rec = {name: row[i] for i, name in plain}
+        for group, fields in groups.items():
+            rec[group] = {field: row[i] for i, field in fields if row[i] is not None}
+        out.append(rec)
+    return out
+
+
+# ---- columnar sidecar cache ----
+def _source_key(kind: str, path: str) -> Optional[Dict[str, Any]]:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return {"version": _CACHE_VERSION, "kind": kind, "size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+
+def _pack_strings(items: List[str]) -> np.ndarray:
+    text = _STR_SEP.join(items)
+    if text.count(_STR_SEP) != max(len(items) - 1, 0):
+        raise ValueError("string contains NUL")
+    return np.frombuffer(text.encode("utf-8"), dtype=np.uint8)
+
+
+def _unpack_strings(buf: np.ndarray, n: int) -> List[str]:
+    if n == 0:
+        return []
+    return buf.tobytes().decode("utf-8").split(_STR_SEP)
+
+
+def _encode_column(values: List[Any], prefix: str, arrays: Dict[str, np.ndarray]) -> str:
+    """Pack one column into `arrays` and return its kind; ValueError if mixed types."""
+    mask = np.array([v is None for v in values], dtype=bool)
+    present = [v for v in values if v is not None]
+    types = {type(v) for v in present}
+    if types <= {str}:
+        arrays[prefix + "values"] = _pack_strings(["" if v is None else v for v in values])
+        kind = "str"
+    elif types <= {list} and all(type(x) is str for v in present for x in v):
+        lists = [[] if v is None else v for v in values]
+        arrays[prefix + "values"] = _pack_strings([x for v in lists for x in v])
+        arrays[prefix + "lengths"] = np.array([len(v) for v in lists], dtype=np.int64)
+        kind = "list"
+    elif types <= {bool}:
+        arrays[prefix + "values"] = np.array([bool(v) for v in values], dtype=bool)
+        kind = "bool"
+    elif types <= {int}:
+        arrays[prefix + "values"] = np.array([0 if v is None else v for v in values], dtype=np.int64)
+        kind = "int"
+    elif types <= {float}:
+        arrays[prefix + "values"] = np.array([0.0 if v is None else v for v in values], dtype=np.float64)
+        kind = "float"
+    else:
+        raise ValueError(f"cannot pack column with types {sorted(t.__name__ for t in types)}")
+    if mask.any():
+        arrays[prefix + "mask"] = mask
+    return kind
+
+
+def _decode_column(kind: str, n: int, prefix: str, data: Any) -> List[Any]:
+    if kind == "str":
+        values: List[Any] = _unpack_strings(data[prefix + "values"], n)
+    elif kind == "list":
+        lengths = data[prefix + "lengths"]
+        flat = _unpack_strings(data[prefix + "values"], int(lengths.sum()))
+        ends = np.cumsum(lengths).tolist()
+        values = [flat[end - length : end] for end, length in zip(ends, lengths.tolist())]
+    else:
+        values = data[prefix + "values"].tolist()
+    if prefix + "mask" in data.files:
+        for pos in np.flatnonzero(data[prefix + "mask"]):
+            values[pos] = None
+    return values
+
+
+def _write_cache(path: str, key: Dict[str, Any], columns: Columns) -> None:
+    arrays: Dict[str, np.ndarray] = {}
+    kinds = [_encode_column(values, f"{i}.", arrays) for i, (_, values) in enumerate(columns)]
+    n = len(columns[0][1]) if columns else 0
+    meta = {**key, "rows": n, "columns": [[name, kind] for (name, _), kind in zip(columns, kinds)]}
+    arrays["meta"] = np.frombuffer(json.dumps(meta).encode("utf-8"), dtype=np.uint8)
+    buf = io.BytesIO()
+    np.savez(buf, **arrays)
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(buf.getbuffer())
+    os.replace(tmp, path)
+
+
+def _read_cache(path: str, key: Dict[str, Any]) -> Optional[Columns]:
+    try:
+        with np.load(path, allow_pickle=False) as data:
+            meta = json.loads(data["meta"].tobytes().decode("utf-8"))
+            if any(meta.get(k) != v for k, v in key.items()):
+                return None
+            n = int(meta["rows"])
+            return [
+                (name, _decode_column(kind, n, f"{i}.", data))
+                for i, (name, kind) in enumerate(meta["columns"])
+            ]
+    except (OSError, ValueError, KeyError, UnicodeDecodeError):
+        return None
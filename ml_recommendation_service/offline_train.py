@@ -1,11 +1,112 @@
 from __future__ import annotations
 
 import argparse
+import datetime
 import json
+import os
+import sys
+import time
 from pathlib import Path
+from typing import Any, Dict, List, Optional, Set
 
+from .config import BATCH_CHUNK_SIZE, BATCH_WORKERS, OUTPUT_SHARDS, OUTPUT_COMPRESSION
+from .model_store import combine_hash
 from .offline_connector import OfflineConnector
+from .parallel import iter_recommendation_chunks
 from .recommendation_engine import RecommendationEngine
+from .sharded_output import ShardedRecommendations, ShardedWriter
+
+_CHECKPOINT_VERSION = 1
+
+
+class _JsonlSink:
+    def __init__(self, path: Path, resume_state: Optional[Dict[str, Any]]) -> None:
+        self.path = path
+        self.done: Set[str] = set()
+        if resume_state is not None and path.exists():
+            # Drop a partially written tail, then collect ids that are already out
+            with path.open("r+b") as f:
+                f.truncate(int(resume_state["offset"]))
+            with path.open("r", encoding="utf-8") as f:
+                self.done = {str(json.loads(line)["student_id"]) for line in f if line.strip()}
+            self._f = path.open("a", encoding="utf-8")
+        else:
+            self._f = path.open("w", encoding="utf-8")
+
+    def write(self, recs: List[Dict[str, Any]]) -> None:
+        for rec in recs:
+            self._f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+
+    def checkpoint(self) -> Dict[str, Any]:
+        self._f.flush()
+        os.fsync(self._f.fileno())
+        return {"offset": self._f.tell()}
+
+    def close(self) -> None:
+        self._f.close()
+
+
+class _ShardedSink:
+    def __init__(self, path: Path, resume_state: Optional[Dict[str, Any]], args: argparse.Namespace) -> None:
+        self.path = path
+        self.done: Set[str] = set()
+        if resume_state is not None and path.exists():
+            ShardedWriter.rollback(str(path), resume_state["shard_sizes"])
+            reader = ShardedRecommendations(str(path))
+            self.done = set(reader.student_ids())
+            reader.close()
+        append = args.append or resume_state is not None
+        self._w = ShardedWriter(str(path), shards=args.shards, compression=args.compression, append=append)
+
+    def write(self, recs: List[Dict[str, Any]]) -> None:
+        self._w.write_many(recs)
+
+    def checkpoint(self) -> Dict[str, Any]:
+        return {"shard_sizes": self._w.checkpoint()}
+
+    def close(self) -> None:
+        self._w.close()
+
+
+class _Progress:
+    """Rows/sec and ETA on stderr, at most every `interval` seconds."""
+
+    def __init__(self, total: int, interval: float = 5.0) -> None:
+        self.total = total
+        self.interval = interval
+        self.done = 0
+        self._start = self._last = time.monotonic()
+
+    def update(self, n: int, force: bool = False) -> None:
+        self.done += n
+        now = time.monotonic()
+        if not force and now - self._last < self.interval:
+            return
+        self._last = now
+        rate = self.done / max(now - self._start, 1e-9)
+        eta = (self.total - self.done) / rate if rate > 0 else 0.0
+        pct = 100.0 * self.done / self.total if self.total else 100.0
+        print(
+            f"[offline_train] {self.done}/{self.total} ({pct:.1f}%) {rate:.0f} rows/s "
+            f"ETA {datetime.timedelta(seconds=int(eta))}",
+            file=sys.stderr,
+            flush=True,
+        )
+
+
+def _load_checkpoint(path: Path) -> Optional[Dict[str, Any]]:
+    try:
+        with path.open("r", encoding="utf-8") as f:
+            ckpt = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return ckpt if ckpt.get("version") == _CHECKPOINT_VERSION else None
+
+
+def _save_checkpoint(path: Path, ckpt: Dict[str, Any]) -> None:
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text(json.dumps(ckpt), encoding="utf-8")
+    os.replace(tmp, path)
 
 
 def main():
@@ -13,8 +114,16 @@ def main():
     parser.add_argument("--students", default="Student_rec.xlsx")
     parser.add_argument("--content", default="Content_rec.xlsx")
     parser.add_argument("--sponsors", default="Sponsers_rec.xlsx")
-    parser.add_argument("--out", default="offline_recommendations.jsonl", help="Output JSONL file")
+    parser.add_argument("--out", default=None, help="Output JSONL file or sharded store directory")
+    parser.add_argument("--format", choices=("jsonl", "sharded"), default="jsonl", help="Output format")
+    parser.add_argument("--shards", type=int, default=OUTPUT_SHARDS, help="Shard files (sharded format)")
+    parser.add_argument("--compression", choices=("gzip", "zstd", "none"), default=OUTPUT_COMPRESSION)
+    parser.add_argument("--append", action="store_true", help="Add to an existing sharded store instead of replacing it")
     parser.add_argument("--limit", type=int, default=0, help="Limit number of students (0=all)")
+    parser.add_argument("--workers", type=int, default=BATCH_WORKERS, help="Worker processes for scoring")
+    parser.add_argument("--chunk-size", type=int, default=BATCH_CHUNK_SIZE, help="Students per scoring chunk")
+    parser.add_argument("--resume", action="store_true", help="Continue an interrupted run from its last checkpoint")
+    parser.add_argument("--checkpoint-every", type=float, default=30.0, help="Seconds between checkpoints")
     args = parser.parse_args()
 
     conn = OfflineConnector(args.students, args.content, args.sponsors)
@@ -24,15 +133,44 @@ def main():
     students = conn.get_all_students()
     if args.limit and args.limit > 0:
         students = students[: args.limit]
+    ids = [str(s.get("student_id")) for s in students]
+
+    out_path = Path(args.out or ("offline_recommendations.recs" if args.format == "sharded" else "offline_recommendations.jsonl"))
+    ckpt_path = out_path.with_name(out_path.name + ".ckpt")
+    # A checkpoint only applies to the same output format and student list
+    fingerprint = combine_hash(args.format, ids)
+    resume_state = None
+    if args.resume:
+        ckpt = _load_checkpoint(ckpt_path)
+        if ckpt is None:
+            print(f"[offline_train] no checkpoint at {ckpt_path}; starting from scratch", file=sys.stderr)
+        elif ckpt.get("fingerprint") != fingerprint:
+            raise SystemExit(f"{ckpt_path} was written for different inputs or format; rerun without --resume")
+        else:
+            resume_state = ckpt["state"]
+
+    sink = _ShardedSink(out_path, resume_state, args) if args.format == "sharded" else _JsonlSink(out_path, resume_state)
+    todo = [sid for sid in ids if sid not in sink.done]
+    if sink.done:
+        print(f"[offline_train] resuming: {len(ids) - len(todo)} of {len(ids)} students already written", file=sys.stderr)
 
-    out_path = Path(args.out)
-    with out_path.open("w", encoding="utf-8") as f:
-        for s in students:
-            sid = str(s.get("student_id"))
-            if not sid:
-                continue
-            rec = engine.recommend_for_student(sid)
-            f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+    progress = _Progress(len(todo))
+    last_checkpoint = time.monotonic()
+    for chunk in iter_recommendation_chunks(engine, todo, workers=args.workers, chunk_size=args.chunk_size):
+        sink.write([rec for _, rec in chunk])
+        progress.update(len(chunk))
+        if time.monotonic() - last_checkpoint >= args.checkpoint_every:
+            _save_checkpoint(
+                ckpt_path, {"version": _CHECKPOINT_VERSION, "fingerprint": fingerprint, "state": sink.checkpoint()}
+            )
+            last_checkpoint = time.monotonic()
+    sink.close()
+    progress.update(0, force=True)
+    # Finished cleanly: nothing to resume
+    try:
+        ckpt_path.unlink()
+    except OSError:
+        pass
     print(f"Wrote recommendations for {len(students)} students -> {out_path}")
 
 
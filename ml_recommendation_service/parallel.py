@@ -0,0 +1,87 @@
+from __future__ import annotations
+
+import gc
+import multiprocessing as mp
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+# Engine inherited by forked workers. Set in the parent right before the pool
+# is created so children see the fitted models through copy-on-write pages
+# instead of receiving a pickled copy with every task.
+_WORKER_ENGINE = None
+
+
+def _score_shard(task: Tuple[List[str], int]) -> List[Tuple[str, Dict[str, Any]]]:
+    ids, chunk_size = task
+    engine = _WORKER_ENGINE
+    if engine is None:  # pragma: no cover - only reachable with a non-fork start method
+        return []
+    return list(zip(ids, engine.recommend_many(ids, chunk_size=chunk_size)))
+
+
+def _fork_context() -> Optional[Any]:
+    try:
+        if "fork" in mp.get_all_start_methods():
+            return mp.get_context("fork")
+    except Exception:
+        pass
+    return None
+
+
+def iter_recommendation_chunks(
+    engine,
+    student_ids: Sequence[str],
+    workers: int = 1,
+    chunk_size: int = 256,
+) -> Iterator[List[Tuple[str, Dict[str, Any]]]]:
+    """Yield lists of (student_id, recommendations), one list per chunk.
+
+    With workers > 1 the ids are sharded across a forked process pool and chunks
+    arrive in completion order, not input order. Each task carries only a slice
+    of ids and returns one chunk of results, so per-worker memory is bounded by
+    chunk_size. The pool is forked when this is called, not when the result is
+    first iterated, so start background threads (e.g. a bulk writer) after
+    calling it; iterate the result to the end or `close()` it to shut the
+    pool down. Falls back to in-process scoring where fork is unavailable
+    (e.g. Windows).
+
+    Forking while other threads run (Mongo client monitors, the scheduler's
+    retrain thread, server workers) is fine: workers score the students of
+    the inherited snapshot, so they do not use the connector's client
+    (pymongo resets its own state after a fork anyway), and every lock they
+    take (metrics, caches, the profile index) is registered with
+    `fork_safe` and replaced in the child.
+    """
+    ids = [str(sid) for sid in student_ids if str(sid)]
+    chunk_size = max(1, int(chunk_size))
+    shards = [ids[i : i + chunk_size] for i in range(0, len(ids), chunk_size)]
+
+    ctx = _fork_context() if workers and workers > 1 and len(shards) > 1 else None
+    if ctx is None:
+        return _score_in_process(engine, shards, chunk_size)
+
+    chunks = _score_in_pool(ctx, engine, shards, min(workers, len(shards)), chunk_size)
+    next(chunks)  # fork now
+    return chunks
+
+
+def _score_in_process(engine, shards: List[List[str]], chunk_size: int) -> Iterator[List[Tuple[str, Dict[str, Any]]]]:
+    for shard in shards:
+        yield list(zip(shard, engine.recommend_many(shard, chunk_size=chunk_size)))
+
+
+def _score_in_pool(ctx, engine, shards: List[List[str]], processes: int, chunk_size: int) -> Iterator[Any]:
+    """Forks the pool, yields None once it is up, then the scored chunks; closing it terminates the pool."""
+    global _WORKER_ENGINE
+
+    _WORKER_ENGINE = engine
+    # Move everything allocated so far out of the collector's reach so workers
+    # don't dirty (and thereby copy) the shared pages just by running GC.
+    gc.freeze()
+    try:
+        with ctx.Pool(processes=processes) as pool:
+            yield None
+            for chunk in pool.imap_unordered(_score_shard, [(shard, chunk_size) for shard in shards]):
+                yield chunk
+    finally:
+        gc.unfreeze()
+        _WORKER_ENGINE = None
@@ -0,0 +1,214 @@
+from __future__ import annotations
+
+import json
+import mmap
+import os
+import re
+import threading
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .cache import ResultCache
+from .sharded_output import SCORE_DECIMALS
+
+_INDEX_VERSION = 1
+# student_id is the first key the engine writes; anything else falls back to a full parse
+# (anchored, since nested similar_students entries also carry a student_id)
+_ID_RE = re.compile(rb'\{\s*"student_id"\s*:\s*("(?:[^"\\]|\\.)*"|-?\d+)')
+
+
+@dataclass(frozen=True)
+class _JsonlState:
+    """One opened version of the file: readers take a single reference and use only it."""
+
+    generation: int
+    stat: Optional[Tuple[int, int, int]] = None
+    mm: Optional[mmap.mmap] = None
+    ids: np.ndarray = field(default_factory=lambda: np.empty(0, dtype="S1"))
+    offsets: np.ndarray = field(default_factory=lambda: np.empty(0, dtype=np.int64))
+    lengths: np.ndarray = field(default_factory=lambda: np.empty(0, dtype=np.int32))
+
+    def find(self, sid: str) -> Optional[int]:
+        key = sid.encode("utf-8")
+        if not len(self.ids) or len(key) > self.ids.dtype.itemsize:
+            return None
+        row = int(np.searchsorted(self.ids, key))
+        if row < len(self.ids) and self.ids[row] == key:
+            return row
+        return None
+
+
+class PrecomputedJsonl:
+    """Indexed, memory-mapped reader for offline_recommendations.jsonl.
+
+    A sidecar index (`<file>.idx/`: sorted student ids plus byte offset and
+    length of each record) is built on first open and reused while the JSONL's
+    size and mtime are unchanged. Both the JSONL and the index are
+    memory-mapped, and a record is parsed only when it is requested, so startup
+    time and resident memory do not grow with the number of students. Recently
+    read records are kept in a small LRU.
+
+    Scores are rounded to SCORE_DECIMALS, so records read the same as from a
+    sharded store. If a student appears on several lines the last one wins.
+    Replace the file atomically (write elsewhere, then rename) while a service
+    is reading it; changes are picked up on the next lookup. Thread-safe: a
+    reload builds the new mapping and index aside and publishes them as one
+    state object, and a replaced mapping is never closed under a reader; it is
+    unmapped once the last lookup using it lets go.
+    """
+
+    def __init__(self, path: str, hot_records: int = 1024) -> None:
+        self.path = Path(path)
+        self._hot = ResultCache(max_entries=hot_records)
+        self._lock = threading.Lock()
+        self._state = self._open(1)
+
+    # ---- public ----
+    def get(self, student_id: str) -> Optional[Dict[str, Any]]:
+        state = self._current()
+        sid = str(student_id)
+        # the generation only increases, so a lookup still on a replaced state cannot evict newer entries
+        rec = self._hot.get(sid, state.generation)
+        if rec is not None:
+            return rec
+        row = state.find(sid)
+        if row is None:
+            return None
+        start = int(state.offsets[row])
+        rec = _round_scores(json.loads(state.mm[start : start + int(state.lengths[row])]))
+        self._hot.put(sid, rec, state.generation)
+        return rec
+
+    def student_ids(self) -> List[str]:
+        return [i.decode("utf-8") for i in self._current().ids.tolist()]
+
+    def __len__(self) -> int:
+        return len(self._state.ids)
+
+    def close(self) -> None:
+        # drop the mapping rather than closing it: lookups in flight may still hold it
+        with self._lock:
+            self._state = _JsonlState(self._state.generation + 1)
+
+    # ---- internals ----
+    @property
+    def _index_dir(self) -> Path:
+        return self.path.with_name(self.path.name + ".idx")
+
+    def _source_stat(self) -> Optional[Tuple[int, int, int]]:
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return (st.st_ino, st.st_size, st.st_mtime_ns)
+
+    def _current(self) -> _JsonlState:
+        state = self._state
+        if self._source_stat() == state.stat:
+            return state
+        with self._lock:
+            # another thread may have reloaded while this one waited
+            if self._source_stat() != self._state.stat:
+                self._state = self._open(self._state.generation + 1)
+            return self._state
+
+    def _open(self, generation: int) -> _JsonlState:
+        try:
+            f = open(self.path, "rb")
+        except OSError:
+            return _JsonlState(generation)
+        with f:
+            # stat the file that was opened, not whatever the path points at by now
+            st = os.fstat(f.fileno())
+            stat = (st.st_ino, st.st_size, st.st_mtime_ns)
+            if st.st_size == 0:
+                return _JsonlState(generation, stat)
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        index = self._load_index(stat)
+        if index is None:
+            index = self._build_index(mm)
+            try:
+                self._write_index(stat, *index)
+            except OSError:
+                # read-only location: keep the in-memory index
+                pass
+        return _JsonlState(generation, stat, mm, *index)
+
+    def _load_index(self, stat: Tuple[int, int, int]) -> Optional[Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+        d = self._index_dir
+        try:
+            with open(d / "meta.json", "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            if meta.get("version") != _INDEX_VERSION or [meta.get("size"), meta.get("mtime_ns")] != list(stat[1:]):
+                return None
+            ids = np.load(d / "ids.npy", mmap_mode="r")
+            offsets = np.load(d / "offsets.npy", mmap_mode="r")
+            lengths = np.load(d / "lengths.npy", mmap_mode="r")
+        except (OSError, ValueError):
+            return None
+        if not (len(ids) == len(offsets) == len(lengths) == meta.get("count")):
+            return None
+        return ids, offsets, lengths
+
+    def _build_index(self, mm: mmap.mmap) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        entries: Dict[str, Tuple[int, int]] = {}
+        pos, size = 0, len(mm)
+        while pos < size:
+            end = mm.find(b"\n", pos)
+            if end == -1:
+                end = size
+            line = mm[pos:end]
+            stripped = line.strip()
+            if stripped:
+                sid = self._record_id(stripped)
+                if sid:
+                    # offsets point at the stripped record so it can be parsed as is
+                    start = pos + line.index(stripped[:1])
+                    entries[sid] = (start, len(stripped))
+            pos = end + 1
+
+        ids = sorted(entries)
+        encoded = [i.encode("utf-8") for i in ids]
+        width = max((len(e) for e in encoded), default=1) or 1
+        return (
+            np.array(encoded, dtype=f"S{width}"),
+            np.array([entries[i][0] for i in ids], dtype=np.int64),
+            np.array([entries[i][1] for i in ids], dtype=np.int32),
+        )
+
+    @staticmethod
+    def _record_id(line: bytes) -> Optional[str]:
+        m = _ID_RE.match(line)
+        try:
+            if m is not None:
+                return str(json.loads(m.group(1)))
+            obj = json.loads(line)
+        except ValueError:
+            return None
+        sid = obj.get("student_id") if isinstance(obj, dict) else None
+        return str(sid) if sid is not None else None
+
+    def _write_index(self, stat: Tuple[int, int, int], ids: np.ndarray, offsets: np.ndarray, lengths: np.ndarray) -> None:
+        d = self._index_dir
+        d.mkdir(exist_ok=True)
+        for name, arr in (("ids", ids), ("offsets", offsets), ("lengths", lengths)):
+            tmp = d / f"{name}.tmp.npy"
+            np.save(tmp, arr)
+            os.replace(tmp, d / f"{name}.npy")
+        # meta last: it is what marks the arrays as matching the current file
+        meta = {"version": _INDEX_VERSION, "size": stat[1], "mtime_ns": stat[2], "count": len(ids)}
+        tmp = d / "meta.tmp.json"
+        tmp.write_text(json.dumps(meta), encoding="utf-8")
+        os.replace(tmp, d / "meta.json")
+
+
+def _round_scores(rec: Dict[str, Any]) -> Dict[str, Any]:
+    for entries in rec.values():
+        if isinstance(entries, list):
+            for e in entries:
+                if isinstance(e, dict) and isinstance(e.get("score"), float):
+                    e["score"] = round(e["score"], SCORE_DECIMALS)
+    return rec
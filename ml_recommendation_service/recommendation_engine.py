@@ -1,98 +1,301 @@
 from __future__ import annotations
 
-from typing import Any, Dict, List, Tuple
+from typing import Any, Callable, Dict, Iterable, List, Mapping, Optional, Tuple
 from collections import defaultdict
+import dataclasses
+from contextlib import nullcontext
 import os
 from pathlib import Path
 
-from .config import TOP_K_COURSES, TOP_K_SPONSORS, CONTENT_WEIGHT, COLLAB_WEIGHT, DIVERSITY_STRENGTH, SEMANTIC_WEIGHT, USE_ANN, ANN_N_NEIGHBORS, ANN_CANDIDATES, BANDIT_EPSILON, BANDIT_EXPLORE_K
+from .config import TOP_K_COURSES, TOP_K_SPONSORS, CONTENT_WEIGHT, COLLAB_WEIGHT, DIVERSITY_STRENGTH, SEMANTIC_WEIGHT, USE_ANN, ANN_N_NEIGHBORS, ANN_CANDIDATES, ANN_DIM, ANN_NLIST, ANN_NPROBE, ANN_GATED, BANDIT_EPSILON, BANDIT_EXPLORE_K, BATCH_CHUNK_SIZE, BATCH_WORKERS, COLLAB_MAX_NEIGHBORS, COLLAB_LSH, COLLAB_LSH_BANDS, COLLAB_LSH_ROWS, MODEL_STORE_VERIFY, INCREMENTAL_MAX_DRIFT, MEMORY_BUDGET_MB, MEMORY_BUDGET_ACTION, MEMORY_TRACE_FIT
 from .models import ContentBasedRecommender, CollaborativeRecommender, SponsorMatcher, SemanticRecommender, PeopleRecommender, ANNRetriever
+from .batch_state import BatchState
+from .model_store import DocumentDelta, ModelStore, combine_hash, diff_documents, document_hashes, hash_documents
+from .memory import component_report, enforce_budget, rows_report, trace_allocations
+from .metrics import METRICS, StageTimer, swallowed
+from .snapshot import ServingSnapshot
 
 
 class RecommendationEngine:
     def __init__(self, db_connector):
         self.db = db_connector
-        self._content = None
-        self._students = None
-        self._sponsors = None
-        self.content_model = ContentBasedRecommender()
-        self.collab_model = CollaborativeRecommender()
-        self.sponsor_model = SponsorMatcher()
-        self.semantic_model = SemanticRecommender()
-        self.people_model = PeopleRecommender()
-        self.ann = ANNRetriever(n_neighbors=ANN_N_NEIGHBORS) if USE_ANN else None
+        # Requests read only from the current snapshot; train_models swaps in a new one.
+        self._snapshot = ServingSnapshot.build(0, content=None, students=None, sponsors=None, **self._new_models())
         # where to store persisted models
         self._store_dir = Path(os.getenv("MODEL_STORE_DIR", Path(__file__).parent / "models_store"))
         self._store_dir.mkdir(parents=True, exist_ok=True)
+        self._store = ModelStore(self._store_dir)
+        # Hash of the inputs behind the live snapshot (lets incremental retrains skip no-op runs)
+        self._live_key: Optional[str] = None
+        # tracemalloc bytes per component from the last training run (MEMORY_TRACE_FIT)
+        self._fit_traced: Dict[str, Dict[str, int]] = {}
 
-    def train_models(self):
+    @staticmethod
+    def _new_models() -> Dict[str, Any]:
+        return {
+            "content_model": ContentBasedRecommender(),
+            "collab_model": RecommendationEngine._new_collab_model(),
+            "sponsor_model": SponsorMatcher(),
+            "semantic_model": SemanticRecommender(),
+            "people_model": PeopleRecommender(),
+            "ann": ANNRetriever(n_neighbors=ANN_N_NEIGHBORS, dim=ANN_DIM, nlist=ANN_NLIST, nprobe=ANN_NPROBE)
+            if USE_ANN
+            else None,
+        }
+
+    @staticmethod
+    def _new_collab_model() -> CollaborativeRecommender:
+        return CollaborativeRecommender(
+            max_neighbors=COLLAB_MAX_NEIGHBORS,
+            lsh_bands=COLLAB_LSH_BANDS if COLLAB_LSH else 0,
+            lsh_rows=COLLAB_LSH_ROWS,
+        )
+
+    # ---- snapshot accessors (read-only views of the current snapshot) ----
+    @property
+    def snapshot(self) -> ServingSnapshot:
+        return self._snapshot
+
+    def reissue(self, version: int) -> None:
+        """Keep serving the current snapshot, under `version` (lets a rollback keep versions increasing)."""
+        self._snapshot = dataclasses.replace(self._snapshot, version=version)
+
+    @property
+    def content_model(self) -> ContentBasedRecommender:
+        return self._snapshot.content_model
+
+    @property
+    def collab_model(self) -> CollaborativeRecommender:
+        return self._snapshot.collab_model
+
+    @property
+    def sponsor_model(self) -> SponsorMatcher:
+        return self._snapshot.sponsor_model
+
+    @property
+    def semantic_model(self) -> SemanticRecommender:
+        return self._snapshot.semantic_model
+
+    @property
+    def people_model(self) -> PeopleRecommender:
+        return self._snapshot.people_model
+
+    @property
+    def ann(self) -> Optional[ANNRetriever]:
+        return self._snapshot.ann
+
+    @property
+    def _content(self) -> Tuple[Dict[str, Any], ...]:
+        return self._snapshot.content
+
+    @property
+    def _students(self) -> Tuple[Dict[str, Any], ...]:
+        return self._snapshot.students
+
+    @property
+    def _sponsors(self) -> Tuple[Dict[str, Any], ...]:
+        return self._snapshot.sponsors
+
+    def train_models(self, incremental: bool = False) -> Dict[str, str]:
+        """Fit a fresh set of models and atomically swap in a new snapshot.
+
+        Serving keeps using the previous snapshot until the swap, so a retrain
+        never exposes half-fitted state. Components whose inputs are unchanged
+        are reloaded from the model store. With `incremental=True` the others
+        are patched from the stored version using only the added, changed and
+        removed documents (by course_id/student_id and content hash), unless
+        that side has drifted by more than INCREMENTAL_MAX_DRIFT since its last
+        full fit; if nothing changed at all the live snapshot is kept.
+
+        With MEMORY_BUDGET_MB set, the snapshot is checked against the budget
+        twice: estimated from the live one before fitting and measured before
+        the swap (see `_check_budget`).
+
+        Returns how each component was obtained: "reused", "updated" or "fit".
+        """
+        timer = METRICS.stages("train")
         # Load data from DB
-        self._content = self.db.get_all_content() or []
-        self._students = self.db.get_all_students() or []
-        self._sponsors = self.db.get_all_sponsors() or []
-
-        # Try to load persisted models first
-        loaded = self._load_models()
-
-        # If loaded, verify content IDs match current content; otherwise force retrain
-        def _normalized_course_ids() -> List[str]:
-            ids: List[str] = []
-            for i, c in enumerate(self._content or []):
-                cid = c.get("course_id")
-                if cid in (None, ""):
-                    cid = i
-                ids.append(str(cid))
-            return ids
-
-        if loaded:
-            try:
-                current_ids = _normalized_course_ids()
-                stored_ids = getattr(self.content_model, "_course_ids", []) or []
-                if stored_ids != current_ids:
-                    # Invalidate loaded state to avoid stale models
-                    loaded = False
-                    self.content_model._vectorizer = None
-                    self.content_model._content_matrix = None
-                    self.content_model._course_ids = []
-            except Exception:
-                # If any issue, prefer retrain
-                loaded = False
-
-        # Fit models if not loaded
-        if not loaded:
-            if self._content:
-                self.content_model.fit(self._content)
-            if self._students:
-                self.collab_model.fit(self._students)
-            if self._content:
-                self.semantic_model.fit(self._content)
-            self._save_models()
-        if self._sponsors:
-            self.sponsor_model.fit(self._sponsors)
+        with timer.stage("load"):
+            content = self.db.get_all_content() or []
+            students = self.db.get_all_students() or []
+            sponsors = self.db.get_all_sponsors() or []
+
+        models = self._new_models()
+        content_model = models["content_model"]
+        collab_model = models["collab_model"]
+        semantic_model = models["semantic_model"]
+        people_model = models["people_model"]
+        ann = models["ann"]
+        params = self._component_params(models)
+        hashes = self._input_hashes(content, students, params)
+        sponsors_hash = hash_documents(sponsors)
+        live_key = combine_hash(hashes, sponsors_hash)
+        if incremental and live_key == self._live_key:
+            return {name: "reused" for name in self._PERSISTED}
+
+        self._check_budget(
+            self._estimate_bytes(len(content), len(students), len(sponsors)), "estimated for the new snapshot"
+        )
+
+        doc_hashes = self._document_hashes(content, students)
+        deltas, previous = self._plan_deltas(content, students, doc_hashes, params) if incremental else ({}, None)
+
+        # Reuse persisted components whose inputs are unchanged, patch or fit the rest
+        status: Dict[str, str] = {}
+        traced: Dict[str, Dict[str, int]] = {}
+        trace = (lambda name: trace_allocations(traced, name)) if MEMORY_TRACE_FIT else (lambda name: nullcontext())
+        with timer.stage("content"), trace("content"):
+            status["content"] = self._obtain(
+                "content", content_model, hashes, deltas.get("content"), lambda: content and content_model.fit(content)
+            )
+        with timer.stage("collab"), trace("collab"):
+            status["collab"] = self._obtain(
+                "collab", collab_model, hashes, deltas.get("collab"), lambda: students and collab_model.fit(students)
+            )
+        with timer.stage("semantic"), trace("semantic"):
+            status["semantic"] = self._obtain(
+                "semantic", semantic_model, hashes, deltas.get("semantic"), lambda: content and semantic_model.fit(content)
+            )
         # Fit people model (teachers may be absent; people_model handles None)
-        self.people_model.fit(self._students or [], [])
+        with timer.stage("people"), trace("people"):
+            status["people"] = self._obtain(
+                "people", people_model, hashes, deltas.get("people"), lambda: people_model.fit(students, [])
+            )
+        with timer.stage("sponsors"), trace("sponsor"):
+            if sponsors:
+                models["sponsor_model"].fit(sponsors)
 
-        # Fit ANN retriever using the same TF-IDF course matrix if available
+        # ANN index over the same TF-IDF course matrix; only re-assigned when the matrix was patched
+        matrix = getattr(content_model, "_content_matrix", None)
+        course_ids = [str(c) for c in getattr(content_model, "_course_ids", [])]
         try:
-            if USE_ANN and self.ann is not None and getattr(self.content_model, "_content_matrix", None) is not None:
-                matrix = getattr(self.content_model, "_content_matrix")
-                course_ids = getattr(self.content_model, "_course_ids", [])
-                if matrix is not None and course_ids:
-                    self.ann.fit(matrix, [str(c) for c in course_ids])
+            if USE_ANN and ann is not None and matrix is not None and course_ids:
+                with timer.stage("ann"), trace("ann"):
+                    status["ann"] = self._obtain(
+                        "ann",
+                        ann,
+                        hashes,
+                        deltas.get("ann") if status["content"] == "updated" else None,
+                        lambda: ann.fit(matrix, course_ids),
+                        apply=lambda m: m.reindex(matrix, course_ids),
+                        course_matrix=matrix,
+                    )
         except Exception:
             # ANN is optional; ignore failures
-            pass
+            swallowed("ann", "train")
+
+        # A full refit of any stateful component invalidates every stored recommendation
+        stored = previous if previous is not None else self._store.load("inputs")
+        fit_epoch = int((stored or {}).get("fit_epoch", 0))
+        if any(status.get(name) == "fit" and self._has_state(models.get(key)) for name, key in self._PERSISTED.items()):
+            fit_epoch += 1
+        inputs = self._inputs_state(doc_hashes, params, status, deltas, previous)
+        inputs["fit_epoch"] = fit_epoch
+        with timer.stage("persist"):
+            self._persist(models, status, hashes, inputs)
+        for name, how in status.items():
+            METRICS.incr("train_components", component=name, status=how)
+
+        snapshot = ServingSnapshot.build(
+            self._snapshot.version + 1,
+            content=content,
+            students=students,
+            sponsors=sponsors,
+            fit_epoch=fit_epoch,
+            sponsors_hash=sponsors_hash,
+            student_hashes=doc_hashes["students"],
+            course_hashes=doc_hashes["courses"],
+            **models,
+        )
+        if MEMORY_BUDGET_MB > 0:
+            self._check_budget(self.memory_report(snapshot)["total"], "new snapshot")
+        # Single reference assignment: readers see either the old or the new snapshot.
+        self._snapshot = snapshot
+        self._live_key = live_key
+        self._fit_traced = traced
+        return status
+
+    # ---- memory ----
+    # component -> (snapshot attribute, side it grows with)
+    _MEMORY_COMPONENTS = {
+        "content": ("content_model", "courses"),
+        "ann": ("ann", "courses"),
+        "semantic": ("semantic_model", "courses"),
+        "collab": ("collab_model", "students"),
+        "people": ("people_model", "students"),
+        "sponsor": ("sponsor_model", "sponsors"),
+    }
+    # side -> (snapshot rows, id index)
+    _MEMORY_ROWS = {
+        "courses": ("content", "content_index"),
+        "students": ("students", "student_index"),
+        "sponsors": ("sponsors", "sponsor_index"),
+    }
+
+    def memory_report(self, snapshot: Optional[ServingSnapshot] = None) -> Dict[str, Any]:
+        """Bytes held by each part of a snapshot (default: the serving one).
+
+        Per component: numpy/scipy buffers ("arrays"), buffers memory-mapped
+        from the model store ("mapped": page cache, not counted in "total"),
+        Python objects such as vocabulary dicts and collab sets ("python"),
+        and the largest attributes. The raw documents and their id indexes
+        are reported as "<side>_rows" and counted first, so models are only
+        charged for what they hold beyond them; an object shared by two
+        components (the TF-IDF matrix the ANN reranks with) is charged to the
+        first one listed. "fit_traced" has the tracemalloc retained/peak
+        bytes of each fit in the last training run (MEMORY_TRACE_FIT).
+        """
+        snap = snapshot or self._snapshot
+        seen: set = set()
+        components: Dict[str, Any] = {}
+        for side, (rows, index) in self._MEMORY_ROWS.items():
+            components[f"{side}_rows"] = rows_report(getattr(snap, rows), getattr(snap, index), seen)
+        for name, (attr, _) in self._MEMORY_COMPONENTS.items():
+            model = getattr(snap, attr)
+            if model is not None:
+                components[name] = component_report(model, seen)
+        report: Dict[str, Any] = {
+            "version": snap.version,
+            "components": components,
+            "fit_traced": dict(self._fit_traced),
+            "budget_bytes": int(MEMORY_BUDGET_MB * 1024 * 1024),
+        }
+        for key in ("arrays", "mapped", "python", "total"):
+            report[key] = sum(c[key] for c in components.values())
+        if snap is self._snapshot:
+            for name, c in components.items():
+                METRICS.set_gauge("model_bytes", c["total"], component=name)
+        return report
+
+    def _estimate_bytes(self, courses: int, students: int, sponsors: int) -> int:
+        """Live snapshot's footprint with each component scaled by how much its side grows (0 = no estimate)."""
+        if MEMORY_BUDGET_MB <= 0 or not self._snapshot.version:
+            return 0
+        counts = {"courses": courses, "students": students, "sponsors": sponsors}
+        live = {side: len(getattr(self._snapshot, rows)) for side, (rows, _) in self._MEMORY_ROWS.items()}
+        sides = {f"{side}_rows": side for side in self._MEMORY_ROWS}
+        sides.update({name: side for name, (_, side) in self._MEMORY_COMPONENTS.items()})
+        total = 0.0
+        for name, c in self.memory_report()["components"].items():
+            side = sides[name]
+            total += c["total"] * (counts[side] / live[side] if live[side] else 1.0)
+        return int(total)
 
     @staticmethod
-    def _diversify(ranked: List[Tuple[str, float]], content_index: Dict[str, Dict[str, Any]]) -> List[Tuple[str, float]]:
+    def _check_budget(needed: int, what: str) -> None:
+        """Warn or (MEMORY_BUDGET_ACTION=refuse) raise MemoryBudgetExceeded, leaving the live snapshot serving."""
+        if needed:
+            enforce_budget(needed, MEMORY_BUDGET_MB, MEMORY_BUDGET_ACTION, what)
+
+    @staticmethod
+    def _diversify(ranked: List[Tuple[str, float]], course_tags: Mapping[str, Tuple[str, ...]]) -> List[Tuple[str, float]]:
         if not ranked:
             return ranked
         seen_tags: set = set()
         diversified: List[Tuple[str, float]] = []
         for cid, score in ranked:
-            course = content_index.get(cid, {})
-            tags = course.get("tags")
-            if isinstance(tags, list):
+            tags = course_tags.get(cid)
+            if tags is not None:
                 penalty = DIVERSITY_STRENGTH * len(seen_tags.intersection(tags))
                 seen_tags.update(tags)
             else:
@@ -101,31 +304,60 @@ class RecommendationEngine:
         diversified.sort(key=lambda x: x[1], reverse=True)
         return diversified
 
-    def _rank_courses(self, student: Dict[str, Any]) -> List[Tuple[str, float]]:
-        # Pre-index content
-        content_idx = {str(c.get("course_id")): c for c in (self._content or [])}
+    @staticmethod
+    def _ann_candidates(snap: ServingSnapshot, student: Dict[str, Any]) -> List[str]:
+        if not (USE_ANN and snap.ann is not None):
+            return []
+        try:
+            vec = snap.content_model.transform_students([student])
+            if vec is not None:
+                return snap.ann.retrieve(vec, top_k=ANN_CANDIDATES)
+        except Exception:
+            swallowed("ann", "retrieve")
+        return []
+
+    def _rank_courses(
+        self, student: Dict[str, Any], snap: Optional[ServingSnapshot] = None, timer: Optional[StageTimer] = None
+    ) -> List[Tuple[str, float]]:
+        snap = snap or self._snapshot
+        timer = timer or METRICS.stages("recommend")
 
         # Optional ANN candidates (first-stage retrieval)
-        ann_candidates: List[str] = []
-        if USE_ANN and self.ann is not None:
-            try:
-                # reuse content-based student vector via private helper if present
-                if hasattr(self.content_model, "_student_interest_text") and hasattr(self.content_model, "_vectorizer"):
-                    # Build student vector using the same vectorizer
-                    text = self.content_model._student_interest_text(student)
-                    vec = self.content_model._vectorizer.transform([text]) if self.content_model._vectorizer else None
-                else:
-                    vec = None
-                if vec is not None:
-                    ann_candidates = self.ann.retrieve(vec, top_k=ANN_CANDIDATES)
-            except Exception:
-                ann_candidates = []
+        with timer.stage("ann"):
+            ann_candidates = self._ann_candidates(snap, student)
+        timer.note("ann_candidates", len(ann_candidates))
 
         # Get per-model scores
-        content_scores = self.content_model.recommend(student, top_k=TOP_K_COURSES * 3)
-        collab_scores = self.collab_model.recommend(student, top_k=TOP_K_COURSES * 3)
-        semantic_scores = self.semantic_model.recommend(student, top_k=TOP_K_COURSES * 3)
+        if ANN_GATED and ann_candidates:
+            with timer.stage("gated"):
+                content_scores, collab_scores, semantic_scores = self._score_gated(snap, student, ann_candidates)
+        else:
+            with timer.stage("content"):
+                content_scores = snap.content_model.recommend(student, top_k=TOP_K_COURSES * 3)
+            with timer.stage("collab"):
+                collab_scores = snap.collab_model.recommend(student, top_k=TOP_K_COURSES * 3)
+            with timer.stage("semantic"):
+                semantic_scores = snap.semantic_model.recommend(student, top_k=TOP_K_COURSES * 3)
+        with timer.stage("fusion"):
+            return self._fuse_courses(content_scores, collab_scores, semantic_scores, ann_candidates, snap.course_tags)
 
+    @staticmethod
+    def _score_gated(snap: ServingSnapshot, student: Dict[str, Any], candidates: List[str], query_vector=None):
+        """Second stage over the retrieved pool only: per-request cost scales with ANN_CANDIDATES."""
+        return (
+            snap.content_model.score_candidates(student, candidates, query_vector=query_vector),
+            snap.collab_model.score_candidates(student, candidates, top_k=TOP_K_COURSES * 3),
+            snap.semantic_model.score_candidates(student, candidates),
+        )
+
+    def _fuse_courses(
+        self,
+        content_scores: List[Tuple[str, float]],
+        collab_scores: List[Tuple[str, float]],
+        semantic_scores: List[Tuple[str, float]],
+        ann_candidates: List[str],
+        course_tags: Mapping[str, Tuple[str, ...]],
+    ) -> List[Tuple[str, float]]:
         weights = {
             "content": CONTENT_WEIGHT,
             "collab": COLLAB_WEIGHT,
@@ -146,7 +378,7 @@ class RecommendationEngine:
             combined = {cid: combined.get(cid, 0.0) for cid in candidate_set}
 
         ranked = sorted(combined.items(), key=lambda x: x[1], reverse=True)
-        ranked = self._diversify(ranked, content_idx)
+        ranked = self._diversify(ranked, course_tags)
 
         # Optional epsilon-greedy exploration: swap a few items with random remaining candidates
         if BANDIT_EPSILON > 0.0 and len(ranked) > TOP_K_COURSES:
@@ -161,26 +393,27 @@ class RecommendationEngine:
                     top = top[: max(0, TOP_K_COURSES - k)] + explore
                     ranked = top
             except Exception:
-                pass
+                swallowed("bandit", "explore")
         else:
             ranked = ranked[:TOP_K_COURSES]
         return ranked
 
-    def _rank_sponsors(self, student: Dict[str, Any]) -> List[Tuple[str, float]]:
-        return self.sponsor_model.match(student, top_k=TOP_K_SPONSORS)
-
-    def recommend_for_student(self, student_id: str) -> Dict[str, Any]:
-        student = self.db.get_student_profile(str(student_id))
-        if not student:
-            return {"student_id": str(student_id), "courses": [], "sponsors": []}
-
-        courses = self._rank_courses(student)
-        sponsors = self._rank_sponsors(student)
+    def _rank_sponsors(self, student: Dict[str, Any], snap: Optional[ServingSnapshot] = None) -> List[Tuple[str, float]]:
+        return (snap or self._snapshot).sponsor_model.match(student, top_k=TOP_K_SPONSORS)
 
+    @staticmethod
+    def _build_result(
+        snap: ServingSnapshot,
+        student: Dict[str, Any],
+        student_id: str,
+        courses: List[Tuple[str, float]],
+        sponsors: List[Tuple[str, float]],
+        similar: List[Tuple[str, float]],
+        teachers: List[Tuple[str, float]],
+    ) -> Dict[str, Any]:
         # Enrich with metadata (titles, names) for convenience
-        content_idx = {str(c.get("course_id")): c for c in (self._content or [])}
-        sponsor_idx = {str(s.get("sponsor_id")): s for s in (self._sponsors or [])}
-
+        content_idx = snap.content_index
+        sponsor_idx = snap.sponsor_index
         course_payload = [
             {
                 "course_id": cid,
@@ -201,79 +434,390 @@ class RecommendationEngine:
         ]
 
         # people suggestions
-        similar_students = [
-            {"student_id": sid, "score": float(score)} for sid, score in self.people_model.similar_students(student)
-        ]
-        matching_teachers = [
-            {"teacher_id": tid, "score": float(score)} for tid, score in self.people_model.matching_teachers(student)
-        ]
+        similar_students = [{"student_id": sid, "score": float(score)} for sid, score in similar]
+        matching_teachers = [{"teacher_id": tid, "score": float(score)} for tid, score in teachers]
 
-        result = {
+        return {
             "student_id": str(student.get("student_id", student_id)),
             "courses": course_payload,
             "sponsors": sponsor_payload,
             "similar_students": similar_students,
             "matching_teachers": matching_teachers,
         }
+
+    @staticmethod
+    def _empty_result(student_id: str) -> Dict[str, Any]:
+        return {"student_id": str(student_id), "courses": [], "sponsors": []}
+
+    def recommend_for_student(self, student_id: str, debug: bool = False) -> Dict[str, Any]:
+        """Recommendations for one student; `debug=True` adds per-stage timings under "debug"."""
+        snap = self._snapshot
+        timer = METRICS.stages("recommend")
+        # Students seen at training time are already in memory; only newcomers hit the connector
+        with timer.stage("profile"):
+            student = snap.student_index.get(str(student_id))
+            if student is None:
+                METRICS.incr("profile_lookups", source="connector")
+                student = self.db.get_student_profile(str(student_id))
+            else:
+                METRICS.incr("profile_lookups", source="snapshot")
+        if not student:
+            result = self._empty_result(student_id)
+        else:
+            courses = self._rank_courses(student, snap, timer)
+            with timer.stage("sponsors"):
+                sponsors = self._rank_sponsors(student, snap)
+            with timer.stage("people"):
+                similar = snap.people_model.similar_students(student)
+                teachers = snap.people_model.matching_teachers(student)
+            with timer.stage("payload"):
+                result = self._build_result(snap, student, student_id, courses, sponsors, similar, teachers)
+        METRICS.observe("request_seconds", timer.total(), op="recommend")
+        if debug:
+            result["debug"] = {"version": snap.version, "timings_ms": timer.as_ms(), **timer.values}
         return result
 
-    def batch_recommendations(self) -> None:
-        if self._students is None:
-            self._students = self.db.get_all_students() or []
-        for s in self._students:
-            sid = str(s.get("student_id"))
-            if not sid:
-                continue
-            rec = self.recommend_for_student(sid)
-            self.db.save_recommendations(sid, rec)
+    def recommend_many(self, student_ids: Iterable[str], chunk_size: int = BATCH_CHUNK_SIZE) -> List[Dict[str, Any]]:
+        """Score many students at once; results are aligned with `student_ids`.
+
+        Each chunk is transformed into one sparse query matrix and scored with a
+        single matmul per model, with per-row top-k via argpartition. Memory per
+        chunk is roughly chunk_size x catalog size floats.
+        """
+        snap = self._snapshot
+        ids = [str(sid) for sid in student_ids]
+        timer = METRICS.stages("recommend_many")
+
+        results: List[Dict[str, Any]] = []
+        chunk_size = max(1, int(chunk_size))
+        for start in range(0, len(ids), chunk_size):
+            chunk_ids = ids[start : start + chunk_size]
+            found: List[Tuple[int, Dict[str, Any]]] = []
+            chunk_results: List[Dict[str, Any]] = [self._empty_result(sid) for sid in chunk_ids]
+            with timer.stage("profile"):
+                for i, sid in enumerate(chunk_ids):
+                    student = snap.student_index.get(sid) or self.db.get_student_profile(sid)
+                    if student:
+                        found.append((i, student))
+            if found:
+                students = [s for _, s in found]
+                scored = self._score_chunk(snap, students, timer)
+                with timer.stage("payload"):
+                    for (i, student), (courses, sponsors, similar, teachers) in zip(found, scored):
+                        chunk_results[i] = self._build_result(
+                            snap, student, chunk_ids[i], courses, sponsors, similar, teachers
+                        )
+            results.extend(chunk_results)
+        METRICS.observe("request_seconds", timer.total(), op="recommend_many")
+        METRICS.incr("students_scored", len(ids))
+        return results
+
+    def _score_chunk(
+        self, snap: ServingSnapshot, students: List[Dict[str, Any]], timer: Optional[StageTimer] = None
+    ) -> List[Tuple[list, list, list, list]]:
+        k = TOP_K_COURSES * 3
+        timer = timer or METRICS.stages("recommend_many")
+        with timer.stage("transform"):
+            query = snap.content_model.transform_students(students)
+
+        ann_rows: List[List[str]] = []
+        with timer.stage("ann"):
+            if USE_ANN and snap.ann is not None and query is not None:
+                try:
+                    ann_rows = snap.ann.retrieve_many(query, top_k=ANN_CANDIDATES)
+                except Exception:
+                    swallowed("ann", "retrieve_many")
+                    ann_rows = []
+        if len(ann_rows) != len(students):
+            ann_rows = [[] for _ in students]
+
+        if ANN_GATED and any(ann_rows):
+            with timer.stage("gated"):
+                gated = [
+                    self._score_gated(snap, student, ann_rows[i], query[i])
+                    if ann_rows[i]
+                    else (
+                        snap.content_model.recommend(student, top_k=k),
+                        snap.collab_model.recommend(student, top_k=k),
+                        snap.semantic_model.recommend(student, top_k=k),
+                    )
+                    for i, student in enumerate(students)
+                ]
+            content_rows = [g[0] for g in gated]
+            collab_rows = [g[1] for g in gated]
+            semantic_rows = [g[2] for g in gated]
+        else:
+            with timer.stage("content"):
+                content_rows = snap.content_model.recommend_many(students, top_k=k, query_matrix=query)
+            with timer.stage("collab"):
+                collab_rows = snap.collab_model.recommend_many(students, top_k=k)
+            with timer.stage("semantic"):
+                semantic_rows = snap.semantic_model.recommend_many(students, top_k=k)
+        with timer.stage("sponsors"):
+            sponsor_rows = snap.sponsor_model.match_many(students, top_k=TOP_K_SPONSORS)
+        with timer.stage("people"):
+            similar_rows = snap.people_model.similar_students_many(students)
+            teacher_rows = snap.people_model.matching_teachers_many(students)
+
+        out = []
+        with timer.stage("fusion"):
+            for i in range(len(students)):
+                courses = self._fuse_courses(content_rows[i], collab_rows[i], semantic_rows[i], ann_rows[i], snap.course_tags)
+                out.append((courses, sponsor_rows[i], similar_rows[i], teacher_rows[i]))
+        return out
+
+    def batch_recommendations(
+        self, chunk_size: int = BATCH_CHUNK_SIZE, workers: int = BATCH_WORKERS, incremental: bool = False
+    ) -> Dict[str, Any]:
+        """Score students and save the results through the connector.
+
+        With `incremental=True` only students whose document changed, or who
+        were recommended a course that changed or disappeared, since the last
+        batch are recomputed (see BatchState); everyone is recomputed after a
+        full model refit, a sponsor change, or when no batch state exists yet.
+
+        Connectors with a `bulk_saver` (Mongo) get batched upserts written on a
+        background thread while the next chunk is scored. Returns the number of
+        students and how many were recomputed, plus the writer's stats
+        (batches, failures, latencies) under "writes" when bulk saving was used.
+        """
+        from .parallel import iter_recommendation_chunks
+
+        snap = self._snapshot
+        students = snap.students or self.db.get_all_students() or []
+        ids = [str(s.get("student_id")) for s in students]
+        state = self._batch_state(snap) if incremental else None
+        if state is not None:
+            dirty = state.dirty_students(snap.student_hashes, snap.course_hashes)
+            todo = [sid for sid in ids if sid in dirty]
+        else:
+            todo = ids
+
+        recommended: List[Tuple[str, List[str]]] = []
+        writes: Optional[Dict[str, Any]] = None
+        # Results are written from this process only; workers just score. The
+        # worker pool is forked here, before the bulk writer starts its thread.
+        chunks = iter_recommendation_chunks(self, todo, workers=workers, chunk_size=chunk_size)
+        make_saver = getattr(self.db, "bulk_saver", None)
+        try:
+            if make_saver is None:
+                for chunk in chunks:
+                    for sid, rec in chunk:
+                        self.db.save_recommendations(sid, rec)
+                    recommended.extend(self._recommended_ids(chunk))
+            else:
+                with make_saver() as saver:
+                    for chunk in chunks:
+                        saver.add_many(chunk)
+                        recommended.extend(self._recommended_ids(chunk))
+                writes = saver.stats()
+        finally:
+            chunks.close()
+
+        # Failed writes leave the old state in place, so those students stay dirty
+        if not (writes and writes["failed"]):
+            self._save_batch_state(snap, state, recommended)
+        return {"students": len(ids), "recomputed": len(todo), "full": state is None, "writes": writes}
+
+    @staticmethod
+    def _recommended_ids(chunk: List[Tuple[str, Dict[str, Any]]]) -> List[Tuple[str, List[str]]]:
+        return [(sid, [str(c.get("course_id")) for c in rec.get("courses", [])]) for sid, rec in chunk]
+
+    @property
+    def _batch_state_path(self) -> Path:
+        return self._store_dir / "batch_state.npz"
+
+    def _batch_state(self, snap: ServingSnapshot) -> Optional[BatchState]:
+        """Stored state if an incremental batch against `snap` is possible, else None (recompute everyone)."""
+        if snap.student_hashes is None or snap.course_hashes is None:
+            return None
+        state = BatchState.load(self._batch_state_path)
+        if state is None or state.fit_epoch != snap.fit_epoch or state.sponsors_hash != snap.sponsors_hash:
+            return None
+        return state
+
+    def _save_batch_state(
+        self, snap: ServingSnapshot, state: Optional[BatchState], recommended: List[Tuple[str, List[str]]]
+    ) -> None:
+        if snap.student_hashes is None or snap.course_hashes is None:
+            return
+        if state is None:
+            state = BatchState(fit_epoch=snap.fit_epoch, sponsors_hash=snap.sponsors_hash)
+        state.advance(recommended, snap.student_hashes, snap.course_hashes)
+        try:
+            state.save(self._batch_state_path)
+        except Exception:
+            # ignore persistence failures; the next incremental batch diffs against the older state
+            swallowed("batch_state", "save")
 
     # ---- persistence ----
-    def _load_models(self) -> bool:
+    _PERSISTED = {
+        "content": "content_model",
+        "collab": "collab_model",
+        "semantic": "semantic_model",
+        "people": "people_model",
+        "ann": "ann",
+    }
+
+    # Documents are diffed on the union of the fields their side's models read
+    _COURSE_FIELDS = ("course_id", "title", "description", "tags")
+    _STUDENT_FIELDS = ("student_id", "interests", "profile", "completed_courses", "clicked_courses")
+    # side -> (id field, components fitted on it, component whose staleness drift tracks)
+    _SIDES = {
+        "courses": ("course_id", ("content", "semantic", "ann"), "content"),
+        "students": ("student_id", ("collab", "people"), "people"),
+    }
+
+    @staticmethod
+    def _component_params(models: Dict[str, Any]) -> Dict[str, Any]:
+        """Settings that change what a component learns; stored state is only reused when they match."""
+        collab = models["collab_model"]
+        return {
+            "semantic": models["semantic_model"]._model_name,
+            "ann": [ANN_DIM, ANN_NLIST],
+            "collab": [collab.lsh_bands, collab.lsh_rows],
+        }
+
+    @classmethod
+    def _input_hashes(cls, content: List[Dict[str, Any]], students: List[Dict[str, Any]], params: Dict[str, Any]) -> Dict[str, str]:
+        """Hash of exactly what each persisted component is fitted on (data + relevant settings)."""
+        content_hash = hash_documents(content, cls._COURSE_FIELDS)
+        return {
+            "content": content_hash,
+            "semantic": combine_hash(content_hash, params["semantic"]),
+            "ann": combine_hash(content_hash, params["ann"]),
+            "collab": combine_hash(
+                hash_documents(students, ("student_id", "completed_courses", "clicked_courses")), params["collab"]
+            ),
+            "people": hash_documents(students, ("student_id", "interests", "profile")),
+        }
+
+    @classmethod
+    def _document_hashes(cls, content: List[Dict[str, Any]], students: List[Dict[str, Any]]) -> Dict[str, Optional[Dict[str, str]]]:
+        out: Dict[str, Optional[Dict[str, str]]] = {}
+        for side, docs, fields in (("courses", content, cls._COURSE_FIELDS), ("students", students, cls._STUDENT_FIELDS)):
+            try:
+                out[side] = document_hashes(docs, cls._SIDES[side][0], fields)
+            except ValueError:
+                # Missing/duplicate ids: this side cannot be diffed, so it is always refit
+                out[side] = None
+        return out
+
+    def _plan_deltas(
+        self,
+        content: List[Dict[str, Any]],
+        students: List[Dict[str, Any]],
+        doc_hashes: Dict[str, Optional[Dict[str, str]]],
+        params: Dict[str, Any],
+    ) -> Tuple[Dict[str, DocumentDelta], Optional[Dict[str, Any]]]:
+        """Per-component deltas against the stored inputs, for sides within the drift budget."""
+        previous = self._store.load("inputs")
+        if previous is None:
+            return {}, None
+        deltas: Dict[str, DocumentDelta] = {}
+        for side, docs in (("courses", content), ("students", students)):
+            key, names, _ = self._SIDES[side]
+            if doc_hashes[side] is None or f"{side}_ids" not in previous:
+                continue
+            delta = diff_documents(docs, key, doc_hashes[side], previous[f"{side}_ids"], previous[f"{side}_hashes"])
+            if float(previous.get(f"{side}_drift", 0.0)) + delta.drift > INCREMENTAL_MAX_DRIFT:
+                continue
+            for name in names:
+                if previous.get("params", {}).get(name) == params.get(name):
+                    deltas[name] = delta
+        return deltas, previous
+
+    def _inputs_state(
+        self,
+        doc_hashes: Dict[str, Optional[Dict[str, str]]],
+        params: Dict[str, Any],
+        status: Dict[str, str],
+        deltas: Dict[str, DocumentDelta],
+        previous: Optional[Dict[str, Any]],
+    ) -> Dict[str, Any]:
+        """Document ids/hashes behind this version plus the drift accumulated since each side's last full fit."""
+        import numpy as np
+
+        state: Dict[str, Any] = {"params": params}
+        for side, (_, names, owner) in self._SIDES.items():
+            hashes = doc_hashes[side]
+            if hashes is None:
+                continue
+            drift = float(previous.get(f"{side}_drift", 0.0)) if previous is not None else 0.0
+            updated = [name for name in names if status.get(name) == "updated"]
+            if status.get(owner) == "fit":
+                drift = 0.0
+            elif updated:
+                drift += deltas[updated[0]].drift
+            state[f"{side}_ids"] = np.asarray(list(hashes), dtype=str)
+            state[f"{side}_hashes"] = np.asarray(list(hashes.values()), dtype=str)
+            state[f"{side}_drift"] = drift
+        return state
+
+    @staticmethod
+    def _has_state(model: Any) -> bool:
         try:
-            from joblib import load
+            return model is not None and model.get_state() is not None
         except Exception:
+            return True
+
+    def _restore(self, name: str, model: Any, hashes: Dict[str, str], **kwargs: Any) -> bool:
+        if model is None:
             return False
-        content_path = self._store_dir / "content_model.joblib"
-        collab_path = self._store_dir / "collab_model.joblib"
-        if content_path.exists():
-            try:
-                state = load(content_path)
-                # restore content model internals
-                self.content_model._vectorizer = state.get("vectorizer")
-                self.content_model._content_matrix = state.get("content_matrix")
-                self.content_model._course_ids = state.get("course_ids", [])
-            except Exception:
-                pass
-        if collab_path.exists():
-            try:
-                state = load(collab_path)
-                self.collab_model._user_items = state.get("user_items", {})
-                self.collab_model._item_popularity = state.get("item_popularity", {})
-            except Exception:
-                pass
-        # consider loaded if both have essential state
-        vec_ok = getattr(self.content_model, "_vectorizer", None) is not None
-        mat_ok = getattr(self.content_model, "_content_matrix", None) is not None
-        ids_ok = bool(getattr(self.content_model, "_course_ids", []))
-        return bool(vec_ok and mat_ok and ids_ok)
-
-    def _save_models(self) -> None:
         try:
-            from joblib import dump
+            state = self._store.load(name, hashes[name], verify=MODEL_STORE_VERIFY)
+            if state is None:
+                return False
+            model.set_state(state, **kwargs)
+            return True
         except Exception:
+            swallowed(name, "restore")
+            return False
+
+    def _obtain(
+        self,
+        name: str,
+        model: Any,
+        hashes: Dict[str, str],
+        delta: Optional[DocumentDelta],
+        fit: Callable[[], Any],
+        apply: Optional[Callable[[Any], None]] = None,
+        **kwargs: Any,
+    ) -> str:
+        """Reload `name` if its inputs are unchanged, else patch the stored version with `delta`, else `fit()`."""
+        if self._restore(name, model, hashes, **kwargs):
+            return "reused"
+        if delta is not None:
+            try:
+                state = self._store.load(name, verify=MODEL_STORE_VERIFY)
+                if state is not None:
+                    model.set_state(state, **kwargs)
+                    if apply is not None:
+                        apply(model)
+                    else:
+                        model.update(delta.changed, delta.removed)
+                    return "updated"
+            except Exception:
+                # fall back to a full fit
+                swallowed(name, "update")
+        fit()
+        return "fit"
+
+    def _persist(
+        self, models: Dict[str, Any], status: Dict[str, str], hashes: Dict[str, str], inputs: Dict[str, Any]
+    ) -> None:
+        components: Dict[str, Any] = {}
+        for name, key in self._PERSISTED.items():
+            model = models.get(key)
+            if model is None:
+                continue
+            components[name] = ModelStore.KEEP if status.get(name) == "reused" else model.get_state()
+        # Nothing was refitted (or a refit produced no state): keep the current version
+        if all(state is ModelStore.KEEP or state is None for state in components.values()):
             return
-        content_state = {
-            "vectorizer": getattr(self.content_model, "_vectorizer", None),
-            "content_matrix": getattr(self.content_model, "_content_matrix", None),
-            "course_ids": getattr(self.content_model, "_course_ids", []),
-        }
-        collab_state = {
-            "user_items": getattr(self.collab_model, "_user_items", {}),
-            "item_popularity": getattr(self.collab_model, "_item_popularity", {}),
-        }
+        components["inputs"] = inputs
         try:
-            dump(content_state, self._store_dir / "content_model.joblib")
-            dump(collab_state, self._store_dir / "collab_model.joblib")
+            self._store.save(components, hashes)
         except Exception:
             # ignore persistence failures
-            pass
+            swallowed("model_store", "save")
@@ -0,0 +1,197 @@
+from __future__ import annotations
+
+import copy
+import math
+import random
+import threading
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+from .config import RETRAIN_HISTORY, RETRAIN_SMOKE_SAMPLE
+
+
+class Retrainer:
+    """Double-buffered engine: retrains a copy, validates it, then promotes it.
+
+    `engine` is the one serving. `retrain()` trains a shallow copy of it (same
+    connector and model store, starting from its snapshot, so incremental
+    training and no-op detection behave as on the live engine), scores
+    `sample_size` random students with the copy as a smoke test, and only then
+    makes it the serving engine with one reference assignment. The engine it
+    replaced is kept for `rollback()`. A copy that raises or fails the smoke
+    test is dropped and the serving engine is left as it was.
+
+    `start()` runs the same thing on a background thread, one retrain at a
+    time. Every run produces a report (status, component statuses, version and
+    seconds per phase); the last `history` reports are kept in `reports`.
+    """
+
+    def __init__(
+        self,
+        engine: Any,
+        sample_size: int = RETRAIN_SMOKE_SAMPLE,
+        history: int = RETRAIN_HISTORY,
+        seed: Optional[int] = None,
+    ) -> None:
+        self._engine = engine
+        self._previous: Optional[Any] = None
+        self.sample_size = max(1, int(sample_size))
+        self._history = max(1, int(history))
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self.reports: List[Dict[str, Any]] = []
+
+    @property
+    def engine(self) -> Any:
+        return self._engine
+
+    @property
+    def previous(self) -> Optional[Any]:
+        return self._previous
+
+    @property
+    def running(self) -> bool:
+        thread = self._thread
+        return thread is not None and thread.is_alive()
+
+    def retrain(
+        self, incremental: bool = True, after_promote: Optional[Callable[[Any], Any]] = None
+    ) -> Dict[str, Any]:
+        """Train, validate and promote a new engine; `after_promote(engine)` runs once it serves.
+
+        Report status is "promoted", "unchanged" (incremental run found no data
+        changes, nothing promoted), "rejected" (smoke test failed) or "failed"
+        (training raised). On "unchanged" runs `after_promote` still runs, on
+        the serving engine, so work an earlier run left unfinished (e.g. a batch
+        whose writes failed) is retried; it should skip what is already done.
+        """
+        report: Dict[str, Any] = {
+            "started_at": datetime.utcnow().isoformat(),
+            "incremental": incremental,
+            "status": None,
+            "error": None,
+            "components": {},
+            "version": None,
+            "phases": {},
+        }
+        phases = report["phases"]
+        current = self._engine
+        candidate = copy.copy(current)
+
+        start = time.perf_counter()
+        try:
+            report["components"] = candidate.train_models(incremental=incremental)
+        except Exception as e:
+            report.update(status="failed", error=f"{type(e).__name__}: {e}")
+        phases["train"] = round(time.perf_counter() - start, 6)
+        if report["status"] == "failed":
+            return self._finish(report)
+        if candidate.snapshot is current.snapshot:
+            report.update(status="unchanged", version=current.snapshot.version)
+            self._after_promote(report, current, after_promote)
+            return self._finish(report)
+
+        start = time.perf_counter()
+        try:
+            error = self._validate(candidate)
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+        phases["validate"] = round(time.perf_counter() - start, 6)
+        if error is not None:
+            report.update(status="rejected", error=error)
+            return self._finish(report)
+
+        start = time.perf_counter()
+        with self._lock:
+            self._previous, self._engine = current, candidate
+        phases["promote"] = round(time.perf_counter() - start, 6)
+        report.update(status="promoted", version=candidate.snapshot.version)
+        self._after_promote(report, candidate, after_promote)
+        return self._finish(report)
+
+    @staticmethod
+    def _after_promote(report: Dict[str, Any], engine: Any, after_promote: Optional[Callable[[Any], Any]]) -> None:
+        if after_promote is None:
+            return
+        start = time.perf_counter()
+        try:
+            report["after_promote"] = after_promote(engine)
+        except Exception as e:
+            report["error"] = f"after_promote: {type(e).__name__}: {e}"
+        report["phases"]["after_promote"] = round(time.perf_counter() - start, 6)
+
+    def start(
+        self,
+        incremental: bool = True,
+        after_promote: Optional[Callable[[Any], Any]] = None,
+        on_report: Optional[Callable[[Dict[str, Any]], Any]] = None,
+    ) -> bool:
+        """Run `retrain` on a background thread, then `on_report(report)`; False if one is still running."""
+
+        def run() -> None:
+            report = self.retrain(incremental, after_promote)
+            if on_report is not None:
+                on_report(report)
+
+        with self._lock:
+            if self.running:
+                return False
+            self._thread = threading.Thread(target=run, name="retrainer", daemon=True)
+            self._thread.start()
+        return True
+
+    def wait(self, timeout: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """Wait for a background retrain and return the latest report."""
+        thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+        return self.last_report
+
+    def rollback(self) -> bool:
+        """Serve the previous engine again (the current one becomes `previous`); False if there is none.
+
+        The restored engine's snapshot is reissued under a version above both,
+        so serving versions only ever increase (result caches rely on it, and
+        later retrains of it cannot reuse a version the other engine served).
+        """
+        with self._lock:
+            if self._previous is None:
+                return False
+            current, restored = self._engine, self._previous
+            restored.reissue(max(current.snapshot.version, restored.snapshot.version) + 1)
+            self._previous, self._engine = current, restored
+        return True
+
+    @property
+    def last_report(self) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            return self.reports[-1] if self.reports else None
+
+    # ---- internals ----
+    def _finish(self, report: Dict[str, Any]) -> Dict[str, Any]:
+        report["seconds"] = round(sum(report["phases"].values()), 6)
+        with self._lock:
+            self.reports.append(report)
+            del self.reports[: -self._history]
+        return report
+
+    def _validate(self, engine: Any) -> Optional[str]:
+        """Smoke-score sampled students; a reason string if the engine should not serve."""
+        snap = engine.snapshot
+        ids = [str(s.get("student_id")) for s in snap.students]
+        if not ids:
+            return None
+        sample = self._rng.sample(ids, min(self.sample_size, len(ids)))
+        results = engine.recommend_many(sample)
+        if len(results) != len(sample):
+            return f"scored {len(results)} of {len(sample)} sampled students"
+        for res in results:
+            for item in res.get("courses", []) + res.get("sponsors", []):
+                score = item.get("score")
+                if not isinstance(score, (int, float)) or not math.isfinite(score):
+                    return f"invalid score {score!r} for student {res.get('student_id')}"
+        if snap.content and not any(res.get("courses") for res in results):
+            return f"no course recommendations for {len(sample)} sampled students"
+        return None
@@ -0,0 +1,254 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from .adapter import RecommenderService
+from .metrics import METRICS
+from .config import SERVER_HOST, SERVER_PORT, SERVER_BATCH_WINDOW_MS, SERVER_MAX_BATCH, SERVER_WORKERS
+
+# Route labels for request metrics; anything else is counted as "other"
+_ROUTES = ("recommendations", "health", "ready", "metrics")
+
+
+class MicroBatcher:
+    """Coalesces single-id requests into one `score_many(ids)` call.
+
+    The first id to arrive opens a window of `window_ms`; every id submitted
+    before it closes (or until `max_batch` ids are waiting) is scored in the
+    same call, on `executor`, so the event loop never runs model code. Each
+    caller gets its own result; an exception fails the whole batch.
+    """
+
+    def __init__(
+        self,
+        score_many: Callable[[List[str]], List[Dict[str, Any]]],
+        executor: ThreadPoolExecutor,
+        window_ms: float = SERVER_BATCH_WINDOW_MS,
+        max_batch: int = SERVER_MAX_BATCH,
+    ) -> None:
+        self._score_many = score_many
+        self._executor = executor
+        self.window = max(0.0, float(window_ms)) / 1000.0
+        self.max_batch = max(1, int(max_batch))
+        self._pending: List[Tuple[str, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self.batches = 0
+        self.requests = 0
+
+    async def submit(self, student_id: str) -> Dict[str, Any]:
+        loop = asyncio.get_running_loop()
+        fut = loop.create_future()
+        self._pending.append((student_id, fut))
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush)
+        return await fut
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            asyncio.get_running_loop().create_task(self._run(batch))
+
+    async def _run(self, batch: List[Tuple[str, asyncio.Future]]) -> None:
+        ids = list(dict.fromkeys(sid for sid, _ in batch))
+        self.batches += 1
+        self.requests += len(batch)
+        METRICS.observe("microbatch_size", len(ids))
+        try:
+            results = await asyncio.get_running_loop().run_in_executor(self._executor, self._score_many, ids)
+            by_id = dict(zip(ids, results))
+        except Exception as e:
+            for _, fut in batch:
+                if not fut.done():
+                    fut.set_exception(e)
+            return
+        for sid, fut in batch:
+            if not fut.done():
+                fut.set_result(by_id[sid])
+
+
+class RecommendationServer:
+    """Minimal asyncio HTTP/1.1 front end for a RecommenderService.
+
+    Routes (GET only, JSON responses unless noted):
+      - /recommendations/<student_id> or /recommendations?student_id=<id>;
+        add `debug=1` for a freshly scored result with per-stage timings
+      - /health: the process is up
+      - /ready: the service has data to serve (503 otherwise)
+      - /metrics: stage timers and counters as Prometheus text
+        (`?format=json` for JSON)
+
+    Cached results are answered on the event loop; misses go through a
+    MicroBatcher, so concurrent requests share one `recommend_many` call on
+    the worker threads.
+    """
+
+    def __init__(
+        self,
+        service: RecommenderService,
+        *,
+        batch_window_ms: float = SERVER_BATCH_WINDOW_MS,
+        max_batch: int = SERVER_MAX_BATCH,
+        workers: int = SERVER_WORKERS,
+    ) -> None:
+        self.service = service
+        self._executor = ThreadPoolExecutor(max_workers=max(1, int(workers)), thread_name_prefix="rec-score")
+        self.batcher = MicroBatcher(
+            lambda ids: service.get_recommendations_many(ids, check_cache=False),
+            self._executor,
+            batch_window_ms,
+            max_batch,
+        )
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    async def start(self, host: str = SERVER_HOST, port: int = SERVER_PORT) -> asyncio.AbstractServer:
+        # Train (or open the precomputed store) before accepting connections
+        await asyncio.get_running_loop().run_in_executor(self._executor, self.service.warm_up)
+        self._server = await asyncio.start_server(self._handle, host, port)
+        return self._server
+
+    async def serve_forever(self, host: str = SERVER_HOST, port: int = SERVER_PORT) -> None:
+        server = await self.start(host, port)
+        async with server:
+            await server.serve_forever()
+
+    async def close(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        self._executor.shutdown(wait=False)
+
+    # ---- routing ----
+    async def recommendations(self, student_id: str) -> Dict[str, Any]:
+        cached = self.service.get_cached(student_id)
+        if cached is not None:
+            return cached
+        return await self.batcher.submit(student_id)
+
+    async def _route(self, method: str, target: str) -> Tuple[int, Any]:
+        if method not in ("GET", "HEAD"):
+            return HTTPStatus.METHOD_NOT_ALLOWED, {"error": "method not allowed"}
+        url = urlsplit(target)
+        path = url.path.rstrip("/") or "/"
+        if path == "/health":
+            return HTTPStatus.OK, {"status": "ok"}
+        if path == "/ready":
+            ready = await asyncio.get_running_loop().run_in_executor(self._executor, self.service.is_ready)
+            return (HTTPStatus.OK if ready else HTTPStatus.SERVICE_UNAVAILABLE), {"ready": ready}
+        query = parse_qs(url.query)
+        if path == "/metrics":
+            fmt = "json" if (query.get("format") or [""])[0] == "json" else "prometheus"
+            return HTTPStatus.OK, self.service.metrics(fmt)
+        student_id = None
+        if path == "/recommendations":
+            student_id = (query.get("student_id") or [None])[0]
+        elif path.startswith("/recommendations/"):
+            student_id = unquote(path[len("/recommendations/") :])
+        else:
+            return HTTPStatus.NOT_FOUND, {"error": "not found"}
+        if not student_id:
+            return HTTPStatus.BAD_REQUEST, {"error": "student_id is required"}
+        try:
+            if (query.get("debug") or ["0"])[0] not in ("0", "false", ""):
+                loop = asyncio.get_running_loop()
+                return HTTPStatus.OK, await loop.run_in_executor(
+                    self._executor, lambda: self.service.get_recommendations(student_id, debug=True)
+                )
+            return HTTPStatus.OK, await self.recommendations(student_id)
+        except Exception as e:
+            return HTTPStatus.INTERNAL_SERVER_ERROR, {"error": f"{type(e).__name__}: {e}"}
+
+    # ---- HTTP ----
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                parts = line.decode("latin-1").split()
+                if len(parts) != 3:
+                    await self._respond(writer, HTTPStatus.BAD_REQUEST, {"error": "bad request"}, keep_alive=False)
+                    break
+                method, target, version = parts
+                headers: Dict[str, str] = {}
+                while True:
+                    header = await reader.readline()
+                    if header in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = header.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                length = int(headers.get("content-length") or 0)
+                if length:
+                    await reader.readexactly(length)
+                connection = headers.get("connection", "").lower()
+                keep_alive = connection == "keep-alive" if version == "HTTP/1.0" else connection != "close"
+                start = time.perf_counter()
+                status, body = await self._route(method, target)
+                route = urlsplit(target).path.strip("/").split("/")[0]
+                route = route if route in _ROUTES else "other"
+                METRICS.incr("http_requests", route=route, status=int(status))
+                METRICS.observe("http_request_seconds", time.perf_counter() - start, route=route)
+                await self._respond(writer, status, body, keep_alive, head=method == "HEAD")
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def _respond(
+        writer: asyncio.StreamWriter, status: int, body: Any, keep_alive: bool, head: bool = False
+    ) -> None:
+        if isinstance(body, str):
+            payload, content_type = body.encode("utf-8"), "text/plain; version=0.0.4; charset=utf-8"
+        else:
+            payload = json.dumps(body, ensure_ascii=False, default=str).encode("utf-8")
+            content_type = "application/json; charset=utf-8"
+        status = HTTPStatus(status)
+        head_lines = (
+            f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"Content-Length: {len(payload)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+        )
+        writer.write(head_lines.encode("latin-1") + (b"" if head else payload))
+        await writer.drain()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="HTTP server for real-time recommendations")
+    parser.add_argument("--host", default=SERVER_HOST)
+    parser.add_argument("--port", type=int, default=SERVER_PORT)
+    parser.add_argument("--mode", default="auto", help="RecommenderService mode (auto, precomputed, offline, mongo)")
+    parser.add_argument("--batch-window-ms", type=float, default=SERVER_BATCH_WINDOW_MS)
+    parser.add_argument("--max-batch", type=int, default=SERVER_MAX_BATCH)
+    parser.add_argument("--workers", type=int, default=SERVER_WORKERS, help="Scoring threads")
+    args = parser.parse_args()
+
+    server = RecommendationServer(
+        RecommenderService(mode=args.mode),
+        batch_window_ms=args.batch_window_ms,
+        max_batch=args.max_batch,
+        workers=args.workers,
+    )
+    print(f"Serving recommendations on http://{args.host}:{args.port}")
+    try:
+        asyncio.run(server.serve_forever(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
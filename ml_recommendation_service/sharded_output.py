@@ -0,0 +1,541 @@
+from __future__ import annotations
+
+import json
+import mmap
+import os
+import shutil
+import struct
+import threading
+import zlib
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from .cache import ResultCache
+
+FORMAT_VERSION = 1
+_MAGIC = b"RSG1"
+# magic, codec, records, ids block bytes, raw payload bytes, stored payload bytes
+_HEADER = struct.Struct("<4sBIIII")
+_CODECS = {"none": 0, "gzip": 1, "zstd": 2}
+# result list -> (catalog table, id key of its entries)
+_LISTS = (
+    ("courses", "courses", "course_id"),
+    ("sponsors", "sponsors", "sponsor_id"),
+    ("similar_students", "students", "student_id"),
+    ("matching_teachers", "teachers", "teacher_id"),
+)
+_LIST_KEYS = {key for key, _, _ in _LISTS}
+# Scores are served rounded to this many decimals by both precomputed readers:
+# float32 keeps ~7 significant digits, so rounding on write and on read gives
+# back exactly round(score, SCORE_DECIMALS) whichever format the records came from
+SCORE_DECIMALS = 6
+# times a reader re-maps a store that a writer keeps changing under it before serving the last good state
+_OPEN_ATTEMPTS = 3
+
+
+def shard_of(student_id: str, n_shards: int) -> int:
+    return zlib.crc32(student_id.encode("utf-8")) % n_shards
+
+
+def _zstd():
+    try:
+        import zstandard
+
+        return zstandard
+    except Exception:
+        return None
+
+
+def _compress(raw: bytes, codec: int) -> bytes:
+    if codec == _CODECS["gzip"]:
+        return zlib.compress(raw, 6)
+    if codec == _CODECS["zstd"]:
+        return _zstd().ZstdCompressor(level=3).compress(raw)
+    return raw
+
+
+def _decompress(data: bytes, codec: int, raw_len: int) -> bytes:
+    if codec == _CODECS["gzip"]:
+        return zlib.decompress(data)
+    if codec == _CODECS["zstd"]:
+        zstd = _zstd()
+        if zstd is None:
+            raise RuntimeError("segment is zstd-compressed but the zstandard package is not installed")
+        return zstd.ZstdDecompressor().decompress(data, max_output_size=raw_len)
+    return bytes(data)
+
+
+class _Table:
+    """Catalog table: entity id <-> int, plus the entity's display fields (title, tags, name...)."""
+
+    def __init__(self, ids: List[str], attrs: List[Dict[str, Any]]) -> None:
+        self.ids = ids
+        self.attrs = attrs + [{}] * (len(ids) - len(attrs))
+        self._index = {eid: i for i, eid in enumerate(ids)}
+
+    def add(self, eid: str, attrs: Dict[str, Any]) -> int:
+        i = self._index.get(eid)
+        if i is None:
+            i = self._index[eid] = len(self.ids)
+            self.ids.append(eid)
+            self.attrs.append(attrs)
+        elif attrs:
+            # latest metadata wins
+            self.attrs[i] = attrs
+        return i
+
+
+def _save_tables(root: Path, tables: Dict[str, _Table]) -> None:
+    d = root / "catalog"
+    d.mkdir(exist_ok=True)
+    for name, table in tables.items():
+        encoded = [eid.encode("utf-8") for eid in table.ids]
+        width = max((len(e) for e in encoded), default=1) or 1
+        tmp = d / f"{name}.ids.tmp.npy"
+        np.save(tmp, np.array(encoded, dtype=f"S{width}"))
+        os.replace(tmp, d / f"{name}.ids.npy")
+        # only tables with display fields need an attrs file
+        attrs = table.attrs if any(table.attrs) else []
+        tmp = d / f"{name}.attrs.tmp.json"
+        tmp.write_text(json.dumps(attrs, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp, d / f"{name}.attrs.json")
+
+
+def _load_table_arrays(root: Path, name: str, mmap_mode: Optional[str] = "r") -> Tuple[np.ndarray, List[Dict[str, Any]]]:
+    d = root / "catalog"
+    try:
+        ids = np.load(d / f"{name}.ids.npy", mmap_mode=mmap_mode)
+        with open(d / f"{name}.attrs.json", "r", encoding="utf-8") as f:
+            attrs = json.load(f)
+    except (OSError, ValueError):
+        return np.empty(0, dtype="S1"), []
+    return ids, attrs
+
+
+def _shard_path(root: Path, k: int) -> Path:
+    return root / f"shard-{k:03d}.seg"
+
+
+def _scan_segments(path: Path) -> Iterator[Tuple[int, List[str]]]:
+    """(offset, student ids) of every complete segment in a shard file; a torn tail is ignored."""
+    try:
+        size = path.stat().st_size
+        f = open(path, "rb")
+    except OSError:
+        return
+    with f:
+        offset = 0
+        while offset + _HEADER.size <= size:
+            f.seek(offset)
+            magic, _, n, ids_len, _, payload_len = _HEADER.unpack(f.read(_HEADER.size))
+            end = offset + _HEADER.size + ids_len + 4 * (n + 1) + payload_len
+            if magic != _MAGIC or end > size:
+                break
+            yield offset, json.loads(f.read(ids_len))
+            offset = end
+
+
+def _read_segment(buf, offset: int) -> Tuple[np.ndarray, bytes]:
+    """(record offsets, raw payload) of the segment at `offset` in a shard buffer."""
+    _, codec, n, ids_len, raw_len, payload_len = _HEADER.unpack_from(buf, offset)
+    pos = offset + _HEADER.size + ids_len
+    bounds = np.frombuffer(buf, dtype="<u4", count=n + 1, offset=pos).copy()
+    pos += 4 * (n + 1)
+    raw = _decompress(buf[pos : pos + payload_len], codec, raw_len)
+    return bounds, raw
+
+
+def _write_segment(f, ids: List[str], records: List[bytes], codec: int) -> None:
+    bounds = np.zeros(len(records) + 1, dtype="<u4")
+    np.cumsum([len(r) for r in records], out=bounds[1:])
+    raw = b"".join(records)
+    payload = _compress(raw, codec)
+    ids_block = json.dumps(ids, ensure_ascii=False).encode("utf-8")
+    f.write(_HEADER.pack(_MAGIC, codec, len(records), len(ids_block), len(raw), len(payload)))
+    f.write(ids_block)
+    f.write(bounds.tobytes())
+    f.write(payload)
+
+
+def _build_index(root: Path, n_shards: int) -> Dict[int, Tuple[int, int]]:
+    """Write the student -> (shard, segment, slot) index; returns (live, total) records per shard."""
+    latest: Dict[str, Tuple[int, int, int]] = {}
+    counts: Dict[int, Tuple[int, int]] = {}
+    sizes = []
+    for k in range(n_shards):
+        path = _shard_path(root, k)
+        total = 0
+        before = len(latest)
+        for offset, ids in _scan_segments(path):
+            total += len(ids)
+            for slot, sid in enumerate(ids):
+                latest[sid] = (k, offset, slot)
+        counts[k] = (len(latest) - before, total)
+        sizes.append(path.stat().st_size if path.exists() else 0)
+
+    order = sorted(latest)
+    encoded = [sid.encode("utf-8") for sid in order]
+    width = max((len(e) for e in encoded), default=1) or 1
+    arrays = {
+        "ids": np.array(encoded, dtype=f"S{width}"),
+        "shard": np.array([latest[s][0] for s in order], dtype=np.uint16),
+        "segment": np.array([latest[s][1] for s in order], dtype=np.int64),
+        "slot": np.array([latest[s][2] for s in order], dtype=np.uint32),
+    }
+    d = root / "index"
+    d.mkdir(exist_ok=True)
+    # readers rebuild a stale index too, possibly while a writer does: keep their temp files apart
+    tag = f"{os.getpid()}-{threading.get_ident()}"
+    for name, arr in arrays.items():
+        tmp = d / f"{name}.{tag}.tmp.npy"
+        np.save(tmp, arr)
+        os.replace(tmp, d / f"{name}.npy")
+    tmp = d / f"meta.{tag}.tmp.json"
+    tmp.write_text(json.dumps({"version": FORMAT_VERSION, "shard_sizes": sizes, "count": len(order)}), encoding="utf-8")
+    os.replace(tmp, d / "meta.json")
+    return counts
+
+
+def _compact_shard(root: Path, k: int, codec: int, segment_records: int) -> None:
+    """Rewrite a shard keeping only the latest record of each student."""
+    path = _shard_path(root, k)
+    latest: Dict[str, bytes] = {}
+    with open(path, "rb") as f:
+        buf = f.read()
+    for offset, ids in _scan_segments(path):
+        bounds, raw = _read_segment(buf, offset)
+        for slot, sid in enumerate(ids):
+            latest.pop(sid, None)  # keep append order of the surviving record
+            latest[sid] = raw[bounds[slot] : bounds[slot + 1]]
+    tmp = path.with_suffix(".tmp")
+    items = list(latest.items())
+    with open(tmp, "wb") as f:
+        for i in range(0, len(items), segment_records):
+            part = items[i : i + segment_records]
+            _write_segment(f, [sid for sid, _ in part], [rec for _, rec in part], codec)
+    os.replace(tmp, path)
+
+
+class ShardedWriter:
+    """Write recommendation records into a compact, sharded, appendable store directory.
+
+    Layout::
+
+        <root>/meta.json               format version, shard count, codec
+        <root>/catalog/<table>.*       course/sponsor/student/teacher ids + display fields, stored once
+        <root>/shard-NNN.seg           segments of records, students assigned by crc32(student_id)
+        <root>/index/*.npy             sorted student ids -> (shard, segment offset, slot)
+
+    A record stores int32 catalog ids and float32 scores (rounded to
+    SCORE_DECIMALS, as PrecomputedJsonl serves them) per list; titles,
+    tags and names live only in the catalog and are filled back in on read.
+    Each `segment_records` records of a shard form one segment, compressed as a
+    unit ("gzip" = zlib, "zstd" if the zstandard package is installed, falling
+    back to gzip, or "none"). With `append=True` new records are added to an
+    existing store and win over older ones; shards whose share of superseded
+    records exceeds `compact_threshold` are rewritten on `close`.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        shards: int = 16,
+        compression: str = "gzip",
+        segment_records: int = 64,
+        append: bool = False,
+        compact_threshold: float = 0.5,
+    ) -> None:
+        self.root = Path(path)
+        if compression not in _CODECS:
+            raise ValueError(f"compression must be one of {sorted(_CODECS)}, got {compression!r}")
+        if compression == "zstd" and _zstd() is None:
+            compression = "gzip"
+        self.codec = _CODECS[compression]
+        self.segment_records = segment_records
+        self.compact_threshold = compact_threshold
+
+        meta = self._read_meta()
+        if self.root.exists() and not append:
+            if meta is None and any(self.root.iterdir()):
+                raise ValueError(f"{self.root} exists and is not a recommendation store")
+            shutil.rmtree(self.root)
+            meta = None
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.shards = int(meta["shards"]) if meta else shards
+
+        self._tables: Dict[str, _Table] = {}
+        for _, name, _ in _LISTS:
+            ids, attrs = _load_table_arrays(self.root, name, mmap_mode=None)
+            self._tables[name] = _Table([i.decode("utf-8") for i in ids.tolist()], list(attrs))
+        self._pending: Dict[int, List[Tuple[str, bytes]]] = {k: [] for k in range(self.shards)}
+        self._files: Dict[int, Any] = {}
+        self.written = 0
+
+    def __enter__(self) -> "ShardedWriter":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+    def _read_meta(self) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self.root / "meta.json", "r", encoding="utf-8") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return meta if meta.get("format_version") == FORMAT_VERSION else None
+
+    def write(self, rec: Dict[str, Any]) -> None:
+        sid = str(rec.get("student_id"))
+        k = shard_of(sid, self.shards)
+        self._pending[k].append((sid, self._encode(rec)))
+        self.written += 1
+        if len(self._pending[k]) >= self.segment_records:
+            self._flush(k)
+
+    def write_many(self, recs: Iterable[Dict[str, Any]]) -> None:
+        for rec in recs:
+            self.write(rec)
+
+    def _encode(self, rec: Dict[str, Any]) -> bytes:
+        parts: List[bytes] = []
+        for key, table, id_key in _LISTS:
+            entries = rec.get(key)
+            if entries is None:
+                parts.append(struct.pack("<i", -1))
+                continue
+            tbl = self._tables[table]
+            ids = np.array(
+                [tbl.add(str(e.get(id_key)), {k: v for k, v in e.items() if k not in (id_key, "score")}) for e in entries],
+                dtype="<i4",
+            )
+            scores = np.array([round(float(e.get("score") or 0.0), SCORE_DECIMALS) for e in entries], dtype="<f4")
+            parts += [struct.pack("<i", len(entries)), ids.tobytes(), scores.tobytes()]
+        extra = {k: v for k, v in rec.items() if k != "student_id" and k not in _LIST_KEYS}
+        blob = json.dumps(extra, ensure_ascii=False, default=str).encode("utf-8") if extra else b""
+        parts += [struct.pack("<I", len(blob)), blob]
+        return b"".join(parts)
+
+    def _flush(self, k: int) -> None:
+        pending = self._pending[k]
+        if not pending:
+            return
+        f = self._files.get(k)
+        if f is None:
+            f = self._files[k] = open(_shard_path(self.root, k), "ab")
+        _write_segment(f, [sid for sid, _ in pending], [rec for _, rec in pending], self.codec)
+        self._pending[k] = []
+
+    def _persist(self) -> Dict[int, Tuple[int, int]]:
+        for k in range(self.shards):
+            self._flush(k)
+        for f in self._files.values():
+            f.flush()
+            os.fsync(f.fileno())
+        _save_tables(self.root, self._tables)
+        return _build_index(self.root, self.shards)
+
+    def _write_meta(self) -> None:
+        # meta last: readers reload when it changes
+        meta = {"format_version": FORMAT_VERSION, "shards": self.shards, "codec": self.codec}
+        tmp = self.root / "meta.tmp.json"
+        tmp.write_text(json.dumps(meta), encoding="utf-8")
+        os.replace(tmp, self.root / "meta.json")
+
+    def checkpoint(self) -> List[int]:
+        """Make everything written so far durable and readable; returns shard sizes for `rollback`."""
+        self._persist()
+        self._write_meta()
+        return [p.stat().st_size if p.exists() else 0 for p in (_shard_path(self.root, k) for k in range(self.shards))]
+
+    def close(self) -> None:
+        counts = self._persist()
+        for f in self._files.values():
+            f.close()
+        self._files = {}
+        stale = [k for k, (live, total) in counts.items() if total and 1 - live / total > self.compact_threshold]
+        for k in stale:
+            _compact_shard(self.root, k, self.codec, self.segment_records)
+        if stale:
+            _build_index(self.root, self.shards)
+        self._write_meta()
+
+    @staticmethod
+    def rollback(path: str, shard_sizes: List[int]) -> None:
+        """Drop everything appended after the `checkpoint` that returned `shard_sizes` (e.g. after a crash)."""
+        root = Path(path)
+        for k, size in enumerate(shard_sizes):
+            shard = _shard_path(root, k)
+            if shard.exists() and shard.stat().st_size > size:
+                os.truncate(shard, size)
+        _build_index(root, len(shard_sizes))
+
+
+@dataclass(frozen=True)
+class _ShardState:
+    """One opened version of a store: shard mappings plus the index validated against them."""
+
+    generation: int
+    stamp: Optional[Tuple[int, int]] = None
+    buffers: Tuple[Any, ...] = ()
+    ids: np.ndarray = field(default_factory=lambda: np.empty(0, dtype="S1"))
+    shard: np.ndarray = field(default_factory=lambda: np.empty(0, dtype=np.int64))
+    segment: np.ndarray = field(default_factory=lambda: np.empty(0, dtype=np.int64))
+    slot: np.ndarray = field(default_factory=lambda: np.empty(0, dtype=np.int64))
+    tables: Dict[str, Tuple[np.ndarray, List[Dict[str, Any]]]] = field(default_factory=dict)
+
+    def find(self, sid: str) -> Optional[int]:
+        key = sid.encode("utf-8")
+        if not len(self.ids) or len(key) > self.ids.dtype.itemsize:
+            return None
+        row = int(np.searchsorted(self.ids, key))
+        if row < len(self.ids) and self.ids[row] == key:
+            return row
+        return None
+
+
+class ShardedRecommendations:
+    """Read side of a ShardedWriter store, with the same interface as PrecomputedJsonl.
+
+    Index, catalog ids and shard files are memory-mapped; a lookup decompresses
+    one segment (recent segments and records are cached) and rebuilds the
+    record's dicts from the catalog. Picks up a rewritten store on the next
+    lookup. Thread-safe: every shard is mapped when the store is opened and
+    the index is only used if it was built for exactly those mappings; both
+    are published together as one state object, and replaced mappings are
+    unmapped once the last lookup using them lets go.
+    """
+
+    def __init__(self, path: str, hot_records: int = 1024, hot_segments: int = 8) -> None:
+        self.root = Path(path)
+        self._hot = ResultCache(max_entries=hot_records)
+        self._segments = ResultCache(max_entries=hot_segments)
+        self._lock = threading.Lock()
+        self._state = self._open(1) or _ShardState(1)
+
+    # ---- public ----
+    def get(self, student_id: str) -> Optional[Dict[str, Any]]:
+        state = self._current()
+        sid = str(student_id)
+        rec = self._hot.get(sid, state.generation)
+        if rec is not None:
+            return rec
+        row = state.find(sid)
+        if row is None:
+            return None
+        k, offset, slot = int(state.shard[row]), int(state.segment[row]), int(state.slot[row])
+        seg = self._segments.get((k, offset), state.generation)
+        if seg is None:
+            seg = _read_segment(state.buffers[k], offset)
+            self._segments.put((k, offset), seg, state.generation)
+        bounds, raw = seg
+        rec = self._decode(state, sid, memoryview(raw)[bounds[slot] : bounds[slot + 1]])
+        self._hot.put(sid, rec, state.generation)
+        return rec
+
+    def student_ids(self) -> List[str]:
+        return [i.decode("utf-8") for i in self._current().ids.tolist()]
+
+    def __len__(self) -> int:
+        return len(self._state.ids)
+
+    def close(self) -> None:
+        # drop the mappings rather than closing them: lookups in flight may still hold them
+        with self._lock:
+            self._state = _ShardState(self._state.generation + 1)
+
+    # ---- internals ----
+    def _meta_stamp(self) -> Optional[Tuple[int, int]]:
+        try:
+            st = os.stat(self.root / "meta.json")
+        except OSError:
+            return None
+        return (st.st_ino, st.st_mtime_ns)
+
+    def _current(self) -> _ShardState:
+        state = self._state
+        if self._meta_stamp() == state.stamp:
+            return state
+        with self._lock:
+            # another thread may have reloaded while this one waited
+            if self._meta_stamp() != self._state.stamp:
+                # None: the store kept changing while it was opened; serve the last good state, retry next lookup
+                self._state = self._open(self._state.generation + 1) or self._state
+            return self._state
+
+    def _open(self, generation: int) -> Optional[_ShardState]:
+        for _ in range(_OPEN_ATTEMPTS):
+            stamp = self._meta_stamp()
+            if stamp is None:
+                return _ShardState(generation)
+            try:
+                with open(self.root / "meta.json", "r", encoding="utf-8") as f:
+                    shards = int(json.load(f)["shards"])
+            except (OSError, ValueError):
+                # replaced between the stat and the read
+                continue
+            buffers = tuple(self._map_shard(k) for k in range(shards))
+            sizes = [len(b) for b in buffers]
+            index = self._load_index(sizes)
+            if index is None:
+                try:
+                    _build_index(self.root, shards)
+                except OSError:
+                    return _ShardState(generation, stamp)
+                index = self._load_index(sizes)
+            if index is None:
+                # a writer replaced or extended shards after they were mapped
+                continue
+            tables = {name: _load_table_arrays(self.root, name) for _, name, _ in _LISTS}
+            return _ShardState(generation, stamp, buffers, *index, tables)
+        return None
+
+    def _map_shard(self, k: int) -> Any:
+        try:
+            with open(_shard_path(self.root, k), "rb") as f:
+                if os.fstat(f.fileno()).st_size:
+                    return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except OSError:
+            pass
+        return b""
+
+    def _load_index(self, sizes: List[int]) -> Optional[Tuple[np.ndarray, ...]]:
+        d = self.root / "index"
+        try:
+            with open(d / "meta.json", "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            # sizes of the mapped shards, not of whatever the paths point at by now
+            if meta.get("version") != FORMAT_VERSION or meta.get("shard_sizes") != sizes:
+                return None
+            return tuple(np.load(d / f"{name}.npy", mmap_mode="r") for name in ("ids", "shard", "segment", "slot"))
+        except (OSError, ValueError):
+            return None
+
+    @staticmethod
+    def _decode(state: _ShardState, sid: str, raw: memoryview) -> Dict[str, Any]:
+        rec: Dict[str, Any] = {"student_id": sid}
+        pos = 0
+        for key, table, id_key in _LISTS:
+            (n,) = struct.unpack_from("<i", raw, pos)
+            pos += 4
+            if n < 0:
+                continue
+            ids = np.frombuffer(raw, dtype="<i4", count=n, offset=pos).tolist()
+            scores = np.frombuffer(raw, dtype="<f4", count=n, offset=pos + 4 * n).tolist()
+            pos += 8 * n
+            table_ids, attrs = state.tables[table]
+            rec[key] = [
+                {
+                    id_key: table_ids[i].decode("utf-8"),
+                    "score": round(score, SCORE_DECIMALS),
+                    **(attrs[i] if i < len(attrs) else {}),
+                }
+                for i, score in zip(ids, scores)
+            ]
+        (m,) = struct.unpack_from("<I", raw, pos)
+        if m:
+            rec.update(json.loads(bytes(raw[pos + 4 : pos + 4 + m])))
+        return rec
@@ -0,0 +1,89 @@
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from types import MappingProxyType
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+
+
+def _index(rows: Tuple[Dict[str, Any], ...], key: str) -> Mapping[str, Dict[str, Any]]:
+    return MappingProxyType({str(r.get(key)): r for r in rows})
+
+
+@dataclass(frozen=True)
+class ServingSnapshot:
+    """Everything a request needs, built once per training run and never mutated.
+
+    `RecommendationEngine.train_models` fits fresh model instances, builds a new
+    snapshot from them and swaps it in with a single attribute assignment, so a
+    request that grabbed the previous snapshot keeps a consistent view until it
+    finishes. Do not mutate the models or rows held here after `build`.
+    """
+
+    version: int
+    content_model: Any
+    collab_model: Any
+    semantic_model: Any
+    sponsor_model: Any
+    people_model: Any
+    ann: Any = None
+    content: Tuple[Dict[str, Any], ...] = ()
+    students: Tuple[Dict[str, Any], ...] = ()
+    sponsors: Tuple[Dict[str, Any], ...] = ()
+    # id -> row lookups, precomputed so requests do no O(catalog) work
+    content_index: Mapping[str, Dict[str, Any]] = field(default_factory=lambda: MappingProxyType({}))
+    sponsor_index: Mapping[str, Dict[str, Any]] = field(default_factory=lambda: MappingProxyType({}))
+    student_index: Mapping[str, Dict[str, Any]] = field(default_factory=lambda: MappingProxyType({}))
+    # course id -> tags, only for courses whose tags are a list (used by diversification)
+    course_tags: Mapping[str, Tuple[str, ...]] = field(default_factory=lambda: MappingProxyType({}))
+    # What the models were built from, for incremental batches (see BatchState):
+    # bumped on every full refit, sponsors hash, per-document hashes (None if ids were unusable)
+    fit_epoch: int = 0
+    sponsors_hash: str = ""
+    student_hashes: Optional[Mapping[str, str]] = None
+    course_hashes: Optional[Mapping[str, str]] = None
+
+    @classmethod
+    def build(
+        cls,
+        version: int,
+        *,
+        content: Optional[List[Dict[str, Any]]],
+        students: Optional[List[Dict[str, Any]]],
+        sponsors: Optional[List[Dict[str, Any]]],
+        content_model: Any,
+        collab_model: Any,
+        semantic_model: Any,
+        sponsor_model: Any,
+        people_model: Any,
+        ann: Any = None,
+        fit_epoch: int = 0,
+        sponsors_hash: str = "",
+        student_hashes: Optional[Dict[str, str]] = None,
+        course_hashes: Optional[Dict[str, str]] = None,
+    ) -> "ServingSnapshot":
+        content_rows = tuple(content or ())
+        student_rows = tuple(students or ())
+        sponsor_rows = tuple(sponsors or ())
+        course_tags = {
+            str(c.get("course_id")): tuple(c["tags"]) for c in content_rows if isinstance(c.get("tags"), list)
+        }
+        return cls(
+            version=version,
+            content_model=content_model,
+            collab_model=collab_model,
+            semantic_model=semantic_model,
+            sponsor_model=sponsor_model,
+            people_model=people_model,
+            ann=ann,
+            content=content_rows,
+            students=student_rows,
+            sponsors=sponsor_rows,
+            content_index=_index(content_rows, "course_id"),
+            sponsor_index=_index(sponsor_rows, "sponsor_id"),
+            student_index=_index(student_rows, "student_id"),
+            course_tags=MappingProxyType(course_tags),
+            fit_epoch=fit_epoch,
+            sponsors_hash=sponsors_hash,
+            student_hashes=MappingProxyType(student_hashes) if student_hashes is not None else None,
+            course_hashes=MappingProxyType(course_hashes) if course_hashes is not None else None,
+        )
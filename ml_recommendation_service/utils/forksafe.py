@@ -0,0 +1,31 @@
+from __future__ import annotations
+
+import os
+import threading
+import weakref
+from typing import Any, TypeVar
+
+T = TypeVar("T")
+
+# Objects whose `_lock` is replaced in forked children
+_OWNERS: "weakref.WeakSet[Any]" = weakref.WeakSet()
+
+
+def fork_safe(obj: T) -> T:
+    """Give `obj` a fresh, unlocked `_lock` in every process forked from this one.
+
+    A child forked while another thread holds a lock inherits it held, with no
+    thread left to release it; the batch workers (see parallel.py) would then
+    block forever on the first metrics update or cache lookup.
+    """
+    _OWNERS.add(obj)
+    return obj
+
+
+def _reinit_locks() -> None:
+    for obj in list(_OWNERS):
+        obj._lock = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reinit_locks)
@@ -0,0 +1,122 @@
+from __future__ import annotations
+
+import zlib
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+_PRIME = np.uint64((1 << 31) - 1)  # a, b and item hashes stay below 2**31 so a*h fits in uint64
+_EMPTY = np.uint32(0xFFFFFFFF)
+
+
+class MinHashLSH:
+    """MinHash signatures with banded LSH buckets for approximate Jaccard neighbours.
+
+    Each set gets `bands * rows` min-hash values. Two sets share a bucket in a
+    band with probability s**rows (s = Jaccard), so they are retrieved with
+    probability 1 - (1 - s**rows)**bands. More bands raise recall, more rows
+    raise precision. All state is numpy arrays (see `state`/`from_state`).
+    """
+
+    def __init__(self, bands: int = 16, rows: int = 4, seed: int = 1) -> None:
+        self.bands = bands
+        self.rows = rows
+        self.seed = seed
+        rng = np.random.default_rng(seed)
+        n = bands * rows
+        self._a = rng.integers(1, int(_PRIME), size=n, dtype=np.uint64)
+        self._b = rng.integers(0, int(_PRIME), size=n, dtype=np.uint64)
+        self._keys: Optional[np.ndarray] = None  # (bands, n_sets) sorted band keys
+        self._order: Optional[np.ndarray] = None  # (bands, n_sets) set row per sorted key
+        self.signatures: Optional[np.ndarray] = None  # (n_sets, bands * rows) uint32
+
+    @staticmethod
+    def _hash_items(items: Iterable[str]) -> np.ndarray:
+        return np.fromiter((zlib.crc32(str(it).encode("utf-8")) & 0x7FFFFFFF for it in items), dtype=np.uint64)
+
+    def _minhash(self, hashes: np.ndarray, offsets: np.ndarray) -> np.ndarray:
+        """Signatures for consecutive item segments hashes[offsets[i]:offsets[i+1]] (all non-empty)."""
+        n_sets = len(offsets) - 1
+        sig = np.empty((n_sets, len(self._a)), dtype=np.uint32)
+        step = 8  # permutations per pass, bounds the (step, n_items) temporary
+        for p in range(0, len(self._a), step):
+            a = self._a[p : p + step, None]
+            b = self._b[p : p + step, None]
+            permuted = (a * hashes[None, :] + b) % _PRIME
+            sig[:, p : p + step] = np.minimum.reduceat(permuted, offsets[:-1], axis=1).T
+        return sig
+
+    def signature(self, items: Iterable[str]) -> np.ndarray:
+        hashes = self._hash_items(items)
+        if hashes.size == 0:
+            return np.full(len(self._a), _EMPTY, dtype=np.uint32)
+        return self._minhash(hashes, np.array([0, hashes.size]))[0]
+
+    def _band_keys(self, sig: np.ndarray) -> np.ndarray:
+        """(bands, n) uint64 key per band; rows of a band are mixed with an FNV-style fold."""
+        sig = np.atleast_2d(sig).astype(np.uint64)
+        keys = np.empty((self.bands, sig.shape[0]), dtype=np.uint64)
+        with np.errstate(over="ignore"):
+            for band in range(self.bands):
+                k = np.full(sig.shape[0], 14695981039346656037, dtype=np.uint64)
+                for r in range(self.rows):
+                    k = (k ^ sig[:, band * self.rows + r]) * np.uint64(1099511628211)
+                keys[band] = k
+        return keys
+
+    def _signatures(self, item_sets: Sequence[Iterable[str]]) -> np.ndarray:
+        hashed = [self._hash_items(items) for items in item_sets]
+        if not hashed:
+            return np.empty((0, len(self._a)), np.uint32)
+        lengths = np.array([h.size for h in hashed], dtype=np.int64)
+        offsets = np.concatenate(([0], np.cumsum(lengths)))
+        return self._minhash(np.concatenate(hashed), offsets)
+
+    def fit(self, item_sets: Sequence[Iterable[str]]) -> None:
+        """Index sets by position; every set must be non-empty."""
+        self.signatures = self._signatures(item_sets)
+        self._index()
+
+    def update(self, keep: np.ndarray, item_sets: Sequence[Iterable[str]]) -> None:
+        """Keep the indexed rows where `keep` is True, then append `item_sets` (non-empty) at the end."""
+        kept = self.signatures[np.asarray(keep, dtype=bool)]
+        self.signatures = np.concatenate([kept, self._signatures(item_sets)])
+        self._index()
+
+    def _index(self) -> None:
+        keys = self._band_keys(self.signatures)
+        self._order = np.argsort(keys, axis=1, kind="stable").astype(np.int32)
+        self._keys = np.take_along_axis(keys, self._order.astype(np.int64), axis=1)
+
+    def query(self, items: Optional[Iterable[str]] = None, signature: Optional[np.ndarray] = None) -> np.ndarray:
+        """Positions of indexed sets sharing at least one band bucket with the query."""
+        if self._keys is None or self._keys.shape[1] == 0:
+            return np.empty(0, dtype=np.int32)
+        sig = signature if signature is not None else self.signature(items or ())
+        qkeys = self._band_keys(sig)[:, 0]
+        hits: List[np.ndarray] = []
+        for band in range(self.bands):
+            lo = np.searchsorted(self._keys[band], qkeys[band], side="left")
+            hi = np.searchsorted(self._keys[band], qkeys[band], side="right")
+            if hi > lo:
+                hits.append(self._order[band, lo:hi])
+        if not hits:
+            return np.empty(0, dtype=np.int32)
+        return np.unique(np.concatenate(hits))
+
+    # ---- persistence ----
+    def state(self) -> Dict[str, Any]:
+        return {
+            "bands": self.bands,
+            "rows": self.rows,
+            "seed": self.seed,
+            "signatures": self.signatures,
+        }
+
+    @classmethod
+    def from_state(cls, state: Dict[str, Any]) -> "MinHashLSH":
+        lsh = cls(bands=int(state["bands"]), rows=int(state["rows"]), seed=int(state["seed"]))
+        lsh.signatures = np.asarray(state["signatures"], dtype=np.uint32)
+        # Band buckets are a cheap sort over the stored signatures
+        lsh._index()
+        return lsh
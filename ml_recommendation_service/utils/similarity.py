@@ -2,6 +2,28 @@ from __future__ import annotations
 
 from typing import List
 
+import numpy as np
+
 
 def top_k(ranked: List[tuple], k: int) -> List[tuple]:
     return ranked[:k] if ranked else []
+
+
+def top_k_indices(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k largest entries of a 1-D score row, best first.
+
+    Ties are broken by lower index, the same order as a stable descending
+    sort of the whole row (what the single-request paths do), so batch and
+    single results agree. Uses argpartition to find the k-th value and then
+    sorts only the entries at least that large, so the cost stays about
+    O(n + k log k) unless there are many ties at the boundary.
+    """
+    n = scores.shape[0]
+    if k <= 0 or n == 0:
+        return np.empty(0, dtype=np.intp)
+    if k >= n:
+        return np.argsort(-scores, kind="stable")
+    kth = -np.partition(-scores, k - 1)[k - 1]
+    # every entry tied with the k-th value, so the choice among ties is not arbitrary
+    idx = np.flatnonzero(scores >= kth)
+    return idx[np.lexsort((idx, -scores[idx]))][:k]
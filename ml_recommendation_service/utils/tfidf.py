@@ -0,0 +1,54 @@
+from __future__ import annotations
+
+from typing import Any, Callable, Dict, Iterable, List
+
+import numpy as np
+
+# Shared settings for every TF-IDF space in the package
+MAX_FEATURES = 5000
+NGRAM_RANGE = (1, 2)
+
+
+def make_vectorizer(vocabulary: Dict[str, int] | None = None):
+    from sklearn.feature_extraction.text import TfidfVectorizer
+
+    return TfidfVectorizer(max_features=MAX_FEATURES, ngram_range=NGRAM_RANGE, vocabulary=vocabulary)
+
+
+def fit_transform_batched(vectorizer, texts: Callable[[], Iterable[str]], batch_size: int = 1000):
+    """`vectorizer.fit_transform` in two streaming passes over `texts()`.
+
+    The first pass learns the vocabulary and IDF weights, the second
+    transforms `batch_size` texts at a time, so the full list of texts is
+    never held in memory. The result equals `fit_transform(list(texts()))`.
+    """
+    from itertools import islice
+    from scipy.sparse import csr_matrix, vstack
+
+    vectorizer.fit(texts())
+    it = iter(texts())
+    parts = []
+    while True:
+        batch = list(islice(it, max(1, int(batch_size))))
+        if not batch:
+            break
+        parts.append(vectorizer.transform(batch))
+    if not parts:
+        return csr_matrix((0, len(vectorizer.vocabulary_)), dtype=np.float64)
+    return vstack(parts, format="csr")
+
+
+def vectorizer_state(vectorizer) -> Dict[str, Any]:
+    """Fitted TfidfVectorizer as plain arrays: terms ordered by column index, plus idf weights."""
+    vocab = vectorizer.vocabulary_
+    terms: List[str] = [""] * len(vocab)
+    for term, idx in vocab.items():
+        terms[idx] = term
+    return {"terms": np.asarray(terms, dtype=str), "idf": np.asarray(vectorizer.idf_, dtype=np.float64)}
+
+
+def vectorizer_from_state(terms, idf):
+    """Rebuild a ready-to-transform TfidfVectorizer without refitting."""
+    vectorizer = make_vectorizer({str(t): i for i, t in enumerate(terms)})
+    vectorizer.idf_ = np.array(idf, dtype=np.float64)
+    return vectorizer